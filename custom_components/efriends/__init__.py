@@ -1,227 +1,333 @@
-import logging
-import socketio
-import asyncio
-import requests
-from datetime import time
-from .helper import * 
-from .sensor_definition import * 
-
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.discovery import async_load_platform
-from homeassistant.core import HomeAssistant
-
-from .const import (
-    DOMAIN,
-    CONF_HOST,
-    CONF_MODE,
-    CONF_CONSUMPTION_ENTITY,
-    CONF_API_KEY,
-    DEFAULT_HOST
-)
-
-_LOGGER = logging.getLogger(__name__)
-
-async def async_setup(hass: HomeAssistant, config: dict):
-    """Optional: Setup via YAML (hier nicht genutzt, da config_flow=True)."""
-    return True
-
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    """
-    Wird aufgerufen, wenn der User die Integration hinzufügt.
-    - Stellt Socket.IO-Verbindung her
-    - Definiert Handler für rawPowerMessage und PeerTradingModuleSummaryEvent
-    - Legt global_data an
-    """
-    _LOGGER.info("Setting up eFriends (entry_id=%s) with data=%s", entry.entry_id, entry.data)
-
-    # Dictionary, in dem wir alle Daten ablegen
-    if DOMAIN not in hass.data:
-        hass.data[DOMAIN] = {}
-
-    # Jede Instanz kann eigenständig sein
-    hass.data[DOMAIN][entry.entry_id] = {}
-    host = entry.data.get(CONF_HOST, DEFAULT_HOST)
-    mode = entry.data.get(CONF_MODE, "read")
-    consumption_entity = entry.data.get(CONF_CONSUMPTION_ENTITY, "")
-    api_key = entry.data.get(CONF_API_KEY, "")
-
-    hass.data[DOMAIN][entry.entry_id]["mode"] = mode;
-
-    _LOGGER.info("E-Friends Setup: host=%s mode=%s", host, mode)
-
-    if mode == "read":
-        # Socket.IO-Reader
-        reader = EFriendsSocketIOReader(hass, host)
-        hass.data[DOMAIN][entry.entry_id]["socket_reader"] = reader
-        await reader.async_init()
-
-    else:
-        # Http write
-        writer = EFriendsWriter(hass, host, consumption_entity, api_key, entry.entry_id)
-        hass.data[DOMAIN][entry.entry_id]["writer"] = writer
-        await writer.async_init()
-
-    # sensor.py
-    hass.async_create_task(
-        async_load_platform(hass, "sensor", DOMAIN, {"entry_id": entry.entry_id}, entry.data)
-    )
-    return True
-
-
-async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-
-    delete_traders_file(entry.entry_id)
-
-    data = hass.data[DOMAIN].pop(entry.entry_id, None)
-    if data:
-        if "socket_reader" in data:
-            await data["socket_reader"].async_unload()
-        if "writer" in data:
-            await data["writer"].async_unload()
-
-    # Unload Sensor-Platform
-    await hass.config_entries.async_unload_platforms(entry, ["sensor"])
-
-    # Optionally: Daten aus hass.data entfernen
-    hass.data[DOMAIN].pop(entry.entry_id, None)
-    return True
-
-
-class EFriendsSocketIOReader:
-    """Socket.IO Reader => rawPowerMessage, PeerTradingModuleSummaryEvent"""
-
-    def __init__(self, hass: HomeAssistant, host: str):
-        self._hass = hass
-        self._host = host
-        self._sio = socketio.Client()
-        self._connected = False
-        self._running = True
-
-    async def async_init(self):
-        # Registriere Events
-        @self._sio.event
-        def connect():
-            _LOGGER.info("Mit eFriends Socket.IO verbunden")
-            self._connected = True
-
-        @self._sio.event
-        def disconnect():
-            _LOGGER.warning("Socket.IO (Reader) disconnected.")
-            self._connected = False
-
-        @self._sio.on("connect", namespace="/MeterDataAPI")
-        def on_connect():
-            _LOGGER.debug("Verbunden mit Namespace /MeterDataAPI")
-
-        @self._sio.on("rawPowerMessage", namespace="/MeterDataAPI")
-        def handle_raw_power(data):
-            _LOGGER.debug("rawPowerMessage: %s", data)
-            # HA-Event feuern
-            self._hass.bus.fire("efriends_rawpower", data)
-
-        @self._sio.on("PeerTradingModuleSummaryEvent")
-        def handle_trading_data(data):
-            _LOGGER.debug("PeerTradingModuleSummaryEvent: %s", data)
-            self._hass.bus.fire("efriends_trading_update", data)
-
-        # Socket-Connect asynchron (Executor)
-        def _connect():
-            try:
-                _LOGGER.info(f"Verbinde zu ws://{self._host}/MeterDataAPI ...")
-                self._sio.connect(f"ws://{self._host}")
-                self._sio.emit('join', {}, namespace='/MeterDataAPI')
-
-            except Exception as e:
-                _LOGGER.error(f"Fehler beim Verbinden zu {self._host}: {e}")
-
-        await self._hass.async_add_executor_job(_connect)
-
-    async def async_unload(self):
-        self._running = False
-        _LOGGER.info("Socket.IO (Reader) unloading -> disconnect")
-        self._sio.disconnect()
-
-class EFriendsWriter:
-    """Mittelwert bilden + HTTP-POST an http://<host>/v3/MeterDataAPI/MeterData mit api_key"""
-
-    def __init__(self, hass: HomeAssistant, host: str, entity_id: str, api_key: str, status_entity_id: str):
-        self._hass = hass
-        self._host = host
-        self._entity_id = entity_id
-        self._api_key = api_key
-        self._sum_values = 0.0
-        self._count = 0
-        self._interval = 5
-        self._unsub_listener = None
-        self._loop_task = None
-        self._status_entity_id = status_entity_id
-        self._connection_status = False  # Initialer Status: Verbindung nicht aktiv
-
-    async def async_init(self):
-        self._unsub_listener = self._hass.bus.async_listen("state_changed", self._handle_state_change)
-        self._loop_task = self._hass.loop.create_task(self._loop_cycle())
-
-
-    def _handle_state_change(self, event):
-        if not event.data:
-            return
-        if event.data.get("entity_id") == self._entity_id:
-            new_state = event.data["new_state"]
-            if new_state and new_state.state not in (None, ""):
-                try:
-                    val = float(new_state.state)
-                    self._sum_values += val
-                    self._count += 1
-                except ValueError:
-                    pass
-
-    def _send_data(self, url, data, headers):
-        # Diese Funktion läuft im Threadpool (Blockierung erlaubt)
-        response = requests.post(url, json=data, headers=headers, timeout=5)
-        return response
-
-    async def _loop_cycle(self):
-        import requests
-        url = f"http://{self._host}/v3/MeterDataAPI/MeterData"
-        while True:
-            _LOGGER.info("asyncio.sleep")
-            await asyncio.sleep(self._interval)
-            if self._count > 0:
-                avg_val = round(self._sum_values / self._count)
-                self._sum_values = 0.0
-                self._count = 0
-                data = {
-                    "power1Watt": avg_val,
-                    "power2Watt": 0,
-                    "power3Watt": 0,
-                    "powerTotal": avg_val,
-                    "voltage1Volt": 230,
-                    "voltage2Volt": 230,
-                    "voltage3Volt": 230,
-                    "dataSource": "HA E-Friends Writer"
-                }
-                headers = {
-                    "Content-Type": "application/json",
-                    "apiKey": self._api_key
-                }
-                try:
-                    # async_add_executor_job => blockierende Funktion in Threadpool verschieben
-                    resp = await self._hass.async_add_executor_job(
-                        self._send_data, url, data, headers
-                    )
-
-                    if resp.status_code == 200:
-                        _LOGGER.info("Daten an %s gesendet: %s", url, resp.text)
-                        self._hass.bus.fire("efriends_write_status", True)
-                    else:
-                        _LOGGER.warning("Send-Fehler: %s - %s", resp.status_code, resp.text)
-                        self._hass.bus.fire("efriends_write_status", False)
-                except Exception as e:
-                    _LOGGER.error("Exception beim Senden an %s: %s", url, e)
-                    self._hass.bus.fire("efriends_write_status", False)
-
-    async def async_unload(self):
-        if self._unsub_listener:
-            self._unsub_listener()
-        if self._loop_task:
-            self._loop_task.cancel()
\ No newline at end of file
+import logging
+from datetime import timedelta
+from .helper import * 
+from .publish_policy import EFriendsStatePublisher, build_policies
+from .metrics import EFriendsMetrics
+from .thresholds import EFriendsThresholdEngine, build_rules
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+import homeassistant.helpers.config_validation as cv
+from homeassistant.util import dt as dt_util
+import voluptuous as vol
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN,
+    CONF_HOST,
+    CONF_MODE,
+    MODE_READ,
+    READ_MODES,
+    WRITE_MODES,
+    DATA_CONNECTIONS,
+    PLATFORMS,
+    RELOAD_OPTIONS,
+    CONF_CONSUMPTION_ENTITY,
+    CONF_API_KEY,
+    CONF_PUBLISH_EVENTS,
+    CONF_EVENT_INTERVAL,
+    DEFAULT_HOST,
+    WRITE_PHASE_ENTITIES,
+    CONF_TRADER_TOP_N,
+    CONF_TRADER_MAX_AGE,
+    DEFAULT_TRADER_TOP_N,
+    DEFAULT_TRADER_MAX_AGE,
+    SERVICE_GET_TRADERS,
+    SERVICE_PROFILE,
+    METRICS_SENSOR_INTERVAL,
+    PROFILE_MAX_DURATION,
+    DEFAULT_PUBLISH_EVENTS,
+    DEFAULT_EVENT_INTERVAL,
+    CONF_HISTORY_RETENTION,
+    DEFAULT_HISTORY_RETENTION,
+    HISTORY_KINDS,
+    HISTORY_MAX_POINTS,
+    DEFAULT_HISTORY_RESOLUTION,
+    SERVICE_GET_HISTORY,
+    SERVICE_EXPORT_HISTORY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+async def async_setup(hass: HomeAssistant, config: dict):
+    """Optional: Setup via YAML (hier nicht genutzt, da config_flow=True). Registriert die Services."""
+
+    async def async_handle_get_traders(call: ServiceCall) -> ServiceResponse:
+        """Trader-Tabelle (Balance, last_seen) pro Entry abfragen, sortiert nach Balance."""
+        entry_id = call.data.get("entry_id")
+        limit = call.data.get("limit")
+        result = {}
+        for data_entry_id, data in hass.data.get(DOMAIN, {}).items():
+            if entry_id and data_entry_id != entry_id:
+                continue
+            if not isinstance(data, dict) or "trade_data" not in data:
+                continue
+            last_seen = data.get("trader_last_seen", {})
+            rows = sorted(data["trade_data"]["traders"].items(), key=lambda item: item[1], reverse=True)
+            if limit:
+                rows = rows[:limit]
+            result[data_entry_id] = [
+                {
+                    "trader_id": trader_id,
+                    "balance": round(balance, 2),
+                    "last_seen": dt_util.utc_from_timestamp(last_seen[trader_id]).isoformat()
+                    if trader_id in last_seen else None,
+                }
+                for trader_id, balance in rows
+            ]
+        return {"entries": result}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_TRADERS,
+        async_handle_get_traders,
+        schema=vol.Schema({
+            vol.Optional("entry_id"): cv.string,
+            vol.Optional("limit"): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        }),
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def async_handle_profile(call: ServiceCall) -> None:
+        """Gesampeltes Profiling der Hot-Paths für ein begrenztes Zeitfenster (duration 0 = stoppen)."""
+        entry_id = call.data.get("entry_id")
+        for data_entry_id, data in hass.data.get(DOMAIN, {}).items():
+            if entry_id and data_entry_id != entry_id:
+                continue
+            if not isinstance(data, dict) or "metrics" not in data:
+                continue
+            data["metrics"].profiler.async_start(call.data["duration"], call.data["sample_every"])
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        async_handle_profile,
+        schema=vol.Schema({
+            vol.Optional("entry_id"): cv.string,
+            vol.Optional("duration", default=60): vol.All(
+                vol.Coerce(float), vol.Range(min=0, max=PROFILE_MAX_DURATION)
+            ),
+            vol.Optional("sample_every", default=10): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+        }),
+    )
+
+    def _history_stores(entry_id):
+        for data_entry_id, data in hass.data.get(DOMAIN, {}).items():
+            if entry_id and data_entry_id != entry_id:
+                continue
+            if isinstance(data, dict) and "history" in data:
+                yield data_entry_id, data["history"]
+
+    def _history_range(call: ServiceCall):
+        end = call.data.get("end") or dt_util.now()
+        start = call.data["start"]
+        return _as_timestamp(start), _as_timestamp(end)
+
+    async def async_handle_get_history(call: ServiceCall) -> ServiceResponse:
+        """Lokale Historie (Rohframes oder Trading) als Mittelwerte je Zeitfenster abfragen."""
+        start, end = _history_range(call)
+        # Antwort begrenzen: Fenster so vergrößern, dass höchstens HISTORY_MAX_POINTS Punkte entstehen
+        resolution = max(call.data["resolution"], (end - start) / HISTORY_MAX_POINTS, 1)
+        result = {}
+        for entry_id, history in _history_stores(call.data.get("entry_id")):
+            result[entry_id] = await history.async_query(
+                call.data["kind"], start, end, resolution, call.data.get("keys")
+            )
+        return {"entries": result}
+
+    async def async_handle_export_history(call: ServiceCall) -> ServiceResponse:
+        """Lokale Historie als CSV in das Konfigurationsverzeichnis exportieren."""
+        start, end = _history_range(call)
+        kind = call.data["kind"]
+        stamp = dt_util.as_local(dt_util.utc_from_timestamp(start)).strftime("%Y%m%d%H%M")
+        result = {}
+        for entry_id, history in _history_stores(call.data.get("entry_id")):
+            path = hass.config.path(f"efriends_history_{entry_id}_{kind}_{stamp}.csv")
+            result[entry_id] = await history.async_export_csv(kind, start, end, path, call.data.get("keys"))
+        return {"entries": result}
+
+    history_schema = {
+        vol.Optional("entry_id"): cv.string,
+        vol.Optional("kind", default=HISTORY_KINDS[0]): vol.In(HISTORY_KINDS),
+        vol.Required("start"): cv.datetime,
+        vol.Optional("end"): cv.datetime,
+        vol.Optional("keys"): vol.All(cv.ensure_list, [cv.string]),
+    }
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_HISTORY,
+        async_handle_get_history,
+        schema=vol.Schema({
+            **history_schema,
+            vol.Optional("resolution", default=DEFAULT_HISTORY_RESOLUTION): vol.All(
+                vol.Coerce(float), vol.Range(min=1)
+            ),
+        }),
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT_HISTORY,
+        async_handle_export_history,
+        schema=vol.Schema(history_schema),
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    return True
+
+
+def _as_timestamp(value) -> float:
+    """Datum/Zeit aus einem Service-Aufruf; ohne Zeitzone gilt die von Home Assistant."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt_util.DEFAULT_TIME_ZONE)
+    return value.timestamp()
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """
+    Wird aufgerufen, wenn der User die Integration hinzufügt.
+    - Meldet die Entry beim geteilten Socket.IO-Reader des Hosts an (read)
+    - Startet den Writer (write)
+    - Leitet an die Plattformen weiter (sensor.py, binary_sensor.py)
+    """
+    _LOGGER.info("Setting up eFriends (entry_id=%s)", entry.entry_id)
+
+    # Dictionary, in dem wir alle Daten ablegen
+    if DOMAIN not in hass.data:
+        hass.data[DOMAIN] = {}
+
+    # Jede Instanz kann eigenständig sein
+    hass.data[DOMAIN][entry.entry_id] = {}
+    host = entry.data.get(CONF_HOST, DEFAULT_HOST)
+    mode = entry.data.get(CONF_MODE, MODE_READ)
+    consumption_entity = entry.data.get(CONF_CONSUMPTION_ENTITY, "")
+    # Optionale Entities pro Phase / Spannung => Payload-Feld
+    entity_map = {"powerTotal": consumption_entity}
+    for conf_key, payload_key in WRITE_PHASE_ENTITIES:
+        if entry.data.get(conf_key):
+            entity_map[payload_key] = entry.data[conf_key]
+    api_key = entry.data.get(CONF_API_KEY, "")
+
+    hass.data[DOMAIN][entry.entry_id]["mode"] = mode;
+    # Optionen, die erst nach einem Reload greifen (siehe _async_update_listener)
+    hass.data[DOMAIN][entry.entry_id]["reload_options"] = _reload_options(entry)
+
+    _LOGGER.info("E-Friends Setup: host=%s mode=%s", host, mode)
+
+    # Optionale (rate-limitierte) Bus-Events, standardmäßig aus
+    publisher = EFriendsEventPublisher(
+        hass,
+        entry.entry_id,
+        entry.options.get(CONF_PUBLISH_EVENTS, DEFAULT_PUBLISH_EVENTS),
+        entry.options.get(CONF_EVENT_INTERVAL, DEFAULT_EVENT_INTERVAL),
+    )
+    hass.data[DOMAIN][entry.entry_id]["event_publisher"] = publisher
+    # Publishing-Policy pro Sensorgruppe (welche States wirklich geschrieben werden)
+    state_publisher = EFriendsStatePublisher(hass, build_policies(entry.options))
+    hass.data[DOMAIN][entry.entry_id]["state_publisher"] = state_publisher
+    entry.async_on_unload(state_publisher.async_cancel)
+    # Zähler und Latenz-Histogramme (Diagnose-Download, optionale Diagnose-Sensoren)
+    metrics = EFriendsMetrics(hass, entry.entry_id)
+    hass.data[DOMAIN][entry.entry_id]["metrics"] = metrics
+
+    async def _async_probe_executor(now):
+        await metrics.async_probe_executor(hass)
+
+    entry.async_on_unload(
+        async_track_time_interval(hass, _async_probe_executor, timedelta(seconds=METRICS_SENSOR_INTERVAL))
+    )
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+
+    if mode in READ_MODES:
+        # Socket.IO-Reader (pro Host geteilt, die Entry bekommt ein Abonnement).
+        # socketio wird nur geladen, wenn eine Entry liest.
+        if DATA_CONNECTIONS not in hass.data[DOMAIN]:
+            connection = await async_import_submodule(hass, "connection")
+            hass.data[DOMAIN][DATA_CONNECTIONS] = connection.EFriendsConnectionManager(hass)
+        hass.data[DOMAIN][entry.entry_id]["socket_reader"] = hass.data[DOMAIN][DATA_CONNECTIONS].async_acquire_reader(
+            host, entry.entry_id, publisher, metrics
+        )
+        # Schwellwerte (Binary-Sensoren + Events), ausgewertet in den Handlern von sensor.py
+        rules = build_rules(entry.options)
+        if rules:
+            thresholds = EFriendsThresholdEngine(hass, entry.entry_id, rules, metrics)
+            hass.data[DOMAIN][entry.entry_id]["thresholds"] = thresholds
+            entry.async_on_unload(thresholds.async_cancel)
+
+    if mode in WRITE_MODES:
+        # Http write
+        writer_module = await async_import_submodule(hass, "writer")
+        writer = writer_module.EFriendsWriter(hass, host, entity_map, api_key, entry.entry_id, publisher, metrics)
+        writer.async_update_options(entry.options)
+        hass.data[DOMAIN][entry.entry_id]["writer"] = writer
+        await writer.async_init()
+
+    # sensor.py, binary_sensor.py
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    return True
+
+
+def _reload_options(entry: ConfigEntry) -> dict:
+    return {key: entry.options.get(key) for key in RELOAD_OPTIONS}
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Geänderte Optionen übernehmen (Reload, wenn eine davon nur beim Setup gelesen wird)."""
+    data = hass.data[DOMAIN].get(entry.entry_id)
+    if not data:
+        return
+    if _reload_options(entry) != data["reload_options"]:
+        _LOGGER.info("Optionen geändert, die einen Reload brauchen => Entry wird neu geladen")
+        hass.config_entries.async_schedule_reload(entry.entry_id)
+        return
+    data["event_publisher"].async_update_options(
+        entry.options.get(CONF_PUBLISH_EVENTS, DEFAULT_PUBLISH_EVENTS),
+        entry.options.get(CONF_EVENT_INTERVAL, DEFAULT_EVENT_INTERVAL),
+    )
+    data["state_publisher"].async_update_policies(build_policies(entry.options))
+    if "writer" in data:
+        data["writer"].async_update_options(entry.options)
+    if "history" in data:
+        data["history"].async_update_options(
+            entry.options.get(CONF_HISTORY_RETENTION, DEFAULT_HISTORY_RETENTION)
+        )
+    if "trader_mode" in data:
+        data["trader_max_age"] = entry.options.get(CONF_TRADER_MAX_AGE, DEFAULT_TRADER_MAX_AGE)
+        if "trader_top_sensor" in data:
+            data["trader_top_sensor"].async_set_top_n(
+                int(entry.options.get(CONF_TRADER_TOP_N, DEFAULT_TRADER_TOP_N)),
+                data["trade_data"]["traders"],
+            )
+
+
+async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """
+    Plattformen entladen, Reader-Abonnement und Writer beenden, Zwischenstände sofort
+    sichern (beim Reload lädt die neue Instanz sie gleich wieder). Listener, die mit
+    entry.async_on_unload registriert sind, entfernt HA danach selbst.
+    """
+    if not await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
+        return False
+
+    data = hass.data[DOMAIN].pop(entry.entry_id, None)
+    if data:
+        if "socket_reader" in data:
+            await hass.data[DOMAIN][DATA_CONNECTIONS].async_release_reader(
+                entry.data.get(CONF_HOST, DEFAULT_HOST), entry.entry_id
+            )
+        if "writer" in data:
+            await data["writer"].async_unload()
+        data["metrics"].profiler.async_stop()
+        if "traders_store" in data:
+            await async_save_traders(data["traders_store"], data["trade_data"]["traders"], data["trader_last_seen"])
+        if "energy_integrator" in data:
+            await data["energy_integrator"].async_save()
+        if "longterm_statistics" in data:
+            await data["longterm_statistics"].async_save()
+        if "history" in data:
+            await data["history"].async_close()
+    return True
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Entry gelöscht: gespeicherte Trader, Energie-Checkpoint, Langzeitstatistik, Write-Buffer und Historie entfernen."""
+    await async_remove_traders(hass, get_traders_store(hass, entry.entry_id), entry.entry_id)
+    await async_remove_entry_stores(hass, entry.entry_id)
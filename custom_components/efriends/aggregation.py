@@ -0,0 +1,70 @@
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class TimeWeightedAggregator:
+    """
+    Zeitgewichteter Mittelwert einer Quell-Entity über ein Sendefenster.
+    Jeder Wert gilt bis zum nächsten (Sample-and-Hold), unregelmäßig
+    meldende Sensoren verfälschen den Mittelwert dadurch nicht.
+    Liefert zusätzlich min, max und last.
+    """
+
+    def __init__(self):
+        self._value = None
+        self._since = None
+        self._window_start = None
+        self._integral = 0.0
+        self._min = None
+        self._max = None
+
+    @property
+    def has_value(self) -> bool:
+        return self._value is not None
+
+    def add(self, value: float, ts: float) -> None:
+        if self._value is None:
+            # Erster Wert (oder nach "unavailable"): Fenster beginnt hier
+            self._window_start = ts
+            self._integral = 0.0
+            self._min = value
+            self._max = value
+        else:
+            if ts < self._since:
+                return
+            self._integral += self._value * (ts - self._since)
+            self._min = min(self._min, value)
+            self._max = max(self._max, value)
+        self._value = value
+        self._since = ts
+
+    def reset(self) -> None:
+        """Quelle nicht verfügbar: nichts mehr senden, bis wieder ein Wert kommt."""
+        self._value = None
+        self._since = None
+        self._window_start = None
+        self._integral = 0.0
+        self._min = None
+        self._max = None
+
+    def flush(self, ts: float):
+        """Fenster abschließen und neues beginnen. None, wenn kein Wert vorliegt."""
+        if self._value is None:
+            return None
+        integral = self._integral + self._value * max(ts - self._since, 0.0)
+        duration = ts - self._window_start
+        mean = integral / duration if duration > 0 else self._value
+        result = {
+            "mean": mean,
+            "min": self._min,
+            "max": self._max,
+            "last": self._value,
+        }
+        # Der letzte Wert gilt im neuen Fenster weiter
+        self._window_start = ts
+        self._since = ts
+        self._integral = 0.0
+        self._min = self._value
+        self._max = self._value
+        return result
@@ -0,0 +1,107 @@
+import logging
+
+from homeassistant.components.binary_sensor import BinarySensorEntity
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.restore_state import RestoreEntity
+
+from .const import (
+    DOMAIN,
+    CONF_NAME,
+    CONF_MANUFACTURER,
+    CONF_MODEL,
+    CONF_SW_VERSION,
+    SIGNAL_THRESHOLD,
+)
+from .thresholds import ThresholdRule
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Ein Binary-Sensor pro Schwellwert-Regel (nur Read-Mode und nur, wenn Regeln konfiguriert sind)."""
+    thresholds = hass.data[DOMAIN][entry.entry_id].get("thresholds")
+    rules = thresholds.rules if thresholds is not None else []
+    _remove_stale_entities(hass, entry.entry_id, {_unique_id(entry.entry_id, rule.name) for rule in rules})
+    if thresholds is None:
+        return
+
+    sensors = {rule.name: EFriendsThresholdBinarySensor(entry.entry_id, rule) for rule in rules}
+    async_add_entities(sensors.values())
+
+    @callback
+    def handle_threshold(rule):
+        sensors[rule.name].async_write_ha_state()
+
+    entry.async_on_unload(
+        async_dispatcher_connect(hass, SIGNAL_THRESHOLD.format(entry.entry_id), handle_threshold)
+    )
+
+
+def _unique_id(entry_id: str, name: str) -> str:
+    return f"{entry_id}_efriends_threshold_{name}"
+
+
+@callback
+def _remove_stale_entities(hass, entry_id: str, unique_ids: set) -> None:
+    """Binary-Sensoren gelöschter oder umbenannter Regeln aus der Entity-Registry entfernen."""
+    ent_reg = er.async_get(hass)
+    for entity in er.async_entries_for_config_entry(ent_reg, entry_id):
+        if entity.domain == "binary_sensor" and entity.unique_id not in unique_ids:
+            _LOGGER.debug("Entferne Schwellwert-Sensor %s", entity.entity_id)
+            ent_reg.async_remove(entity.entity_id)
+
+
+class EFriendsThresholdBinarySensor(BinarySensorEntity, RestoreEntity):
+    """An, solange die Regel aktiv ist; geschrieben wird nur bei einem Wechsel."""
+
+    def __init__(self, entry_id: str, rule: ThresholdRule):
+        self._entry_id = entry_id
+        self._rule = rule
+        _LOGGER.debug("EFriendsThresholdBinarySensor __init__: %s %s", entry_id, rule.name)
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+
+    @property
+    def unique_id(self):
+        return _unique_id(self._entry_id, self._rule.name)
+
+    @property
+    def name(self):
+        return f"Threshold {self._rule.name}"
+
+    @property
+    def is_on(self):
+        return self._rule.active
+
+    @property
+    def extra_state_attributes(self):
+        rule = self._rule
+        return {
+            "key": rule.key,
+            "direction": rule.direction,
+            "threshold": rule.threshold,
+            "hysteresis": rule.hysteresis,
+            "dwell": rule.dwell,
+            "value": rule.value,
+        }
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        # Letzten Zustand übernehmen: nach einem Neustart kein erneutes "on" für
+        # eine Bedingung, die weiterhin gilt (die Hysterese entscheidet über "off")
+        old_state = await self.async_get_last_state()
+        if old_state is not None and self._rule.transitions == 0:
+            if self._rule.pending is not None:
+                self._rule.pending.cancel()
+                self._rule.pending = None
+            self._rule.active = old_state.state == "on"
@@ -2,20 +2,120 @@ import logging
 import voluptuous as vol
 
 from homeassistant import config_entries
+from homeassistant.components.sensor import SensorDeviceClass
 from homeassistant.core import callback
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers import selector
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .helper import async_import_submodule
 
 from .const import (
     DOMAIN,
     CONF_HOST,
     CONF_MODE,
+    DEFAULT_HOST,
+    CONF_DISCOVERY_TARGETS,
+    CONF_DISCOVERY_PORT,
+    DEFAULT_DISCOVERY_TARGETS,
+    PREFLIGHT_TIMEOUT,
+    MODE_READ,
+    MODE_READ_WRITE,
+    MODES,
     CONF_CONSUMPTION_ENTITY,
     CONF_API_KEY,
+    CONF_PUBLISH_EVENTS,
+    CONF_EVENT_INTERVAL,
+    DEFAULT_PUBLISH_EVENTS,
+    DEFAULT_EVENT_INTERVAL,
+    CONF_PUBLISH_POLICY,
+    PUBLISH_GROUPS,
+    DEFAULT_PUBLISH_POLICY,
+    CONF_WRITE_INTERVAL,
+    CONF_WRITE_MAX_INTERVAL,
+    CONF_WRITE_CHANGE_THRESHOLD,
+    CONF_WRITE_TIMEOUT,
+    DEFAULT_WRITE_INTERVAL,
+    DEFAULT_WRITE_MAX_INTERVAL,
+    DEFAULT_WRITE_CHANGE_THRESHOLD,
+    DEFAULT_WRITE_TIMEOUT,
+    CONF_WRITE_BUFFER_MAX_AGE,
+    CONF_WRITE_BUFFER_MAX_SIZE,
+    CONF_WRITE_BUFFER_DROP_POLICY,
+    CONF_WRITE_DRAIN_YIELD_EVERY,
+    DEFAULT_WRITE_BUFFER_MAX_AGE,
+    DEFAULT_WRITE_BUFFER_MAX_SIZE,
+    DEFAULT_WRITE_BUFFER_DROP_POLICY,
+    DEFAULT_WRITE_DRAIN_YIELD_EVERY,
+    WRITE_BUFFER_DROP_POLICIES,
+    CONF_POWER_PHASE_ENTITIES,
+    CONF_VOLTAGE_PHASE_ENTITIES,
+    WRITE_POWER_PHASE_KEYS,
+    WRITE_VOLTAGE_PHASE_KEYS,
+    WRITE_POWER_UNITS,
+    WRITE_VOLTAGE_UNIT,
+    CONF_WRITE_STATISTIC,
+    DEFAULT_WRITE_STATISTIC,
+    WRITE_STATISTICS,
+    CONF_TRADER_MODE,
+    CONF_TRADER_TOP_N,
+    CONF_TRADER_MAX_AGE,
+    DEFAULT_TRADER_MODE,
+    DEFAULT_TRADER_TOP_N,
+    DEFAULT_TRADER_MAX_AGE,
+    TRADER_MODES,
+    CONF_UNKNOWN_FIELDS,
+    DEFAULT_UNKNOWN_FIELDS,
+    UNKNOWN_FIELDS_POLICIES,
+    CONF_LONG_TERM_STATISTICS,
+    DEFAULT_LONG_TERM_STATISTICS,
+    CONF_DIAGNOSTIC_SENSORS,
+    DEFAULT_DIAGNOSTIC_SENSORS,
+    CONF_HISTORY,
+    DEFAULT_HISTORY,
+    CONF_HISTORY_RETENTION,
+    DEFAULT_HISTORY_RETENTION,
+    CONF_THRESHOLDS,
+    THRESHOLD_KEYS,
+    THRESHOLD_DIRECTIONS,
+    THRESHOLD_ADD,
+    DEFAULT_THRESHOLD_HYSTERESIS,
+    DEFAULT_THRESHOLD_DWELL,
 )
 
 _LOGGER = logging.getLogger(__name__)
 
+
+@callback
+def _async_write_candidates(hass):
+    """
+    Ein Durchlauf über die Sensor-States (nach Domain indiziert, keine Registry-Abfragen):
+    Leistungs- und Spannungssensoren nach device_class, nach Name sortiert. Die Einheit
+    (W, kW; der Writer rechnet kW um / V) zählt nur für Sensoren ohne device_class.
+    """
+    power = []
+    voltage = []
+    for state in hass.states.async_all("sensor"):
+        attributes = state.attributes
+        device_class = attributes.get("device_class")
+        if device_class is None:
+            unit = attributes.get("unit_of_measurement")
+            if unit in WRITE_POWER_UNITS:
+                device_class = SensorDeviceClass.POWER
+            elif unit == WRITE_VOLTAGE_UNIT:
+                device_class = SensorDeviceClass.VOLTAGE
+        if device_class == SensorDeviceClass.POWER:
+            power.append((state.name.lower(), state.entity_id))
+        elif device_class == SensorDeviceClass.VOLTAGE:
+            voltage.append((state.name.lower(), state.entity_id))
+    return [entity_id for _, entity_id in sorted(power)], [entity_id for _, entity_id in sorted(voltage)]
+
+
+def _discovery_label(result: dict) -> str:
+    found = [name for name, key in (("Socket.IO", "socketio"), ("MeterDataAPI", "meter_api")) if result[key]]
+    return f"{result['host']} ({', '.join(found)}, {result['latency_ms']} ms)"
+
+
 class EFriendsConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Config Flow für die E-Friends Integration mit Unique ID (IP)."""
 
@@ -26,11 +126,19 @@ class EFriendsConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.temp_mode = None
         self.temp_api_key = None
         self.temp_entity = None
+        self._candidates = None
+        self._discovered = {}
 
     async def async_step_user(self, user_input=None):
+        """Schritt 1: Host selbst eingeben oder im Netz nach Metern suchen."""
+        return self.async_show_menu(step_id="user", menu_options=["manual", "discover"])
+
+    async def async_step_manual(self, user_input=None):
         """
-        Schritt 1: IP/Host abfragen.
+        Host eingeben.
         Setze die Unique ID = IP. Falls schon vorhanden => Abbruch.
+        Vor dem nächsten Schritt kurz prüfen, ob dort ein Meter antwortet.
+        Antwortet keins (z. B. Meter gerade aus), Warnung mit Auswahl statt Abbruch.
         """
         errors = {}
 
@@ -42,43 +150,110 @@ class EFriendsConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             self._abort_if_unique_id_configured()
 
             self.temp_host = host
+            # discovery.py (und damit socketio) erst laden, wenn der Flow es braucht
+            discovery = await async_import_submodule(self.hass, "discovery")
+            probe = await discovery.async_probe_host(async_get_clientsession(self.hass), host, PREFLIGHT_TIMEOUT)
+            if probe is None:
+                _LOGGER.warning("Unter %s antwortet kein E-Friends Meter", host)
+                return await self.async_step_unreachable()
             return await self.async_step_mode()
 
         data_schema = vol.Schema({
-            vol.Required("host", default="192.168.0.100"): cv.string
+            vol.Required("host", default=(user_input or {}).get("host", self.temp_host or DEFAULT_HOST)): cv.string
         })
         return self.async_show_form(
-            step_id="user",
+            step_id="manual",
             data_schema=data_schema,
             errors=errors
         )
-    
-    
+
+    async def async_step_unreachable(self, user_input=None):
+        """Kein Meter gefunden: trotzdem hinzufügen (verbindet sich später) oder Host ändern."""
+        return self.async_show_menu(
+            step_id="unreachable",
+            menu_options=["add_anyway", "manual"],
+            description_placeholders={"host": self.temp_host},
+        )
+
+    async def async_step_add_anyway(self, user_input=None):
+        return await self.async_step_mode()
+
+    async def async_step_discover(self, user_input=None):
+        """Subnetze/Hosts gleichzeitig nach Metern absuchen (Socket.IO und MeterDataAPI)."""
+        errors = {}
+        defaults = user_input or {}
+
+        if user_input is not None:
+            discovery = await async_import_submodule(self.hass, "discovery")
+            try:
+                hosts = discovery.expand_targets(user_input[CONF_DISCOVERY_TARGETS], user_input[CONF_DISCOVERY_PORT])
+            except discovery.DiscoveryTargetError as err:
+                _LOGGER.warning("Discovery: %s", err)
+                errors[CONF_DISCOVERY_TARGETS] = "invalid_targets"
+            else:
+                configured = self._async_current_ids()
+                found = await discovery.async_discover(
+                    async_get_clientsession(self.hass), [host for host in hosts if host not in configured]
+                )
+                if found:
+                    self._discovered = {result["host"]: _discovery_label(result) for result in found}
+                    return await self.async_step_discovered()
+                errors["base"] = "no_meters_found"
+
+        data_schema = vol.Schema({
+            vol.Required(
+                CONF_DISCOVERY_TARGETS, default=defaults.get(CONF_DISCOVERY_TARGETS, DEFAULT_DISCOVERY_TARGETS)
+            ): cv.string,
+            vol.Required(CONF_DISCOVERY_PORT, default=defaults.get(CONF_DISCOVERY_PORT, 80)): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=65535)
+            ),
+        })
+        return self.async_show_form(
+            step_id="discover",
+            data_schema=data_schema,
+            errors=errors
+        )
+
+    async def async_step_discovered(self, user_input=None):
+        """Gefundenes Meter auswählen."""
+        if user_input is not None:
+            host = user_input["host"]
+            await self.async_set_unique_id(host)
+            self._abort_if_unique_id_configured()
+            self.temp_host = host
+            return await self.async_step_mode()
+
+        data_schema = vol.Schema({
+            vol.Required("host"): vol.In(self._discovered)
+        })
+        return self.async_show_form(step_id="discovered", data_schema=data_schema)
+
     async def async_step_mode(self, user_input=None):
         """
-        Schritt 2: read/write.
+        Schritt 2: read/write/read_write.
         - read => Direkt Entry
-        - write => Weiter zu write_api_key
+        - write, read_write => Weiter zu write_settings
+          (read_write: lesen und schreiben in einer Entry, eine Verbindung zum Meter)
         """
         errors = {}
         if user_input is not None:
             selected_mode = user_input["mode"]
-            if selected_mode == "read":
+            if selected_mode == MODE_READ:
                 # Direkt
                 return self.async_create_entry(
                     title=f"E-Friends Read {self.temp_host}",
                     data={
                         CONF_HOST: self.temp_host,
-                        CONF_MODE: "read"
+                        CONF_MODE: MODE_READ
                     }
                 )
             else:
                 # => write
-                self.temp_mode = "write"
+                self.temp_mode = selected_mode
                 return await self.async_step_write_settings()
 
         data_schema = vol.Schema({
-            vol.Required("mode", default="read"): vol.In(["read", "write"])
+            vol.Required("mode", default=MODE_READ): vol.In(MODES)
         })
         return self.async_show_form(
             step_id="mode",
@@ -88,39 +263,61 @@ class EFriendsConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     
 
     async def async_step_write_settings(self, user_input=None):
-        """Beispiel: DropDown-Auswahl einer vorhandenen Sensor-Entity."""
+        """
+        API-Key, Verbrauchs-Entity und optional Entities pro Phase.
+        Leistung (W/kW) und Spannung (V) je als Mehrfachauswahl: die Reihenfolge
+        der Auswahl ergibt L1, L2, L3.
+        """
         errors = {}
+        defaults = user_input or {}
 
         if user_input is not None:
+            power_phases = user_input.get(CONF_POWER_PHASE_ENTITIES, [])
+            voltage_phases = user_input.get(CONF_VOLTAGE_PHASE_ENTITIES, [])
+            if len(power_phases) > 3:
+                errors[CONF_POWER_PHASE_ENTITIES] = "too_many_phases"
+            if len(voltage_phases) > 3:
+                errors[CONF_VOLTAGE_PHASE_ENTITIES] = "too_many_phases"
+
+        if user_input is not None and not errors:
             self.temp_api_key = user_input["api_key"]
             self.temp_entity = user_input["consumption_entity"]
 
+            data = {
+                CONF_HOST: self.temp_host,
+                CONF_MODE: self.temp_mode,
+                CONF_CONSUMPTION_ENTITY: self.temp_entity,
+                CONF_API_KEY: self.temp_api_key
+            }
+            # Optionale Entities pro Phase / Spannung (Auswahlreihenfolge => L1..L3)
+            for conf_key, entity_id in zip(WRITE_POWER_PHASE_KEYS, power_phases):
+                data[conf_key] = entity_id
+            for conf_key, entity_id in zip(WRITE_VOLTAGE_PHASE_KEYS, voltage_phases):
+                data[conf_key] = entity_id
+
+            title = "Read/Write" if self.temp_mode == MODE_READ_WRITE else "Write"
             return self.async_create_entry(
-                title=f"E-Friends Write {self.temp_host}",
-                data={
-                    CONF_HOST: self.temp_host,
-                    CONF_MODE: "write",
-                    CONF_CONSUMPTION_ENTITY: self.temp_entity,
-                    CONF_API_KEY: self.temp_api_key
-                }
+                title=f"E-Friends {title} {self.temp_host}",
+                data=data
             )
 
-        # 1) Hole das Entity-Registry
-        ent_reg = er.async_get(self.hass)
-        sensor_entities = []
-        for entity_id, entry in ent_reg.entities.items():
-            if entry.domain == "sensor":
-                # Prüfe im Zustand, ob unit_of_measurement == "W"
-                state_obj = self.hass.states.get(entry.entity_id)
-                if state_obj:
-                    uom = state_obj.attributes.get("unit_of_measurement")
-                    if uom == "W":  # oder "Watt"
-                        sensor_entities.append(entry.entity_id)
-
-            data_schema = vol.Schema({
-                vol.Required("api_key"): cv.string,
-                vol.Required("consumption_entity"): vol.In(sensor_entities)
-            })
+        # Kandidaten einmal pro Flow ermitteln (erneutes Anzeigen nach Fehlern nutzt den Cache)
+        if self._candidates is None:
+            self._candidates = _async_write_candidates(self.hass)
+        power_entities, voltage_entities = self._candidates
+
+        data_schema = vol.Schema({
+            vol.Required("api_key", default=defaults.get("api_key", vol.UNDEFINED)): cv.string,
+            vol.Required(
+                "consumption_entity", default=defaults.get("consumption_entity", vol.UNDEFINED)
+            ): selector.EntitySelector(selector.EntitySelectorConfig(include_entities=power_entities)),
+            vol.Optional(
+                CONF_POWER_PHASE_ENTITIES, default=defaults.get(CONF_POWER_PHASE_ENTITIES, [])
+            ): selector.EntitySelector(selector.EntitySelectorConfig(include_entities=power_entities, multiple=True)),
+            vol.Optional(
+                CONF_VOLTAGE_PHASE_ENTITIES, default=defaults.get(CONF_VOLTAGE_PHASE_ENTITIES, [])
+            ): selector.EntitySelector(selector.EntitySelectorConfig(include_entities=voltage_entities, multiple=True)),
+        })
 
         return self.async_show_form(
             step_id="write_settings",
@@ -138,6 +335,221 @@ class EFriendsOptionsFlow(config_entries.OptionsFlow):
 
     def __init__(self, config_entry):
         self.config_entry = config_entry
+        self.temp_group = None
+        self.temp_threshold = None
 
     async def async_step_init(self, user_input=None):
-        return self.async_create_entry(title="EFriends Options", data={})
+        """Auswahl: Bus-Events oder Publishing-Policy."""
+        return self.async_show_menu(
+            step_id="init",
+            menu_options=["events", "publish_policy", "traders", "thresholds", "writer"]
+        )
+
+    def _save_options(self, new_options: dict):
+        """Bestehende Optionen beibehalten und nur die geänderten überschreiben."""
+        return self.async_create_entry(
+            title="EFriends Options",
+            data={**self.config_entry.options, **new_options}
+        )
+
+    async def async_step_events(self, user_input=None):
+        """Bus-Events, unbekannte Frame-Felder, Langzeitstatistiken, lokale Historie und Diagnose-Sensoren."""
+        if user_input is not None:
+            return self._save_options(user_input)
+
+        options = self.config_entry.options
+        data_schema = vol.Schema({
+            vol.Required(
+                CONF_PUBLISH_EVENTS,
+                default=options.get(CONF_PUBLISH_EVENTS, DEFAULT_PUBLISH_EVENTS)
+            ): cv.boolean,
+            vol.Required(
+                CONF_EVENT_INTERVAL,
+                default=options.get(CONF_EVENT_INTERVAL, DEFAULT_EVENT_INTERVAL)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Required(
+                CONF_UNKNOWN_FIELDS,
+                default=options.get(CONF_UNKNOWN_FIELDS, DEFAULT_UNKNOWN_FIELDS)
+            ): vol.In(UNKNOWN_FIELDS_POLICIES),
+            vol.Required(
+                CONF_LONG_TERM_STATISTICS,
+                default=options.get(CONF_LONG_TERM_STATISTICS, DEFAULT_LONG_TERM_STATISTICS)
+            ): cv.boolean,
+            vol.Required(
+                CONF_HISTORY,
+                default=options.get(CONF_HISTORY, DEFAULT_HISTORY)
+            ): cv.boolean,
+            vol.Required(
+                CONF_HISTORY_RETENTION,
+                default=options.get(CONF_HISTORY_RETENTION, DEFAULT_HISTORY_RETENTION)
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3650)),
+            vol.Required(
+                CONF_DIAGNOSTIC_SENSORS,
+                default=options.get(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS)
+            ): cv.boolean,
+        })
+        return self.async_show_form(step_id="events", data_schema=data_schema)
+
+    async def async_step_traders(self, user_input=None):
+        """Trader-Ansicht (Entity pro Trader oder aggregiert) und Ablaufzeit."""
+        if user_input is not None:
+            return self._save_options(user_input)
+
+        options = self.config_entry.options
+        data_schema = vol.Schema({
+            vol.Required(
+                CONF_TRADER_MODE,
+                default=options.get(CONF_TRADER_MODE, DEFAULT_TRADER_MODE)
+            ): vol.In(TRADER_MODES),
+            vol.Required(
+                CONF_TRADER_TOP_N,
+                default=options.get(CONF_TRADER_TOP_N, DEFAULT_TRADER_TOP_N)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=50)),
+            vol.Required(
+                CONF_TRADER_MAX_AGE,
+                default=options.get(CONF_TRADER_MAX_AGE, DEFAULT_TRADER_MAX_AGE)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        })
+        return self.async_show_form(step_id="traders", data_schema=data_schema)
+
+    async def async_step_writer(self, user_input=None):
+        """Write-Mode: Sendeintervalle, Änderungsschwelle, HTTP-Timeout und Offline-Puffer."""
+        errors = {}
+        if user_input is not None:
+            if user_input[CONF_WRITE_MAX_INTERVAL] < user_input[CONF_WRITE_INTERVAL]:
+                errors[CONF_WRITE_MAX_INTERVAL] = "max_below_min_interval"
+            else:
+                return self._save_options(user_input)
+
+        options = self.config_entry.options
+        data_schema = vol.Schema({
+            vol.Required(
+                CONF_WRITE_INTERVAL,
+                default=options.get(CONF_WRITE_INTERVAL, DEFAULT_WRITE_INTERVAL)
+            ): vol.All(vol.Coerce(float), vol.Range(min=5)),
+            vol.Required(
+                CONF_WRITE_MAX_INTERVAL,
+                default=options.get(CONF_WRITE_MAX_INTERVAL, DEFAULT_WRITE_MAX_INTERVAL)
+            ): vol.All(vol.Coerce(float), vol.Range(min=5, max=3600)),
+            vol.Required(
+                CONF_WRITE_CHANGE_THRESHOLD,
+                default=options.get(CONF_WRITE_CHANGE_THRESHOLD, DEFAULT_WRITE_CHANGE_THRESHOLD)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Required(
+                CONF_WRITE_TIMEOUT,
+                default=options.get(CONF_WRITE_TIMEOUT, DEFAULT_WRITE_TIMEOUT)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=60)),
+            vol.Required(
+                CONF_WRITE_STATISTIC,
+                default=options.get(CONF_WRITE_STATISTIC, DEFAULT_WRITE_STATISTIC)
+            ): vol.In(WRITE_STATISTICS),
+            vol.Required(
+                CONF_WRITE_BUFFER_MAX_AGE,
+                default=options.get(CONF_WRITE_BUFFER_MAX_AGE, DEFAULT_WRITE_BUFFER_MAX_AGE)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Required(
+                CONF_WRITE_BUFFER_MAX_SIZE,
+                default=options.get(CONF_WRITE_BUFFER_MAX_SIZE, DEFAULT_WRITE_BUFFER_MAX_SIZE)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=100000)),
+            vol.Required(
+                CONF_WRITE_BUFFER_DROP_POLICY,
+                default=options.get(CONF_WRITE_BUFFER_DROP_POLICY, DEFAULT_WRITE_BUFFER_DROP_POLICY)
+            ): vol.In(WRITE_BUFFER_DROP_POLICIES),
+            vol.Required(
+                CONF_WRITE_DRAIN_YIELD_EVERY,
+                default=options.get(CONF_WRITE_DRAIN_YIELD_EVERY, DEFAULT_WRITE_DRAIN_YIELD_EVERY)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+        })
+        return self.async_show_form(step_id="writer", data_schema=data_schema, errors=errors)
+
+    async def async_step_thresholds(self, user_input=None):
+        """Schwellwert-Regel wählen (bearbeiten/löschen) oder eine neue anlegen."""
+        if user_input is not None:
+            self.temp_threshold = user_input["rule"]
+            return await self.async_step_threshold_rule()
+
+        rules = list(self.config_entry.options.get(CONF_THRESHOLDS, {}))
+        data_schema = vol.Schema({
+            vol.Required("rule", default=THRESHOLD_ADD): vol.In([THRESHOLD_ADD] + rules)
+        })
+        return self.async_show_form(step_id="thresholds", data_schema=data_schema)
+
+    async def async_step_threshold_rule(self, user_input=None):
+        """Feld, Richtung, Schwelle, Hysterese und Mindestdauer einer Regel."""
+        rules = dict(self.config_entry.options.get(CONF_THRESHOLDS, {}))
+        previous = None if self.temp_threshold == THRESHOLD_ADD else self.temp_threshold
+        errors = {}
+
+        if user_input is not None:
+            user_input = dict(user_input)
+            name = user_input.pop("name").strip()
+            delete = user_input.pop("delete", False)
+            if previous is not None:
+                rules.pop(previous, None)
+            if delete:
+                return self._save_options({CONF_THRESHOLDS: rules})
+            if not name or name == THRESHOLD_ADD:
+                errors["name"] = "invalid_name"
+            elif name in rules:
+                errors["name"] = "name_exists"
+            else:
+                rules[name] = user_input
+                return self._save_options({CONF_THRESHOLDS: rules})
+
+        current = rules.get(previous, {})
+        non_negative = vol.All(vol.Coerce(float), vol.Range(min=0))
+        schema = {
+            vol.Required("name", default=previous or ""): cv.string,
+            vol.Required("key", default=current.get("key", THRESHOLD_KEYS[0])): vol.In(THRESHOLD_KEYS),
+            vol.Required(
+                "direction", default=current.get("direction", THRESHOLD_DIRECTIONS[0])
+            ): vol.In(THRESHOLD_DIRECTIONS),
+            vol.Required("threshold", default=current.get("threshold", 0)): vol.Coerce(float),
+            vol.Required(
+                "hysteresis", default=current.get("hysteresis", DEFAULT_THRESHOLD_HYSTERESIS)
+            ): non_negative,
+            vol.Required("dwell", default=current.get("dwell", DEFAULT_THRESHOLD_DWELL)): non_negative,
+        }
+        if previous is not None:
+            schema[vol.Optional("delete", default=False)] = cv.boolean
+        return self.async_show_form(
+            step_id="threshold_rule",
+            data_schema=vol.Schema(schema),
+            errors=errors,
+        )
+
+    async def async_step_publish_policy(self, user_input=None):
+        """Sensorgruppe wählen, deren Publishing-Policy geändert werden soll."""
+        if user_input is not None:
+            self.temp_group = user_input["group"]
+            return await self.async_step_publish_group()
+
+        data_schema = vol.Schema({
+            vol.Required("group", default=PUBLISH_GROUPS[0]): vol.In(PUBLISH_GROUPS)
+        })
+        return self.async_show_form(step_id="publish_policy", data_schema=data_schema)
+
+    async def async_step_publish_group(self, user_input=None):
+        """Mindestintervall, Deadband und Heartbeat einer Sensorgruppe."""
+        group = self.temp_group
+        policies = dict(self.config_entry.options.get(CONF_PUBLISH_POLICY, {}))
+
+        if user_input is not None:
+            policies[group] = user_input
+            return self._save_options({CONF_PUBLISH_POLICY: policies})
+
+        current = {**DEFAULT_PUBLISH_POLICY[group], **policies.get(group, {})}
+        non_negative = vol.All(vol.Coerce(float), vol.Range(min=0))
+        data_schema = vol.Schema({
+            vol.Required("min_interval", default=current["min_interval"]): non_negative,
+            vol.Required("deadband_abs", default=current["deadband_abs"]): non_negative,
+            vol.Required("deadband_rel", default=current["deadband_rel"]): vol.All(
+                vol.Coerce(float), vol.Range(min=0, max=1)
+            ),
+            vol.Required("heartbeat", default=current["heartbeat"]): non_negative,
+        })
+        return self.async_show_form(
+            step_id="publish_group",
+            data_schema=data_schema,
+            description_placeholders={"group": group}
+        )
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import random
+import time
+
+import socketio
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import (
+    SIGNAL_READER_STATUS,
+    READER_RECONNECT_MIN_DELAY,
+    READER_RECONNECT_MAX_DELAY,
+    READER_WATCHDOG_INTERVAL,
+    READER_FRAME_TIMEOUT,
+    READER_STATE_CONNECTING,
+    READER_STATE_CONNECTED,
+    READER_STATE_STALLED,
+    READER_STATE_DISCONNECTED,
+    EVENT_RAWPOWER,
+    EVENT_TRADING_UPDATE,
+)
+from .helper import EFriendsEventPublisher
+from .ingest import EFriendsIngestQueue
+from .metrics import EFriendsMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EFriendsConnectionManager:
+    """
+    Meter-Verbindungen pro Host, geteilt von allen Entries (liegt in hass.data[DOMAIN]).
+    Pro Host gibt es genau einen Socket.IO-Reader; jede Entry, die liest, meldet sich
+    als Abonnent an (Referenzzählung). Der Reader verbindet beim ersten Abonnenten
+    und trennt, wenn der letzte geht. HTTP (Writer) läuft ohnehin über die geteilte
+    aiohttp-Session von HA und braucht hier keine eigene Verwaltung.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self._hass = hass
+        self._readers = {}  # host => EFriendsSocketIOReader
+
+    @callback
+    def async_acquire_reader(self, host: str, entry_id: str, publisher: EFriendsEventPublisher,
+                             metrics: EFriendsMetrics) -> "EFriendsReaderSubscription":
+        reader = self._readers.get(host)
+        if reader is None:
+            reader = self._readers[host] = EFriendsSocketIOReader(self._hass, host)
+            reader.async_start()
+        else:
+            _LOGGER.debug("Reader %s wird geteilt (%s Abonnenten)", host, len(reader.subscriptions) + 1)
+        subscription = EFriendsReaderSubscription(self._hass, reader, entry_id, publisher, metrics)
+        reader.subscriptions[entry_id] = subscription
+        reader.notify(subscription)
+        return subscription
+
+    async def async_release_reader(self, host: str, entry_id: str) -> None:
+        reader = self._readers.get(host)
+        if reader is None:
+            return
+        subscription = reader.subscriptions.pop(entry_id, None)
+        if subscription is not None:
+            subscription.ingest.clear()
+        if reader.subscriptions:
+            return
+        # Letzter Abonnent => Verbindung schließen
+        del self._readers[host]
+        await reader.async_unload()
+
+    def diagnostics(self) -> dict:
+        return {
+            host: {"state": reader.state, "entries": list(reader.subscriptions)}
+            for host, reader in self._readers.items()
+        }
+
+
+class EFriendsReaderSubscription:
+    """Anteil einer Entry an einem geteilten Reader: eigene Ingest-Queue, Metriken und Bus-Events."""
+
+    def __init__(self, hass: HomeAssistant, reader: "EFriendsSocketIOReader", entry_id: str,
+                 publisher: EFriendsEventPublisher, metrics: EFriendsMetrics):
+        self.reader = reader
+        self.entry_id = entry_id
+        self.metrics = metrics
+        self._publisher = publisher
+        # Begrenzte Warteschlange zwischen Empfang und Verarbeitung
+        self.ingest = EFriendsIngestQueue(hass, entry_id, metrics)
+
+    @callback
+    def put_raw(self, frame: dict, ts: float) -> None:
+        self.metrics.inc("frames_raw")
+        # Über die Ingest-Queue an sensor.py (pro Entry), nicht über den HA-Bus
+        self.ingest.put_raw(frame, ts)
+        self._publisher.async_publish(EVENT_RAWPOWER, frame)
+
+    @callback
+    def put_trading(self, summary: dict) -> None:
+        self.metrics.inc("frames_trading")
+        self.ingest.put_trading(summary)
+        self._publisher.async_publish(EVENT_TRADING_UPDATE, summary)
+
+    def health(self) -> dict:
+        return {**self.reader.health(), "ingest": self.ingest.metrics()}
+
+
+class EFriendsSocketIOReader:
+    """Socket.IO Reader => rawPowerMessage, PeerTradingModuleSummaryEvent
+
+    Läuft komplett im HA-Eventloop (socketio.AsyncClient), es werden keine
+    eigenen Threads belegt. Ein Supervisor-Task hält die Verbindung:
+    - Verbindungsaufbau mit exponentiellem Backoff (mit Jitter)
+    - nach jedem Connect erneut 'join' auf /MeterDataAPI
+    - Watchdog: kommen zu lange keine Frames, wird neu verbunden
+    Frames werden an alle Abonnenten (Entries) dieses Hosts verteilt.
+    """
+
+    def __init__(self, hass: HomeAssistant, host: str):
+        self._hass = hass
+        self._host = host
+        # Geteilte aiohttp-Session von HA verwenden, kein eigener Connector.
+        # handle_sigint=False: Signale gehören Home Assistant, nicht dem Client.
+        # reconnection=False: Reconnect (inkl. join) übernimmt der Supervisor.
+        self._sio = socketio.AsyncClient(
+            http_session=async_get_clientsession(hass),
+            handle_sigint=False,
+            reconnection=False,
+        )
+        self._connected = False
+        self._running = True
+        self._disconnected = asyncio.Event()
+        self._supervisor_task = None
+        self._last_frame = None  # time.monotonic() des letzten rawPowerMessage
+        self.state = READER_STATE_CONNECTING
+        self.reconnect_count = 0
+        self.subscriptions = {}  # entry_id => EFriendsReaderSubscription
+
+    @callback
+    def async_start(self):
+        # Registriere Events (Handler laufen direkt im Eventloop)
+        @self._sio.event
+        async def connect():
+            _LOGGER.info("Mit eFriends Socket.IO verbunden")
+            self._connected = True
+
+        @self._sio.event
+        async def disconnect():
+            _LOGGER.warning("Socket.IO (Reader) disconnected.")
+            self._connected = False
+            self._disconnected.set()
+
+        @self._sio.on("connect", namespace="/MeterDataAPI")
+        async def on_connect():
+            _LOGGER.debug("Verbunden mit Namespace /MeterDataAPI")
+
+        @self._sio.on("rawPowerMessage", namespace="/MeterDataAPI")
+        async def handle_raw_power(data):
+            self._last_frame = time.monotonic()
+            if self.state != READER_STATE_CONNECTED:
+                self._set_state(READER_STATE_CONNECTED)
+            ts = time.time()
+            for subscription in self.subscriptions.values():
+                subscription.put_raw(data, ts)
+
+        @self._sio.on("PeerTradingModuleSummaryEvent")
+        async def handle_trading_data(data):
+            _LOGGER.debug("PeerTradingModuleSummaryEvent: %s Felder", len(data))
+            for subscription in self.subscriptions.values():
+                subscription.put_trading(data)
+
+        # Setup nicht blockieren: Der Supervisor verbindet im Hintergrund
+        self._supervisor_task = self._hass.async_create_background_task(
+            self._supervise(), f"efriends reader {self._host}"
+        )
+
+    async def _connect(self) -> bool:
+        """Socket-Connect direkt im Eventloop (kein Executor nötig)."""
+        try:
+            _LOGGER.info(f"Verbinde zu ws://{self._host}/MeterDataAPI ...")
+            await self._sio.connect(f"ws://{self._host}")
+            await self._sio.emit('join', {}, namespace='/MeterDataAPI')
+            return True
+
+        except Exception as e:
+            _LOGGER.error(f"Fehler beim Verbinden zu {self._host}: {e}")
+            for subscription in self.subscriptions.values():
+                subscription.metrics.inc("connect_failures")
+            # Halb aufgebaute Verbindung (z. B. join oder Upgrade fehlgeschlagen)
+            # zurücksetzen, sonst scheitert jeder weitere Connect
+            try:
+                await self._sio.disconnect()
+            except Exception as err:
+                _LOGGER.debug("Disconnect nach Fehler: %s", err)
+            return False
+
+    async def _supervise(self):
+        """Verbindung aufbauen, überwachen und bei Abbruch/Stillstand neu aufbauen."""
+        attempt = 0
+        while self._running:
+            self._disconnected.clear()
+            if not await self._connect():
+                self._set_state(READER_STATE_DISCONNECTED)
+                await asyncio.sleep(_backoff_delay(attempt))
+                attempt += 1
+                continue
+            # Frame-Alter ab dem Connect messen, bis das erste Frame kommt
+            connected_at = self._last_frame = time.monotonic()
+            self._set_state(READER_STATE_CONNECTING)
+
+            # Watchdog: läuft, bis die Verbindung abbricht oder keine Frames mehr kommen
+            while self._running:
+                try:
+                    await asyncio.wait_for(self._disconnected.wait(), READER_WATCHDOG_INTERVAL)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                age = time.monotonic() - self._last_frame
+                if age > READER_FRAME_TIMEOUT:
+                    _LOGGER.warning(
+                        "Seit %.0f s keine Frames von %s => Verbindung wird neu aufgebaut", age, self._host
+                    )
+                    self._set_state(READER_STATE_STALLED)
+                    await self._sio.disconnect()
+                    break
+
+            if self._running:
+                self.reconnect_count += 1
+                if self.state != READER_STATE_STALLED:
+                    self._set_state(READER_STATE_DISCONNECTED)
+                # Backoff zurücksetzen, wenn die Verbindung Frames geliefert hat;
+                # nimmt das Meter Verbindungen an, ohne zu senden, wächst er weiter
+                attempt = 0 if self._last_frame != connected_at else attempt + 1
+                await asyncio.sleep(_backoff_delay(attempt))
+
+    def last_frame_age(self):
+        """Sekunden seit dem letzten Frame (None, solange noch nie verbunden)."""
+        if self._last_frame is None:
+            return None
+        return round(time.monotonic() - self._last_frame)
+
+    def health(self) -> dict:
+        return {
+            "state": self.state,
+            "reconnect_count": self.reconnect_count,
+            "last_frame_age": self.last_frame_age(),
+        }
+
+    @callback
+    def _set_state(self, state: str) -> None:
+        # Nur Zustandswechsel melden; Frame-Alter und Ingest-Zähler pollt sensor.py
+        if state == self.state:
+            return
+        _LOGGER.debug("Reader %s: %s => %s", self._host, self.state, state)
+        self.state = state
+        self._notify_all()
+
+    @callback
+    def notify(self, subscription: EFriendsReaderSubscription) -> None:
+        async_dispatcher_send(
+            self._hass, SIGNAL_READER_STATUS.format(subscription.entry_id), subscription.health()
+        )
+
+    @callback
+    def _notify_all(self) -> None:
+        for subscription in self.subscriptions.values():
+            self.notify(subscription)
+
+    async def async_unload(self):
+        self._running = False
+        _LOGGER.info("Socket.IO (Reader) unloading -> disconnect")
+        if self._supervisor_task is not None:
+            self._supervisor_task.cancel()
+        await self._sio.disconnect()
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponentieller Backoff mit Jitter (zwischen der Hälfte und dem vollen Wert)."""
+    delay = min(READER_RECONNECT_MAX_DELAY, READER_RECONNECT_MIN_DELAY * 2 ** min(attempt, 16))
+    return delay * (0.5 + random.random() / 2)
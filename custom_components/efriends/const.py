@@ -3,6 +3,19 @@ CONF_HOST = "host"
 CONF_MODE = "mode"
 CONF_CONSUMPTION_ENTITY = "consumption_entity"
 CONF_API_KEY = "api_key"
+
+# Betriebsarten: nur lesen (Socket.IO), nur schreiben (HTTP-POST) oder beides in einer Entry
+MODE_READ = "read"
+MODE_WRITE = "write"
+MODE_READ_WRITE = "read_write"
+MODES = [MODE_READ, MODE_WRITE, MODE_READ_WRITE]
+READ_MODES = (MODE_READ, MODE_READ_WRITE)
+WRITE_MODES = (MODE_WRITE, MODE_READ_WRITE)
+
+# Geteilte Meter-Verbindungen pro Host in hass.data[DOMAIN] (connection.py)
+DATA_CONNECTIONS = "connections"
+
+PLATFORMS = ["sensor", "binary_sensor"]
 DEFAULT_HOST = "192.168.0.100"
 TRADERS_FILE_PATH = "/config/efriends/"
 
@@ -10,3 +23,199 @@ CONF_NAME = "E-Friends Meter"
 CONF_MANUFACTURER = "E-Friends"
 CONF_MODEL = "SocketIO Meter"
 CONF_SW_VERSION = "1.0"
+
+# Interne Dispatcher-Signale (pro entry_id), gehen nicht über den HA-Bus/Recorder
+SIGNAL_RAWPOWER = "efriends_rawpower_{}"
+SIGNAL_TRADING_UPDATE = "efriends_trading_update_{}"
+SIGNAL_WRITE_STATUS = "efriends_write_status_{}"
+SIGNAL_READER_STATUS = "efriends_reader_status_{}"
+SIGNAL_THRESHOLD = "efriends_threshold_{}"
+
+# Optionale HA-Bus-Events (nur wenn in den Optionen aktiviert)
+EVENT_RAWPOWER = "efriends_rawpower"
+EVENT_TRADING_UPDATE = "efriends_trading_update"
+EVENT_WRITE_STATUS = "efriends_write_status"
+
+CONF_PUBLISH_EVENTS = "publish_events"
+CONF_EVENT_INTERVAL = "event_interval"
+DEFAULT_PUBLISH_EVENTS = False
+DEFAULT_EVENT_INTERVAL = 10
+
+# Publishing-Policy pro Sensorgruppe (siehe publish_policy.py)
+CONF_PUBLISH_POLICY = "publish_policy"
+PUBLISH_GROUPS = ["power", "current", "voltage", "energy", "statistics", "trade"]
+DEFAULT_PUBLISH_POLICY = {
+    "power":   {"min_interval": 5,  "deadband_abs": 5.0,  "deadband_rel": 0.0, "heartbeat": 60},
+    "current": {"min_interval": 5,  "deadband_abs": 0.05, "deadband_rel": 0.0, "heartbeat": 60},
+    "voltage": {"min_interval": 10, "deadband_abs": 0.5,  "deadband_rel": 0.0, "heartbeat": 300},
+    "energy":  {"min_interval": 60, "deadband_abs": 0.0,  "deadband_rel": 0.0, "heartbeat": 300},
+    "statistics": {"min_interval": 10, "deadband_abs": 1.0, "deadband_rel": 0.0, "heartbeat": 300},
+    "trade":   {"min_interval": 0,  "deadband_abs": 0.0,  "deadband_rel": 0.0, "heartbeat": 300},
+}
+
+# Energie-Integration (siehe energy.py)
+ENERGY_STORAGE_VERSION = 1
+ENERGY_SAVE_DELAY = 60
+ENERGY_MAX_GAP = 300
+
+# Read-Mode: Verbindungs-Supervisor (Backoff + Watchdog)
+READER_RECONNECT_MIN_DELAY = 2
+READER_RECONNECT_MAX_DELAY = 300
+READER_WATCHDOG_INTERVAL = 10
+READER_FRAME_TIMEOUT = 60
+# Frame-Alter und Ingest-Zähler der Diagnose-Sensoren werden nur so oft aktualisiert
+READER_HEALTH_POLL_INTERVAL = 60
+READER_STATE_CONNECTING = "connecting"
+READER_STATE_CONNECTED = "connected"
+READER_STATE_STALLED = "stalled"
+READER_STATE_DISCONNECTED = "disconnected"
+
+# Ingest-Queue zwischen Socket-Empfang und Verarbeitung (siehe ingest.py)
+INGEST_MAX_RAW_SAMPLES = 600
+INGEST_MAX_TRADING = 100
+
+# Laufzeit-Metriken, Diagnose-Sensoren und Profiling (siehe metrics.py)
+CONF_DIAGNOSTIC_SENSORS = "diagnostic_sensors"
+DEFAULT_DIAGNOSTIC_SENSORS = False
+METRICS_SENSOR_INTERVAL = 60
+SERVICE_PROFILE = "profile"
+PROFILE_MAX_DURATION = 600
+
+# Langzeitstatistiken direkt in den Recorder (siehe longterm.py)
+CONF_LONG_TERM_STATISTICS = "long_term_statistics"
+DEFAULT_LONG_TERM_STATISTICS = True
+LONGTERM_STORAGE_VERSION = 1
+LONGTERM_SAVE_DELAY = 60
+
+# Rolling-Statistiken (siehe rolling.py): Startgröße der Ringpuffer, sie wachsen mit der Frame-Rate
+ROLLING_INITIAL_CAPACITY = 64
+
+# Write-Mode (HTTP-POST an /v3/MeterDataAPI/MeterData)
+# write_interval ist der Mindestabstand zweier Sendungen; bei konstanter Last
+# wird der Abstand bis write_max_interval verdoppelt, ändert sich powerTotal
+# um mehr als write_change_threshold (W), wird sofort gesendet
+CONF_WRITE_INTERVAL = "write_interval"
+CONF_WRITE_MAX_INTERVAL = "write_max_interval"
+CONF_WRITE_CHANGE_THRESHOLD = "write_change_threshold"
+CONF_WRITE_TIMEOUT = "write_timeout"
+DEFAULT_WRITE_INTERVAL = 5
+DEFAULT_WRITE_MAX_INTERVAL = 60
+DEFAULT_WRITE_CHANGE_THRESHOLD = 50
+DEFAULT_WRITE_TIMEOUT = 5
+
+# Offline-Puffer des Writers (siehe write_buffer.py)
+CONF_WRITE_BUFFER_MAX_AGE = "write_buffer_max_age"
+CONF_WRITE_BUFFER_MAX_SIZE = "write_buffer_max_size"
+CONF_WRITE_BUFFER_DROP_POLICY = "write_buffer_drop_policy"
+CONF_WRITE_DRAIN_YIELD_EVERY = "write_drain_yield_every"
+DEFAULT_WRITE_BUFFER_MAX_AGE = 3600
+DEFAULT_WRITE_BUFFER_MAX_SIZE = 720
+DEFAULT_WRITE_BUFFER_DROP_POLICY = "drop_oldest"
+DEFAULT_WRITE_DRAIN_YIELD_EVERY = 10
+WRITE_BUFFER_DROP_POLICIES = ["drop_oldest", "drop_newest"]
+WRITE_BUFFER_STORAGE_VERSION = 1
+WRITE_BUFFER_SAVE_DELAY = 30
+
+# Write-Mode: optionale Entities pro Phase / Spannung und Aggregation
+CONF_POWER_L1_ENTITY = "power_l1_entity"
+CONF_POWER_L2_ENTITY = "power_l2_entity"
+CONF_POWER_L3_ENTITY = "power_l3_entity"
+CONF_VOLTAGE_L1_ENTITY = "voltage_l1_entity"
+CONF_VOLTAGE_L2_ENTITY = "voltage_l2_entity"
+CONF_VOLTAGE_L3_ENTITY = "voltage_l3_entity"
+WRITE_PHASE_ENTITIES = [
+    (CONF_POWER_L1_ENTITY, "power1Watt"),
+    (CONF_POWER_L2_ENTITY, "power2Watt"),
+    (CONF_POWER_L3_ENTITY, "power3Watt"),
+    (CONF_VOLTAGE_L1_ENTITY, "voltage1Volt"),
+    (CONF_VOLTAGE_L2_ENTITY, "voltage2Volt"),
+    (CONF_VOLTAGE_L3_ENTITY, "voltage3Volt"),
+]
+# Config-Flow: Mehrfachauswahl pro Phase (Reihenfolge => L1..L3) und zulässige Einheiten
+CONF_POWER_PHASE_ENTITIES = "power_phase_entities"
+CONF_VOLTAGE_PHASE_ENTITIES = "voltage_phase_entities"
+WRITE_POWER_PHASE_KEYS = [CONF_POWER_L1_ENTITY, CONF_POWER_L2_ENTITY, CONF_POWER_L3_ENTITY]
+WRITE_VOLTAGE_PHASE_KEYS = [CONF_VOLTAGE_L1_ENTITY, CONF_VOLTAGE_L2_ENTITY, CONF_VOLTAGE_L3_ENTITY]
+WRITE_POWER_UNITS = ("W", "kW")
+WRITE_VOLTAGE_UNIT = "V"
+DEFAULT_VOLTAGE = 230
+CONF_WRITE_STATISTIC = "write_statistic"
+DEFAULT_WRITE_STATISTIC = "mean"
+WRITE_STATISTICS = ["mean", "min", "max", "last"]
+
+# Trader-Persistenz (helper.EFriendsTraderStore)
+TRADERS_STORAGE_VERSION = 2
+TRADERS_SAVE_DELAY = 10
+
+# Trader-Ansicht: eine Entity pro Trader oder wenige aggregierte Entities
+CONF_TRADER_MODE = "trader_mode"
+CONF_TRADER_TOP_N = "trader_top_n"
+CONF_TRADER_MAX_AGE = "trader_max_age"
+TRADER_MODE_ENTITIES = "entities"
+TRADER_MODE_AGGREGATE = "aggregate"
+TRADER_MODES = [TRADER_MODE_ENTITIES, TRADER_MODE_AGGREGATE]
+DEFAULT_TRADER_MODE = TRADER_MODE_ENTITIES
+DEFAULT_TRADER_TOP_N = 5
+DEFAULT_TRADER_MAX_AGE = 30 * 24 * 3600
+TRADER_EVICTION_INTERVAL = 3600
+SERVICE_GET_TRADERS = "get_traders"
+
+# Frame-Decoder: Umgang mit unbekannten Feldern vom Meter (siehe decoder.py)
+CONF_UNKNOWN_FIELDS = "unknown_fields"
+UNKNOWN_FIELDS_IGNORE = "ignore"
+UNKNOWN_FIELDS_LOG = "log"
+UNKNOWN_FIELDS_COLLECT = "collect"
+UNKNOWN_FIELDS_POLICIES = [UNKNOWN_FIELDS_IGNORE, UNKNOWN_FIELDS_LOG, UNKNOWN_FIELDS_COLLECT]
+DEFAULT_UNKNOWN_FIELDS = UNKNOWN_FIELDS_LOG
+# Nach einem Frame mit fehlendem Feld (z. B. Meter mit zwei Phasen) so viele Frames
+# direkt Feld für Feld dekodieren, bevor der Schnellpfad wieder versucht wird
+DECODER_FAST_RETRY = 100
+
+# Lokale Historie (siehe history.py): Rohframes und Trading-Summaries, eine
+# Binärdatei pro Serie und Tag unter <config>/efriends_history/<entry_id>/
+CONF_HISTORY = "history"
+CONF_HISTORY_RETENTION = "history_retention"
+DEFAULT_HISTORY = False
+DEFAULT_HISTORY_RETENTION = 30  # Tage
+HISTORY_DIRECTORY = "efriends_history"
+HISTORY_KINDS = ["raw", "trading"]
+HISTORY_FLUSH_INTERVAL = 60
+HISTORY_FLUSH_BYTES = 256 * 1024
+HISTORY_READ_CHUNK = 4096  # Datensätze pro Lesevorgang
+HISTORY_MAX_POINTS = 5000
+DEFAULT_HISTORY_RESOLUTION = 60
+SERVICE_GET_HISTORY = "get_history"
+SERVICE_EXPORT_HISTORY = "export_history"
+
+# Schwellwerte mit Hysterese und Mindestdauer (siehe thresholds.py).
+# Optionen: {name: {key, direction, threshold, hysteresis, dwell}}, je Regel ein Binary-Sensor
+# und bei jedem Wechsel ein Bus-Event (nicht rate-limitiert, feuert nur bei Übergängen)
+CONF_THRESHOLDS = "thresholds"
+EVENT_THRESHOLD = "efriends_threshold"
+THRESHOLD_KEYS = [
+    "powerTotal", "power1Watt", "power2Watt", "power3Watt", "energyBalance", "remainingEnergyBalance",
+]
+THRESHOLD_ABOVE = "above"
+THRESHOLD_BELOW = "below"
+THRESHOLD_DIRECTIONS = [THRESHOLD_ABOVE, THRESHOLD_BELOW]
+THRESHOLD_ADD = "add"
+DEFAULT_THRESHOLD_HYSTERESIS = 100
+DEFAULT_THRESHOLD_DWELL = 30
+
+# Optionen, die nur beim Setup gelesen werden: Änderung => Entry wird automatisch neu geladen
+RELOAD_OPTIONS = [
+    CONF_TRADER_MODE, CONF_UNKNOWN_FIELDS, CONF_LONG_TERM_STATISTICS, CONF_DIAGNOSTIC_SENSORS, CONF_THRESHOLDS,
+    CONF_HISTORY,
+]
+
+# Stores pro Entry neben den Tradern (werden beim Löschen der Entry entfernt)
+ENTRY_STORE_SUFFIXES = ("energy", "longterm", "write_buffer")
+
+# Config-Flow: Suche nach Metern (discovery.py) und Prüfung eines eingegebenen Hosts
+CONF_DISCOVERY_TARGETS = "targets"
+CONF_DISCOVERY_PORT = "port"
+DEFAULT_DISCOVERY_TARGETS = "192.168.0.0/24"
+DISCOVERY_PARALLEL = 64
+DISCOVERY_TIMEOUT = 1.5
+DISCOVERY_MAX_HOSTS = 1024
+PREFLIGHT_TIMEOUT = 3
@@ -0,0 +1,148 @@
+import logging
+from operator import itemgetter
+
+from .const import DECODER_FAST_RETRY, UNKNOWN_FIELDS_COLLECT, UNKNOWN_FIELDS_IGNORE
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RecordLayout:
+    """Feste Slot-Belegung (Feldname => Index) für einen Datensatz (Liste von floats)."""
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self.slots = {key: index for index, key in enumerate(self.keys)}
+
+    def new_record(self) -> list:
+        # Liste statt array('d'): Lesen gibt das vorhandene float zurück (kein Boxing pro
+        # Sensor und Frame), und float() auf ein float liefert beim Dekodieren dasselbe Objekt
+        return [0.0] * len(self.keys)
+
+    def as_dict(self, record: list) -> dict:
+        return dict(zip(self.keys, record))
+
+
+class FrameDecoder:
+    """
+    Wird einmal aus den Sensor-Definitionstabellen kompiliert und dekodiert ein
+    Frame (dict vom Meter) in einem Durchlauf in einen Datensatz des Layouts.
+    - fehlende Felder => default (wie bisher 0.0)
+    - ungültige Werte => alter Wert bleibt, wird gezählt
+    - unbekannte Felder => je nach Policy ignorieren, einmal loggen oder sammeln (extras)
+    """
+
+    def __init__(self, layout: RecordLayout, frame_keys, default: float = 0.0,
+                 unknown_policy: str = UNKNOWN_FIELDS_IGNORE, ignore_keys=()):
+        self.layout = layout
+        frame_keys = tuple(frame_keys)
+        self._fields = tuple((layout.slots[key], key) for key in frame_keys)
+        # Schnellpfad: alle Felder vorhanden => ein itemgetter-Aufruf und map(float) per
+        # Slice-Zuweisung in den Datensatz (setzt zusammenhängende Slots voraus). Zahlen
+        # und Strings (ältere Firmware) laufen beide darüber; die Liste wird erst nach
+        # der Umwandlung aller Werte zugewiesen, ein ungültiger Wert ändert also nichts.
+        slots = [slot for slot, _ in self._fields]
+        # Frames bis zum nächsten Versuch über den Schnellpfad (-1: kein Schnellpfad möglich)
+        self._fast_skip = -1
+        if len(slots) > 1 and slots == list(range(slots[0], slots[0] + len(slots))):
+            self._getter = itemgetter(*frame_keys)
+            self._range = slice(slots[0], slots[0] + len(slots))
+            self._fast_skip = 0
+        self._frame_keys = frozenset(frame_keys)
+        self._ignore_keys = frozenset(ignore_keys)
+        # Felder außerhalb des Decoders (unbekannt + ignoriert) im letzten Frame und die
+        # unbekannten davon: gleiche Länge und alle vorhanden => gleiche Keys wie zuletzt
+        self._other_keys = frozenset()
+        self._unknown = ()
+        self._frame_len = len(self._fields)
+        self._default = default
+        self.unknown_policy = unknown_policy
+        self._track_unknown = unknown_policy != UNKNOWN_FIELDS_IGNORE
+        self._collect = unknown_policy == UNKNOWN_FIELDS_COLLECT
+        self.extras = {}
+        self.unknown_fields = set()
+        self.invalid_count = 0
+
+    def decode_into(self, frame: dict, record: list) -> int:
+        """Frame in record schreiben. Gibt die Anzahl ungültiger Felder zurück."""
+        if not self._fast_skip:
+            try:
+                record[self._range] = map(float, self._getter(frame))
+            except KeyError:
+                # Fehlt ein Feld, liefert das Meter meist länger so (z. B. nur zwei Phasen)
+                self._fast_skip = DECODER_FAST_RETRY
+            except (TypeError, ValueError):
+                pass
+            else:
+                # Nur die Decoder-Felder im Frame => nichts Unbekanntes zu prüfen
+                if self._track_unknown and (len(frame) != self._frame_len or self._other_keys):
+                    self._handle_unknown_fast(frame)
+                return 0
+        elif self._fast_skip > 0:
+            self._fast_skip -= 1
+        return self._decode_slow(frame, record)
+
+    def _decode_slow(self, frame: dict, record: list) -> int:
+        """Feld für Feld (fehlende Felder, ungültige Werte)."""
+        get = frame.get
+        default = self._default
+        invalid = 0
+        try:
+            # Eine Ausnahme nur bei ungültigen Werten
+            for slot, key in self._fields:
+                record[slot] = float(get(key, default))
+        except (TypeError, ValueError):
+            invalid = self._decode_checked(get, record)
+        if invalid:
+            self.invalid_count += invalid
+            _LOGGER.debug("FrameDecoder: %s ungültige Felder in %s", invalid, frame)
+
+        if self._track_unknown:
+            self._handle_unknown(frame)
+        return invalid
+
+    def _decode_checked(self, get, record: list) -> int:
+        """Jedes Feld einzeln prüfen: ungültige Werte zählen, dort bleibt der alte Wert."""
+        invalid = 0
+        for slot, key in self._fields:
+            try:
+                record[slot] = float(get(key, self._default))
+            except (TypeError, ValueError):
+                invalid += 1
+        return invalid
+
+    def _handle_unknown_fast(self, frame: dict) -> None:
+        """Nach dem Schnellpfad (alle Felder vorhanden): unbekannte Felder nur bei geänderten Keys neu bestimmen."""
+        if len(frame) != self._frame_len or not frame.keys() >= self._other_keys:
+            self._handle_unknown(frame)
+            return
+        if self._collect:
+            extras = self.extras
+            for key in self._unknown:
+                extras[key] = frame[key]
+
+    def _handle_unknown(self, frame: dict) -> None:
+        other = frame.keys() - self._frame_keys
+        self._other_keys = frozenset(other)
+        self._frame_len = len(self._fields) + len(other)
+        unknown = other - self._ignore_keys
+        self._unknown = tuple(unknown)
+        if not unknown:
+            return
+        for key in unknown - self.unknown_fields:
+            self.unknown_fields.add(key)
+            _LOGGER.info("FrameDecoder: unbekanntes Feld '%s' im Frame", key)
+        if self._collect:
+            for key in unknown:
+                self.extras[key] = frame[key]
+
+
+def compile_decoder(definitions, frame_groups, unknown_policy: str = UNKNOWN_FIELDS_IGNORE,
+                    ignore_keys=()) -> FrameDecoder:
+    """
+    Decoder aus einer Sensor-Definitionstabelle (uid, name, key, unit, group) bauen.
+    Alle Keys bekommen einen Slot im Datensatz; dekodiert werden nur die Keys,
+    deren Gruppe aus dem Frame kommt (der Rest wird berechnet, z. B. Energie).
+    """
+    layout = RecordLayout(key for _, _, key, _, _ in definitions)
+    frame_keys = [key for _, _, key, _, group in definitions if group in frame_groups]
+    return FrameDecoder(layout, frame_keys, unknown_policy=unknown_policy, ignore_keys=ignore_keys)
@@ -0,0 +1,43 @@
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_API_KEY, DATA_CONNECTIONS
+
+TO_REDACT = {CONF_API_KEY}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Diagnose-Download: Optionen, Laufzeit-Metriken und Zustand von Reader/Writer."""
+    data = hass.data.get(DOMAIN, {}).get(entry.entry_id, {})
+    diagnostics = {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "mode": data.get("mode"),
+    }
+    if "metrics" in data:
+        diagnostics["metrics"] = data["metrics"].as_dict()
+    if "socket_reader" in data:
+        diagnostics["reader"] = data["socket_reader"].health()
+    if "raw_decoder" in data:
+        decoder = data["raw_decoder"]
+        diagnostics["decoder"] = {
+            "unknown_fields": sorted(decoder.unknown_fields),
+            "invalid_count": decoder.invalid_count,
+        }
+    if "trade_data" in data:
+        diagnostics["traders"] = {
+            "count": len(data["trade_data"]["traders"]),
+            "mode": data.get("trader_mode"),
+        }
+    if "history" in data:
+        diagnostics["history"] = data["history"].diagnostics()
+    if "thresholds" in data:
+        diagnostics["thresholds"] = data["thresholds"].diagnostics()
+    if "writer" in data:
+        diagnostics["writer"] = data["writer"].diagnostics()
+    if DATA_CONNECTIONS in hass.data.get(DOMAIN, {}):
+        diagnostics["connections"] = hass.data[DOMAIN][DATA_CONNECTIONS].diagnostics()
+    return diagnostics
@@ -0,0 +1,128 @@
+import asyncio
+import ipaddress
+import logging
+import time
+
+import aiohttp
+import socketio
+
+from .const import (
+    DISCOVERY_MAX_HOSTS,
+    DISCOVERY_PARALLEL,
+    DISCOVERY_TIMEOUT,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+METER_DATA_PATH = "/v3/MeterDataAPI/MeterData"
+METER_NAMESPACE = "/MeterDataAPI"
+
+
+class DiscoveryTargetError(ValueError):
+    """Ungültige oder zu große Zielliste (Subnetz/Hosts)."""
+
+
+def expand_targets(text: str, port: int = 80) -> list:
+    """
+    Zielliste aus dem Config-Flow auflösen: durch Komma/Leerzeichen getrennte
+    Hosts (optional mit :port) und Subnetze in CIDR-Schreibweise (192.168.0.0/24).
+    Hosts ohne Port bekommen port (80 => ohne Angabe).
+    """
+    hosts = []
+    for item in text.replace(",", " ").split():
+        if "/" in item:
+            try:
+                network = ipaddress.ip_network(item, strict=False)
+            except ValueError as err:
+                raise DiscoveryTargetError(f"Ungültiges Subnetz: {item}") from err
+            if network.num_addresses > DISCOVERY_MAX_HOSTS + 2:
+                raise DiscoveryTargetError(f"Subnetz zu groß: {item} (max. {DISCOVERY_MAX_HOSTS} Hosts)")
+            hosts.extend(_with_port(str(address), port) for address in network.hosts())
+        else:
+            hosts.append(item if ":" in item else _with_port(item, port))
+    # Reihenfolge beibehalten, Duplikate entfernen
+    hosts = list(dict.fromkeys(hosts))
+    if len(hosts) > DISCOVERY_MAX_HOSTS:
+        raise DiscoveryTargetError(f"Zu viele Hosts ({len(hosts)}, max. {DISCOVERY_MAX_HOSTS})")
+    return hosts
+
+
+def _with_port(host: str, port: int) -> str:
+    return host if port == 80 else f"{host}:{port}"
+
+
+async def async_probe_host(session: aiohttp.ClientSession, host: str, timeout: float = DISCOVERY_TIMEOUT):
+    """
+    Prüft einen Host auf ein E-Friends Meter:
+    - socketio: Engine.IO-Handshake auf /socket.io/ (Polling) liefert eine sid und der
+      Socket.IO-Server nimmt den Namespace /MeterDataAPI an, wie beim Reader.
+      Ein beliebiger Webserver oder Socket.IO-Dienst zählt damit nicht als Meter.
+    - meter_api: /v3/MeterDataAPI/MeterData existiert (jede Antwort außer 404),
+      nur als Zusatzinfo für den Write-Mode
+    Gibt None zurück, wenn der Host nicht antwortet oder den Meter-Namespace nicht kennt.
+    """
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    start = time.perf_counter()
+    result = {"host": host, "socketio": False, "meter_api": False}
+    try:
+        # Günstiger Vorfilter, bevor ein Socket.IO-Client aufgebaut wird
+        async with session.get(
+            f"http://{host}/socket.io/", params={"EIO": "4", "transport": "polling"},
+            timeout=client_timeout,
+        ) as resp:
+            if resp.status != 200 or '"sid"' not in await resp.text():
+                return None
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+        _LOGGER.debug("Probe %s: %s", host, err)
+        return None
+
+    result["socketio"] = await _async_probe_namespace(session, host, timeout)
+    if not result["socketio"]:
+        _LOGGER.debug("Probe %s: Socket.IO ohne Namespace %s, kein Meter", host, METER_NAMESPACE)
+        return None
+    try:
+        async with session.get(f"http://{host}{METER_DATA_PATH}", timeout=client_timeout) as resp:
+            result["meter_api"] = resp.status != 404
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+        _LOGGER.debug("Probe %s (MeterDataAPI): %s", host, err)
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000.0)
+    return result
+
+
+async def _async_probe_namespace(session: aiohttp.ClientSession, host: str, timeout: float) -> bool:
+    """Mit dem Namespace /MeterDataAPI verbinden (Polling) und sofort wieder trennen."""
+    sio = socketio.AsyncClient(http_session=session, handle_sigint=False, reconnection=False)
+    try:
+        await asyncio.wait_for(
+            sio.connect(
+                f"http://{host}", namespaces=[METER_NAMESPACE], transports=["polling"], wait_timeout=timeout
+            ),
+            timeout,
+        )
+        return True
+    except (socketio.exceptions.ConnectionError, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as err:
+        _LOGGER.debug("Probe %s (Namespace): %s", host, err)
+        return False
+    finally:
+        try:
+            await sio.disconnect()
+        except Exception as err:
+            _LOGGER.debug("Probe %s: Disconnect: %s", host, err)
+
+
+async def async_discover(session: aiohttp.ClientSession, hosts: list, parallel: int = DISCOVERY_PARALLEL,
+                         timeout: float = DISCOVERY_TIMEOUT) -> list:
+    """Hosts gleichzeitig prüfen (höchstens parallel auf einmal); gefundene Meter in Reihenfolge der Zielliste."""
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def probe(host):
+        async with semaphore:
+            return await async_probe_host(session, host, timeout)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(probe(host) for host in hosts))
+    found = [result for result in results if result is not None]
+    _LOGGER.info(
+        "Discovery: %s von %s Hosts in %.1f s", len(found), len(hosts), time.perf_counter() - start
+    )
+    return found
@@ -0,0 +1,186 @@
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    ENERGY_MAX_GAP,
+    ENERGY_SAVE_DELAY,
+    ENERGY_STORAGE_VERSION,
+)
+from .helper import EFriendsPeriodicSave
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _local_date(ts: float) -> date:
+    return dt_util.as_local(datetime.fromtimestamp(ts, timezone.utc)).date()
+
+
+def _trapezoid(p0: float, p1: float, dt: float):
+    """
+    Fläche unter der Geraden p0 -> p1 über dt Sekunden, getrennt nach
+    Bezug (p > 0) und Einspeisung (p < 0). Ergebnis in Wh.
+    Bei Vorzeichenwechsel wird am Nulldurchgang geteilt.
+    """
+    if p0 >= 0 and p1 >= 0:
+        return (p0 + p1) / 2.0 * dt / 3600.0, 0.0
+    if p0 <= 0 and p1 <= 0:
+        return 0.0, -(p0 + p1) / 2.0 * dt / 3600.0
+    t_zero = dt * p0 / (p0 - p1)
+    first = abs(p0) * t_zero / 2.0 / 3600.0
+    second = abs(p1) * (dt - t_zero) / 2.0 / 3600.0
+    if p0 > 0:
+        return first, second
+    return second, first
+
+
+class EnergyIntegrator:
+    """
+    Integriert powerTotal über die echten Zeitstempel (Trapezregel),
+    getrennt nach Bezug (import) und Einspeisung (export).
+    Rollover um lokale Mitternacht nach yesterday.
+    Lücken > max_gap (z. B. HA war lange aus) werden nicht integriert.
+    """
+
+    def __init__(self, max_gap: float = ENERGY_MAX_GAP):
+        self.max_gap = max_gap
+        self.day = None
+        self.today_import_wh = 0.0
+        self.today_export_wh = 0.0
+        self.yesterday_import_wh = 0.0
+        self.yesterday_export_wh = 0.0
+        self.last_ts = None
+        self.last_power = None
+        self._saver = None
+
+    @property
+    def today_wh(self) -> float:
+        return self.today_import_wh + self.today_export_wh
+
+    @property
+    def yesterday_wh(self) -> float:
+        return self.yesterday_import_wh + self.yesterday_export_wh
+
+    def add_sample(self, power: float, ts: float) -> None:
+        """Neuen Messwert (W) zum Zeitpunkt ts (Unix-Sekunden) einrechnen."""
+        last_ts = self.last_ts
+        if last_ts is not None and ts <= last_ts:
+            # Doppelte oder verspätete Frames nicht zählen
+            return
+
+        if last_ts is not None and ts - last_ts <= self.max_gap:
+            self._integrate(last_ts, self.last_power, ts, power)
+        else:
+            self.roll_over(ts)
+
+        self.last_ts = ts
+        self.last_power = power
+        self.async_checkpoint()
+
+    def roll_over(self, ts: float) -> bool:
+        """Tageswechsel prüfen (auch ohne neue Frames, z. B. per Timer um Mitternacht)."""
+        return self._ensure_day(_local_date(ts))
+
+    def _ensure_day(self, day: date) -> bool:
+        if self.day is None:
+            self.day = day
+            return False
+        if day <= self.day:
+            return False
+        if day == self.day + timedelta(days=1):
+            self.yesterday_import_wh = self.today_import_wh
+            self.yesterday_export_wh = self.today_export_wh
+        else:
+            # Mehr als ein Tag ohne Daten
+            self.yesterday_import_wh = 0.0
+            self.yesterday_export_wh = 0.0
+        self.today_import_wh = 0.0
+        self.today_export_wh = 0.0
+        self.day = day
+        _LOGGER.debug("EnergyIntegrator: Rollover auf %s", day)
+        return True
+
+    def _integrate(self, t0: float, p0: float, t1: float, p1: float) -> None:
+        """Intervall t0 -> t1 integrieren, an lokalen Mitternachten aufteilen."""
+        day0 = _local_date(t0)
+        self._ensure_day(day0)
+        while True:
+            boundary = dt_util.start_of_local_day(day0 + timedelta(days=1)).timestamp()
+            if t1 <= boundary:
+                break
+            # Leistung an der Tagesgrenze linear interpolieren
+            p_boundary = p0 + (p1 - p0) * (boundary - t0) / (t1 - t0)
+            self._add(day0, *_trapezoid(p0, p_boundary, boundary - t0))
+            t0, p0 = boundary, p_boundary
+            day0 = _local_date(boundary)
+            self._ensure_day(day0)
+        self._add(day0, *_trapezoid(p0, p1, t1 - t0))
+
+    def _add(self, day: date, import_wh: float, export_wh: float) -> None:
+        if day == self.day:
+            self.today_import_wh += import_wh
+            self.today_export_wh += export_wh
+        elif day == self.day - timedelta(days=1):
+            # Rollover lief bereits (Timer), Rest gehört noch zu gestern
+            self.yesterday_import_wh += import_wh
+            self.yesterday_export_wh += export_wh
+
+    def as_dict(self) -> dict:
+        return {
+            "day": self.day.isoformat() if self.day else None,
+            "today_import_wh": self.today_import_wh,
+            "today_export_wh": self.today_export_wh,
+            "yesterday_import_wh": self.yesterday_import_wh,
+            "yesterday_export_wh": self.yesterday_export_wh,
+            "last_ts": self.last_ts,
+            "last_power": self.last_power,
+        }
+
+    def load_dict(self, stored: dict) -> None:
+        day = stored.get("day")
+        self.day = date.fromisoformat(day) if day else None
+        self.today_import_wh = float(stored.get("today_import_wh", 0.0))
+        self.today_export_wh = float(stored.get("today_export_wh", 0.0))
+        self.yesterday_import_wh = float(stored.get("yesterday_import_wh", 0.0))
+        self.yesterday_export_wh = float(stored.get("yesterday_export_wh", 0.0))
+        self.last_ts = stored.get("last_ts")
+        self.last_power = stored.get("last_power")
+
+    def attach_store(self, store: Store) -> None:
+        self._saver = EFriendsPeriodicSave(store, self.as_dict, ENERGY_SAVE_DELAY)
+
+    def async_checkpoint(self) -> None:
+        """Checkpoint anstoßen: höchstens alle ENERGY_SAVE_DELAY Sekunden ein Schreibvorgang."""
+        if self._saver is not None:
+            self._saver.async_schedule()
+
+    async def async_save(self) -> None:
+        """Sofort speichern (Unload/Reload), ersetzt ein ausstehendes verzögertes Speichern."""
+        if self._saver is not None:
+            await self._saver.async_save()
+
+    def update_data(self, record, slots: dict) -> None:
+        """Werte in den Datensatz der Sensoren übernehmen (slots: Feldname => Index)."""
+        record[slots["todayWatt"]] = self.today_wh
+        record[slots["today"]] = self.today_wh / 1000.0
+        record[slots["yesterday"]] = self.yesterday_wh / 1000.0
+        record[slots["todayImport"]] = self.today_import_wh / 1000.0
+        record[slots["todayExport"]] = self.today_export_wh / 1000.0
+        record[slots["yesterdayImport"]] = self.yesterday_import_wh / 1000.0
+        record[slots["yesterdayExport"]] = self.yesterday_export_wh / 1000.0
+
+
+async def async_load_energy_integrator(hass: HomeAssistant, entry_id: str) -> EnergyIntegrator:
+    """Integrator inkl. letztem Checkpoint laden (überlebt HA-Neustarts)."""
+    store = Store(hass, ENERGY_STORAGE_VERSION, f"{DOMAIN}.{entry_id}_energy")
+    integrator = EnergyIntegrator()
+    stored = await store.async_load()
+    if stored:
+        _LOGGER.debug("Energy-Checkpoint geladen: %s", stored)
+        integrator.load_dict(stored)
+    integrator.attach_store(store)
+    return integrator
@@ -1,58 +1,229 @@
-import json
-import os
-import logging
-
-from homeassistant.core import HomeAssistant
-from .const import TRADERS_FILE_PATH
-
-_LOGGER = logging.getLogger(__name__)
-
-def load_traders_from_json(entry_id: str) -> dict:
-    """Trader-Daten (traders) aus JSON-Datei laden (synchron)."""
-    filePath = os.path.join(TRADERS_FILE_PATH, f"{entry_id}_trader.json")
-    _LOGGER.debug("load_traders_from_json %s", filePath)
-
-    if not os.path.isfile(filePath):
-        return {}
-
-    try:
-        with open(filePath, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                _LOGGER.debug("load_traders_from_json success: %s", data)
-                return data
-    except Exception as e:
-        _LOGGER.warning("Fehler beim Laden von %s: %s", filePath, e)
-    return {}
-
-def _save_traders_sync(filePath: str, traders_dict: dict):
-    """Synchroner Datei-Schreibvorgang (wird im Executor ausgeführt)."""
-    directory = os.path.dirname(filePath)
-    os.makedirs(directory, exist_ok=True)
-    with open(filePath, "w", encoding="utf-8") as f:
-        json.dump(traders_dict, f, ensure_ascii=False, indent=2)
-
-async def async_save_traders_to_json(hass: HomeAssistant, traders_dict: dict, entry_id: str) -> None:
-    """
-    Trader-Daten (traders) in JSON-Datei speichern,
-    aber nicht blockierend im Eventloop.
-    """
-    filePath = os.path.join(TRADERS_FILE_PATH, f"{entry_id}_trader.json")
-    _LOGGER.debug("async_save_traders_to_json => %s", filePath)
-    
-    try:
-        await hass.async_add_executor_job(_save_traders_sync, filePath, traders_dict)
-    except Exception as e:
-        _LOGGER.error("Fehler beim Schreiben nach %s: %s", filePath, e)
-
-def delete_traders_file(entry_id: str) -> None:
-    """Die zugehörige Datei löschen (synchron, ggf. im Executor ausführen)."""
-    filePath = os.path.join(TRADERS_FILE_PATH, f"{entry_id}_trader.json")
-    try:
-        if os.path.exists(filePath):
-            os.remove(filePath)
-            _LOGGER.info("Datei %s erfolgreich gelöscht.", filePath)
-        else:
-            _LOGGER.warning("Datei %s existiert nicht.", filePath)
-    except Exception as e:
-        _LOGGER.error("Fehler beim Löschen der Datei %s: %s", filePath, e)
+import importlib
+import json
+import os
+import logging
+import shutil
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from .const import (
+    DOMAIN,
+    TRADERS_FILE_PATH,
+    TRADERS_SAVE_DELAY,
+    TRADERS_STORAGE_VERSION,
+    ENTRY_STORE_SUFFIXES,
+    HISTORY_DIRECTORY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+class EFriendsTraderStore(Store):
+    """
+    Trader-Daten pro Entry in .storage/efriends.<entry_id>_traders.
+    Atomisches Schreiben übernimmt Store, Speichern wird verzögert (EFriendsPeriodicSave),
+    damit mehrere PeerTradingModuleSummaryEvents zu einem Schreibvorgang zusammenfallen.
+    Schema (Version 1): {"traders": {trader_id: balance}}
+    Schema (Version 2): {"traders": {trader_id: {"balance": float, "last_seen": unix_ts}}}
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.saver = None  # EFriendsPeriodicSave, beim ersten verzögerten Speichern angelegt
+
+    async def _async_migrate_func(self, old_major_version, old_minor_version, old_data):
+        """Alte Schemas auf die aktuelle Version bringen."""
+        if old_major_version == 1:
+            # last_seen gab es noch nicht => ab jetzt zählen
+            now = time.time()
+            old_data = {
+                "traders": {
+                    trader_id: {"balance": balance, "last_seen": now}
+                    for trader_id, balance in old_data.get("traders", {}).items()
+                }
+            }
+        return old_data
+
+
+def get_traders_store(hass: HomeAssistant, entry_id: str) -> EFriendsTraderStore:
+    return EFriendsTraderStore(hass, TRADERS_STORAGE_VERSION, f"{DOMAIN}.{entry_id}_traders")
+
+
+def _legacy_traders_path(entry_id: str) -> str:
+    return os.path.join(TRADERS_FILE_PATH, f"{entry_id}_trader.json")
+
+
+def _load_legacy_traders_sync(filePath: str) -> dict:
+    """Alte JSON-Datei (vor Store) lesen (läuft im Executor)."""
+    if not os.path.isfile(filePath):
+        return {}
+    try:
+        with open(filePath, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return data
+    except Exception as e:
+        _LOGGER.warning("Fehler beim Laden von %s: %s", filePath, e)
+    return {}
+
+
+def _remove_legacy_traders_sync(filePath: str) -> None:
+    if os.path.exists(filePath):
+        os.remove(filePath)
+        _LOGGER.info("Datei %s erfolgreich gelöscht.", filePath)
+
+
+def _traders_to_save(traders_dict: dict, last_seen: dict) -> dict:
+    return {
+        "traders": {
+            trader_id: {"balance": balance, "last_seen": last_seen.get(trader_id)}
+            for trader_id, balance in traders_dict.items()
+        }
+    }
+
+
+async def async_load_traders(hass: HomeAssistant, store: EFriendsTraderStore, entry_id: str):
+    """
+    Trader-Daten asynchron laden (inkl. einmaliger Übernahme der alten JSON-Datei).
+    Rückgabe: (traders {trader_id: balance}, last_seen {trader_id: unix_ts})
+    """
+    stored = await store.async_load()
+    if stored is not None:
+        _LOGGER.debug("async_load_traders success: %s", stored)
+        traders = {}
+        last_seen = {}
+        for trader_id, item in stored.get("traders", {}).items():
+            traders[trader_id] = item["balance"]
+            last_seen[trader_id] = item.get("last_seen") or time.time()
+        return traders, last_seen
+
+    filePath = _legacy_traders_path(entry_id)
+    traders = await hass.async_add_executor_job(_load_legacy_traders_sync, filePath)
+    now = time.time()
+    last_seen = {trader_id: now for trader_id in traders}
+    if traders:
+        _LOGGER.info("Trader aus %s in den Store übernommen", filePath)
+        await store.async_save(_traders_to_save(traders, last_seen))
+        await hass.async_add_executor_job(_remove_legacy_traders_sync, filePath)
+    return traders, last_seen
+
+
+@callback
+def async_schedule_save_traders(store: EFriendsTraderStore, traders_dict: dict, last_seen: dict) -> None:
+    """
+    Verzögertes Speichern anstoßen; mehrere Aufrufe innerhalb der Verzögerung => ein Write.
+    Spätestens TRADERS_SAVE_DELAY Sekunden nach der ersten Änderung, auch bei laufenden Events.
+    """
+    if store.saver is None:
+        store.saver = EFriendsPeriodicSave(
+            store, lambda: _traders_to_save(traders_dict, last_seen), TRADERS_SAVE_DELAY
+        )
+    store.saver.async_schedule()
+
+
+async def async_save_traders(store: EFriendsTraderStore, traders_dict: dict, last_seen: dict) -> None:
+    """Sofort speichern (Unload/Reload), ersetzt ein noch ausstehendes verzögertes Speichern."""
+    if store.saver is not None:
+        store.saver.async_cancel()
+    await store.async_save(_traders_to_save(traders_dict, last_seen))
+
+
+async def async_remove_traders(hass: HomeAssistant, store: EFriendsTraderStore, entry_id: str) -> None:
+    """Gespeicherte Trader-Daten entfernen (nicht blockierend)."""
+    try:
+        await store.async_remove()
+        await hass.async_add_executor_job(_remove_legacy_traders_sync, _legacy_traders_path(entry_id))
+    except Exception as e:
+        _LOGGER.error("Fehler beim Löschen der Trader-Daten (%s): %s", entry_id, e)
+
+
+async def async_remove_entry_stores(hass: HomeAssistant, entry_id: str) -> None:
+    """Übrige Stores einer gelöschten Entry entfernen (Energie, Langzeitstatistik, Write-Buffer, Historie)."""
+    for suffix in ENTRY_STORE_SUFFIXES:
+        try:
+            await Store(hass, 1, f"{DOMAIN}.{entry_id}_{suffix}").async_remove()
+        except Exception as e:
+            _LOGGER.error("Fehler beim Löschen von %s (%s): %s", suffix, entry_id, e)
+    await hass.async_add_executor_job(
+        shutil.rmtree, hass.config.path(HISTORY_DIRECTORY, entry_id), True
+    )
+
+
+class EFriendsPeriodicSave:
+    """
+    Verzögertes Speichern mit festem Takt für Daten, die sich ständig ändern.
+    Store.async_delay_save verschiebt den Zeitpunkt bei jedem Aufruf nach hinten,
+    bei Daten pro Frame würde so nie gespeichert. Hier wird nur geplant, wenn noch
+    kein Speichern aussteht: spätestens `delay` Sekunden nach der ersten Änderung
+    landet der aktuelle Stand auf der Platte.
+    """
+
+    def __init__(self, store: Store, data_func, delay: float):
+        self._store = store
+        self._data_func = data_func
+        self._delay = delay
+        self._pending = False
+
+    @callback
+    def async_schedule(self) -> None:
+        if not self._pending:
+            self._pending = True
+            self._store.async_delay_save(self._data, self._delay)
+
+    def _data(self):
+        # Wird beim Schreiben aufgerufen (auch beim finalen Schreiben von HA)
+        self._pending = False
+        return self._data_func()
+
+    @callback
+    def async_cancel(self) -> None:
+        """Vor Store.async_save mit eigenen Daten: das verwirft ein ausstehendes verzögertes Speichern."""
+        self._pending = False
+
+    async def async_save(self) -> None:
+        """Sofort speichern; ersetzt ein ausstehendes verzögertes Speichern."""
+        self._pending = False
+        await self._store.async_save(self._data_func())
+
+
+async def async_import_submodule(hass: HomeAssistant, name: str):
+    """Modul der Integration im Executor importieren (nur bei Bedarf, blockiert nicht den Eventloop)."""
+    return await hass.async_add_import_executor_job(importlib.import_module, f"{__package__}.{name}")
+
+
+class EFriendsEventPublisher:
+    """
+    Optionales Weiterreichen von Meter-Frames an den HA-Bus.
+    Standardmäßig aus; wenn aktiv, wird pro Event-Typ höchstens
+    ein Event alle `min_interval` Sekunden gefeuert.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, enabled: bool, min_interval: float):
+        self._hass = hass
+        self._entry_id = entry_id
+        self._enabled = enabled
+        self._min_interval = min_interval
+        self._last_fired = {}
+
+    @callback
+    def async_update_options(self, enabled: bool, min_interval: float) -> None:
+        """Neue Optionen übernehmen (ohne Reload)."""
+        self._enabled = enabled
+        self._min_interval = min_interval
+        self._last_fired.clear()
+
+    @callback
+    def async_publish(self, event_type: str, data) -> None:
+        """Event feuern, sofern aktiviert und das Intervall abgelaufen ist."""
+        if not self._enabled:
+            return
+        now = time.monotonic()
+        last = self._last_fired.get(event_type)
+        if last is not None and now - last < self._min_interval:
+            return
+        self._last_fired[event_type] = now
+        if isinstance(data, dict):
+            event_data = {**data, "entry_id": self._entry_id}
+        else:
+            event_data = {"entry_id": self._entry_id, "value": data}
+        self._hass.bus.async_fire(event_type, event_data)
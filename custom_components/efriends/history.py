@@ -0,0 +1,326 @@
+import asyncio
+import csv
+import logging
+import os
+import struct
+from datetime import timedelta
+from operator import itemgetter
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    HISTORY_DIRECTORY,
+    HISTORY_FLUSH_BYTES,
+    HISTORY_READ_CHUNK,
+)
+from .metrics import EFriendsMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# Dateiformat: Header (Magic, Länge der Feldnamen, Feldnamen kommagetrennt),
+# danach Datensätze fester Länge: Zeitstempel (double) + ein float32 pro Feld
+MAGIC = b"EFH1"
+FILE_SUFFIX = ".efh"
+_HEADER = struct.Struct("<4sH")
+_TS = struct.Struct("<d")
+
+
+def _record_struct(count: int) -> struct.Struct:
+    return struct.Struct("<d" + "f" * count)
+
+
+def _header(keys) -> bytes:
+    names = ",".join(keys).encode()
+    return _HEADER.pack(MAGIC, len(names)) + names
+
+
+def _file_name(kind: str, day: str) -> str:
+    return f"{kind}_{day}{FILE_SUFFIX}"
+
+
+class HistorySeries:
+    """Eine Serie (raw, trading): feste Felder und die noch nicht geschriebenen Datensätze pro Tag."""
+
+    def __init__(self, kind: str, keys, slots: dict):
+        self.kind = kind
+        self.keys = tuple(keys)
+        self.header = _header(self.keys)
+        self.record = _record_struct(len(self.keys))
+        getter = itemgetter(*(slots[key] for key in self.keys))
+        self.values = getter if len(self.keys) > 1 else (lambda record: (getter(record),))
+        self.pending = {}  # Tag (YYYY-MM-DD, lokal) => bytearray
+        self.pending_bytes = 0
+        self.last_ts = None
+        self.count = 0
+
+
+class EFriendsHistoryStore:
+    """
+    Kompakte lokale Historie der Rohframes und Trading-Summaries (optional).
+    Pro Serie und Tag eine Datei, nur angehängt und nach Zeit sortiert. Der Empfang
+    packt Datensätze in einen Puffer (ein struct.pack pro Frame), geschrieben wird
+    gesammelt im Executor. Abfragen suchen den Startpunkt per Binärsuche und lesen
+    blockweise, ganze Tage landen nie im Speicher.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, retention_days: int, metrics: EFriendsMetrics):
+        self._hass = hass
+        self._entry_id = entry_id
+        self._metrics = metrics
+        self.directory = hass.config.path(HISTORY_DIRECTORY, entry_id)
+        self.retention_days = int(retention_days)
+        self._series = {}
+        self._day = None
+        self._day_start = 0.0
+        self._day_end = 0.0
+        self._lock = asyncio.Lock()
+        self._flush_task = None
+        self._pruned = None  # Tag, an dem zuletzt aufgeräumt wurde
+        self._checked = set()  # Dateien, deren Header in dieser Sitzung geprüft wurde
+        self.bytes_written = 0
+
+    def add_series(self, kind: str, keys, slots: dict) -> None:
+        self._series[kind] = HistorySeries(kind, keys, slots)
+
+    @callback
+    def add(self, kind: str, record, ts: float) -> None:
+        """Aktuellen Stand eines Datensatzes (raw_record, trade_record) anhängen."""
+        series = self._series[kind]
+        if series.last_ts is not None and ts < series.last_ts:
+            # Dateien bleiben nach Zeit sortiert (Binärsuche beim Lesen)
+            return
+        series.last_ts = ts
+        if not self._day_start <= ts < self._day_end:
+            self._set_day(ts)
+        buffer = series.pending.get(self._day)
+        if buffer is None:
+            buffer = series.pending[self._day] = bytearray()
+        buffer += series.record.pack(ts, *series.values(record))
+        series.pending_bytes += series.record.size
+        series.count += 1
+        if series.pending_bytes >= HISTORY_FLUSH_BYTES:
+            self.async_schedule_flush()
+
+    def _set_day(self, ts: float) -> None:
+        start = dt_util.start_of_local_day(dt_util.as_local(dt_util.utc_from_timestamp(ts)))
+        self._day = start.date().isoformat()
+        self._day_start = start.timestamp()
+        self._day_end = dt_util.start_of_local_day(start.date() + timedelta(days=1)).timestamp()
+
+    @callback
+    def async_update_options(self, retention_days: int) -> None:
+        self.retention_days = int(retention_days)
+        self._pruned = None
+
+    @callback
+    def async_schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._hass.async_create_background_task(
+                self.async_flush(), f"efriends history flush {self._entry_id}"
+            )
+
+    async def async_flush(self) -> None:
+        """Gepufferte Datensätze anhängen, einmal am Tag Dateien außerhalb der Aufbewahrung löschen."""
+        async with self._lock:
+            chunks = []
+            for series in self._series.values():
+                for day, payload in series.pending.items():
+                    chunks.append((_file_name(series.kind, day), series.header, series.record.size, bytes(payload)))
+                series.pending = {}
+                series.pending_bytes = 0
+            prune_before = None
+            today = dt_util.now().date()
+            if self.retention_days and self._pruned != today:
+                prune_before = (today - timedelta(days=self.retention_days - 1)).isoformat()
+                self._pruned = today
+            if not chunks and prune_before is None:
+                return
+            try:
+                self.bytes_written += await self._metrics.async_executor_job(
+                    self._hass, _write_chunks, self.directory, chunks, self._checked, prune_before
+                )
+            except OSError as err:
+                _LOGGER.error("Historie konnte nicht geschrieben werden (%s): %s", self.directory, err)
+
+    async def async_close(self) -> None:
+        """Unload: laufendes Schreiben abwarten und den Rest sofort schreiben."""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.async_flush()
+
+    async def async_query(self, kind: str, start: float, end: float, resolution: float, keys=None) -> dict:
+        """Mittelwerte je Zeitfenster (resolution Sekunden) zwischen start und end."""
+        await self.async_flush()
+        points = await self._metrics.async_executor_job(
+            self._hass, _downsample, self.directory, kind, start, end, resolution, keys
+        )
+        return {"kind": kind, "resolution": resolution, "points": points}
+
+    async def async_export_csv(self, kind: str, start: float, end: float, path: str, keys=None) -> dict:
+        """Alle Datensätze zwischen start und end als CSV nach path (zeilenweise, gestreamt)."""
+        await self.async_flush()
+        rows = await self._metrics.async_executor_job(
+            self._hass, _export_csv, self.directory, kind, start, end, path, keys
+        )
+        return {"path": path, "rows": rows}
+
+    def diagnostics(self) -> dict:
+        return {
+            "directory": self.directory,
+            "retention_days": self.retention_days,
+            "bytes_written": self.bytes_written,
+            "series": {
+                kind: {"keys": list(series.keys), "records": series.count, "pending_bytes": series.pending_bytes}
+                for kind, series in self._series.items()
+            },
+        }
+
+
+def _write_chunks(directory: str, chunks, checked: set, prune_before) -> int:
+    """Executor: Datensätze an die Tagesdateien anhängen, alte Tagesdateien löschen."""
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    for name, header, record_size, payload in chunks:
+        path = os.path.join(directory, name)
+        if path not in checked:
+            _check_file(path, header, record_size)
+            checked.add(path)
+        with open(path, "ab") as file:
+            if file.tell() == 0:
+                file.write(header)
+            file.write(payload)
+        written += len(payload)
+
+    if prune_before is not None:
+        for name in os.listdir(directory):
+            # <kind>_<YYYY-MM-DD>.efh (auch .old)
+            day = name.partition("_")[2][:10]
+            if len(day) == 10 and day < prune_before:
+                _LOGGER.debug("Historie: lösche %s", name)
+                os.remove(os.path.join(directory, name))
+    return written
+
+
+def _check_file(path: str, header: bytes, record_size: int) -> None:
+    """Einmal pro Sitzung: Header vergleichen, abgeschnittenen letzten Datensatz entfernen."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as file:
+        existing = file.read(len(header))
+        if existing != header:
+            mismatch = True
+        else:
+            mismatch = False
+            size = file.seek(0, os.SEEK_END)
+            partial = (size - len(header)) % record_size
+            if partial:
+                _LOGGER.warning("Historie: unvollständigen Datensatz in %s entfernt", path)
+                file.truncate(size - partial)
+    if mismatch:
+        # Andere Felder (ältere Version) => nicht weiter anhängen, Datei beiseitelegen
+        _LOGGER.warning("Historie: %s hat ein anderes Format und wird nach .old verschoben", path)
+        os.replace(path, path + ".old")
+
+
+def _iter_range(directory: str, kind: str, start: float, end: float, chunk: int = HISTORY_READ_CHUNK):
+    """Datensätze (Feldnamen, Zeile) mit start <= ts < end, Tag für Tag und blockweise gelesen."""
+    day = dt_util.as_local(dt_util.utc_from_timestamp(start)).date()
+    last_day = dt_util.as_local(dt_util.utc_from_timestamp(end)).date()
+    while day <= last_day:
+        path = os.path.join(directory, _file_name(kind, day.isoformat()))
+        day += timedelta(days=1)
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as file:
+            header = file.read(_HEADER.size)
+            magic, length = _HEADER.unpack(header) if len(header) == _HEADER.size else (None, 0)
+            if magic != MAGIC:
+                _LOGGER.warning("Historie: %s ist keine Historie-Datei", path)
+                continue
+            keys = tuple(file.read(length).decode().split(","))
+            record = _record_struct(len(keys))
+            data_start = file.tell()
+            count = (os.fstat(file.fileno()).st_size - data_start) // record.size
+
+            # Erster Datensatz mit ts >= start (Datensätze sind nach Zeit sortiert)
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                file.seek(data_start + mid * record.size)
+                if _TS.unpack(file.read(_TS.size))[0] < start:
+                    lo = mid + 1
+                else:
+                    hi = mid
+
+            file.seek(data_start + lo * record.size)
+            remaining = count - lo
+            while remaining > 0:
+                block = min(chunk, remaining)
+                remaining -= block
+                for row in record.iter_unpack(file.read(block * record.size)):
+                    if row[0] >= end:
+                        return
+                    yield keys, row
+
+
+def _iso(ts: float) -> str:
+    return dt_util.utc_from_timestamp(ts).isoformat()
+
+
+def _downsample(directory: str, kind: str, start: float, end: float, resolution: float, keys=None) -> list:
+    """Executor: Mittelwert je Feld und Zeitfenster (an der Epoche ausgerichtet)."""
+    points = []
+    current_keys = None
+    names = index = sums = None
+    bucket = None
+    count = 0
+
+    def close():
+        point = {"time": _iso(bucket), "samples": count}
+        point.update((name, round(total / count, 3)) for name, total in zip(names, sums))
+        points.append(point)
+
+    for file_keys, row in _iter_range(directory, kind, start, end):
+        if file_keys is not current_keys:
+            if count:
+                close()
+                count = 0
+            current_keys = file_keys
+            names = [key for key in (keys or file_keys) if key in file_keys]
+            index = [file_keys.index(key) + 1 for key in names]
+            bucket = None
+        row_bucket = row[0] - row[0] % resolution
+        if row_bucket != bucket:
+            if count:
+                close()
+            bucket = row_bucket
+            sums = [0.0] * len(index)
+            count = 0
+        for position, column in enumerate(index):
+            sums[position] += row[column]
+        count += 1
+    if count:
+        close()
+    return points
+
+
+def _export_csv(directory: str, kind: str, start: float, end: float, path: str, keys=None) -> int:
+    """Executor: Datensätze zeilenweise als CSV schreiben. Gibt die Anzahl Zeilen zurück."""
+    rows = 0
+    current_keys = None
+    names = index = None
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        for file_keys, row in _iter_range(directory, kind, start, end):
+            if file_keys is not current_keys:
+                current_keys = file_keys
+                if names is None:
+                    names = [key for key in (keys or file_keys) if key in file_keys]
+                    writer.writerow(["time", *names])
+                index = [file_keys.index(key) + 1 if key in file_keys else None for key in names]
+            writer.writerow([_iso(row[0]), *("" if column is None else round(row[column], 3) for column in index)])
+            rows += 1
+        if names is None:
+            writer.writerow(["time", *(keys or ())])
+    return rows
@@ -0,0 +1,96 @@
+import logging
+import time
+from collections import deque
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import (
+    INGEST_MAX_RAW_SAMPLES,
+    INGEST_MAX_TRADING,
+    SIGNAL_RAWPOWER,
+    SIGNAL_TRADING_UPDATE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EFriendsIngestQueue:
+    """
+    Begrenzte Warteschlange zwischen Socket-Empfang und Verarbeitung (pro Entry).
+    Der Empfang legt nur ab (O(1)), verarbeitet wird gesammelt im nächsten
+    Durchlauf des Eventloops:
+    - rawPowerMessage: alle Samples (mit Empfangszeit) gehen als ein Batch an
+      sensor.py; Integrator/Statistiken sehen jedes Sample, die Sensoren werden
+      nur einmal mit dem neuesten Stand geschrieben (latest wins)
+    - PeerTradingModuleSummaryEvent: in Reihenfolge, einzeln (FIFO)
+    Ist eine Queue voll, werden die ältesten Einträge verworfen.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, metrics=None,
+                 max_raw: int = INGEST_MAX_RAW_SAMPLES, max_trading: int = INGEST_MAX_TRADING):
+        self._hass = hass
+        self._metrics = metrics
+        self._signal_raw = SIGNAL_RAWPOWER.format(entry_id)
+        self._signal_trading = SIGNAL_TRADING_UPDATE.format(entry_id)
+        self._raw = deque()  # (ts, frame)
+        self._trading = deque()
+        self._max_raw = max_raw
+        self._max_trading = max_trading
+        self._scheduled = False
+        self.queued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.batches = 0
+
+    @callback
+    def put_raw(self, frame: dict, ts: float) -> None:
+        if len(self._raw) >= self._max_raw:
+            self._raw.popleft()
+            self.dropped += 1
+        self._raw.append((ts, frame))
+        self.queued += 1
+        self._schedule()
+
+    @callback
+    def put_trading(self, summary: dict) -> None:
+        if len(self._trading) >= self._max_trading:
+            self._trading.popleft()
+            self.dropped += 1
+        self._trading.append(summary)
+        self.queued += 1
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if not self._scheduled:
+            self._scheduled = True
+            self._hass.loop.call_soon(self._process)
+
+    @callback
+    def _process(self) -> None:
+        """Alles abarbeiten, was seit dem letzten Durchlauf angekommen ist."""
+        self._scheduled = False
+        if self._raw:
+            samples = list(self._raw)
+            self._raw.clear()
+            self.coalesced += len(samples) - 1
+            self.batches += 1
+            if self._metrics is not None:
+                # Empfang => Verarbeitung (zeigt einen ausgelasteten Eventloop)
+                self._metrics.observe("ingest_delay", max(time.time() - samples[0][0], 0.0))
+            async_dispatcher_send(self._hass, self._signal_raw, samples)
+        while self._trading:
+            async_dispatcher_send(self._hass, self._signal_trading, self._trading.popleft())
+
+    @callback
+    def clear(self) -> None:
+        self._raw.clear()
+        self._trading.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "pending": len(self._raw) + len(self._trading),
+        }
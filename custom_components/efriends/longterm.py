@@ -0,0 +1,246 @@
+import logging
+from datetime import datetime, timezone
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfEnergy, UnitOfPower
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .aggregation import TimeWeightedAggregator
+from .const import (
+    DOMAIN,
+    ENERGY_MAX_GAP,
+    LONGTERM_SAVE_DELAY,
+    LONGTERM_STORAGE_VERSION,
+)
+from .energy import _trapezoid
+from .helper import EFriendsPeriodicSave
+
+_LOGGER = logging.getLogger(__name__)
+
+HOUR = 3600.0
+
+
+def _hour_start(ts: float) -> float:
+    return ts - ts % HOUR
+
+
+class EFriendsLongTermStatistics:
+    """
+    Stündliche Langzeitstatistiken direkt in den Recorder (externe Statistiken):
+    - Bezug/Einspeisung (kWh, fortlaufende Summe, für das Energie-Dashboard)
+    - Mittel/Min/Max der Leistung je Kanal (gesamt, L1-L3)
+    Abgeschlossene Stunden werden gesammelt und pro Statistik in einem
+    Aufruf übergeben. Die laufende Stunde und noch nicht übergebene Stunden
+    liegen in einem Store, die Summen werden beim Start aus dem Recorder fortgesetzt.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, channels, max_gap: float = ENERGY_MAX_GAP):
+        self._hass = hass
+        self._store = Store(hass, LONGTERM_STORAGE_VERSION, f"{DOMAIN}.{entry_id}_longterm")
+        # Gespeichert wird höchstens alle LONGTERM_SAVE_DELAY Sekunden, nicht pro Frame
+        self._saver = EFriendsPeriodicSave(self._store, self._data_to_save, LONGTERM_SAVE_DELAY)
+        self._max_gap = max_gap
+        prefix = f"{DOMAIN}:{entry_id.lower()}"
+        self._import_id = f"{prefix}_energy_import"
+        self._export_id = f"{prefix}_energy_export"
+        # channels: (uid, name, key) wie STATISTICS_CHANNELS in sensor.py
+        self._channels = [
+            (key, f"{prefix}_{uid}", f"E-Friends {name}", TimeWeightedAggregator()) for uid, name, key in channels
+        ]
+
+        self.hour = None
+        self.import_wh = 0.0
+        self.export_wh = 0.0
+        self.import_sum = 0.0  # kWh
+        self.export_sum = 0.0  # kWh
+        self._last_ts = None
+        self._last_power = None
+        # Abgeschlossene, noch nicht übergebene Stunden
+        self._pending = []
+
+    async def async_load(self) -> None:
+        """Offene Stunde aus dem Store, Summen aus dem Recorder (falls vorhanden) laden."""
+        stored = await self._store.async_load()
+        if stored:
+            self.hour = stored.get("hour")
+            self.import_wh = float(stored.get("import_wh", 0.0))
+            self.export_wh = float(stored.get("export_wh", 0.0))
+            self.import_sum = float(stored.get("import_sum", 0.0))
+            self.export_sum = float(stored.get("export_sum", 0.0))
+            self._last_ts = stored.get("last_ts")
+            self._last_power = stored.get("last_power")
+            self._pending = stored.get("pending", [])
+
+        recorder = get_instance(self._hass)
+        for statistic_id, attr in ((self._import_id, "import_sum"), (self._export_id, "export_sum")):
+            last = await recorder.async_add_executor_job(
+                get_last_statistics, self._hass, 1, statistic_id, False, {"sum"}
+            )
+            rows = last.get(statistic_id)
+            if not rows:
+                continue
+            # Recorder ist maßgeblich; nur übernehmen, wenn keine neueren Stunden ausstehen
+            if not any(row["start"] > rows[0]["start"] for row in self._pending):
+                setattr(self, attr, float(rows[0]["sum"] or 0.0))
+        _LOGGER.debug(
+            "Langzeitstatistik geladen: Stunde %s, Summen %s / %s kWh, %s ausstehend",
+            self.hour, self.import_sum, self.export_sum, len(self._pending)
+        )
+        self.async_flush()
+
+    @callback
+    def add_frame(self, record, slots: dict, ts: float) -> None:
+        """Frame-Datensatz (raw_record) einrechnen."""
+        power = record[slots["powerTotal"]]
+        last_ts = self._last_ts
+        if last_ts is not None and ts <= last_ts:
+            return
+
+        if last_ts is not None and ts - last_ts <= self._max_gap:
+            self._integrate(last_ts, self._last_power, ts, power)
+        else:
+            self.roll_over(ts)
+
+        for key, _, _, aggregator in self._channels:
+            aggregator.add(record[slots[key]], ts)
+
+        self._last_ts = ts
+        self._last_power = power
+        self._schedule_save()
+
+    @callback
+    def roll_over(self, ts: float) -> bool:
+        """Stundenwechsel nach einer Lücke (oder beim ersten Frame)."""
+        hour = _hour_start(ts)
+        if self.hour is None:
+            self.hour = hour
+            return False
+        if hour <= self.hour:
+            return False
+        self._close_hour(self.hour + HOUR)
+        self.hour = hour
+        # Werte von vor der Lücke nicht in die neue Stunde mitnehmen
+        for _, _, _, aggregator in self._channels:
+            aggregator.reset()
+        self.async_flush()
+        return True
+
+    @callback
+    def async_tick(self, ts: float) -> None:
+        """
+        Timer zur vollen Stunde: Laufen Frames, schließt der nächste Frame die
+        Stunde exakt ab. Nur wenn keine mehr kommen, wird hier abgeschlossen.
+        """
+        if self._last_ts is None or ts - self._last_ts > self._max_gap:
+            if self.roll_over(ts):
+                self._schedule_save()
+
+    def _integrate(self, t0: float, p0: float, t1: float, p1: float) -> None:
+        """Intervall t0 -> t1 integrieren, an vollen Stunden aufteilen."""
+        if self.hour is None:
+            self.hour = _hour_start(t0)
+        while t1 > self.hour + HOUR:
+            boundary = self.hour + HOUR
+            if t0 < boundary:
+                p_boundary = p0 + (p1 - p0) * (boundary - t0) / (t1 - t0)
+                self._add(*_trapezoid(p0, p_boundary, boundary - t0))
+                t0, p0 = boundary, p_boundary
+            self._close_hour(boundary)
+            self.hour = boundary
+        self._add(*_trapezoid(p0, p1, t1 - t0))
+        if self._pending:
+            self.async_flush()
+
+    def _add(self, import_wh: float, export_wh: float) -> None:
+        self.import_wh += import_wh
+        self.export_wh += export_wh
+
+    def _close_hour(self, end: float) -> None:
+        """Stunde self.hour abschließen und in die Warteschlange legen."""
+        self.import_sum += self.import_wh / 1000.0
+        self.export_sum += self.export_wh / 1000.0
+        row = {
+            "start": self.hour,
+            "import_sum": self.import_sum,
+            "export_sum": self.export_sum,
+            "channels": {},
+        }
+        for key, _, _, aggregator in self._channels:
+            result = aggregator.flush(end)
+            if result is not None:
+                row["channels"][key] = [result["mean"], result["min"], result["max"]]
+        self._pending.append(row)
+        self.import_wh = 0.0
+        self.export_wh = 0.0
+
+    @callback
+    def async_flush(self) -> None:
+        """Ausstehende Stunden gesammelt an den Recorder übergeben (ein Aufruf pro Statistik)."""
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+
+        def start(row):
+            return datetime.fromtimestamp(row["start"], timezone.utc)
+
+        async_add_external_statistics(
+            self._hass,
+            self._metadata(self._import_id, "E-Friends Energy Import", UnitOfEnergy.KILO_WATT_HOUR, False),
+            [StatisticData(start=start(row), state=row["import_sum"], sum=row["import_sum"]) for row in pending],
+        )
+        async_add_external_statistics(
+            self._hass,
+            self._metadata(self._export_id, "E-Friends Energy Export", UnitOfEnergy.KILO_WATT_HOUR, False),
+            [StatisticData(start=start(row), state=row["export_sum"], sum=row["export_sum"]) for row in pending],
+        )
+        for key, statistic_id, name, _ in self._channels:
+            rows = [
+                StatisticData(start=start(row), mean=values[0], min=values[1], max=values[2])
+                for row in pending
+                if (values := row["channels"].get(key)) is not None
+            ]
+            if rows:
+                async_add_external_statistics(
+                    self._hass,
+                    self._metadata(statistic_id, name, UnitOfPower.WATT, True),
+                    rows,
+                )
+        _LOGGER.debug("Langzeitstatistik: %s Stunden an den Recorder übergeben", len(pending))
+        self._schedule_save()
+
+    @staticmethod
+    def _metadata(statistic_id: str, name: str, unit: str, has_mean: bool) -> StatisticMetaData:
+        return StatisticMetaData(
+            has_mean=has_mean,
+            has_sum=not has_mean,
+            name=name,
+            source=DOMAIN,
+            statistic_id=statistic_id,
+            unit_of_measurement=unit,
+        )
+
+    async def async_save(self) -> None:
+        """Offene Stunde sofort sichern (Unload/Reload)."""
+        await self._saver.async_save()
+
+    def _schedule_save(self) -> None:
+        self._saver.async_schedule()
+
+    def _data_to_save(self) -> dict:
+        return {
+            "hour": self.hour,
+            "import_wh": self.import_wh,
+            "export_wh": self.export_wh,
+            "import_sum": self.import_sum,
+            "export_sum": self.export_sum,
+            "last_ts": self._last_ts,
+            "last_power": self._last_power,
+            "pending": self._pending,
+        }
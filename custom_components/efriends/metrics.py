@@ -0,0 +1,217 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from array import array
+from bisect import bisect_left
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import PROFILE_MAX_DURATION
+
+_LOGGER = logging.getLogger(__name__)
+
+# Obere Bucket-Grenzen in Sekunden (logarithmisch, 10 µs .. 10 s), danach "inf"
+LATENCY_BUCKETS = (
+    0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005,
+    0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0,
+)
+
+
+class LatencyHistogram:
+    """Feste Buckets (array), record() ist O(log Buckets) und allokiert nichts."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._bounds = buckets
+        self._counts = array("Q", [0] * (len(buckets) + 1))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self._counts[bisect_left(self._bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float):
+        """Obere Bucket-Grenze, unter der q (0..1) aller Werte liegen (None ohne Werte)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count:
+                return self._bounds[index] if index < len(self._bounds) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        def ms(value):
+            return None if value is None else round(value * 1000.0, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(0.5)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max) if self.count else None,
+            "buckets_ms": {
+                f"le_{ms(bound)}": count for bound, count in zip(self._bounds, self._counts) if count
+            },
+        }
+
+
+class EFriendsProfiler:
+    """
+    Zeitlich begrenztes, gesampeltes Profiling der Hot-Paths (cProfile).
+    Aus: ein Attribut-Check pro Aufruf. An: jeder n-te Aufruf wird profiliert,
+    am Ende landet eine pstats-Auswertung in <config>/efriends_profile_<entry>_<zeit>.txt.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._hass = hass
+        self._entry_id = entry_id
+        self._profile = None
+        self._sample_every = 1
+        self._calls = 0
+        self._unsub_stop = None
+        self.active = False
+        self.sampled = 0
+        self.last_report = None
+
+    @callback
+    def async_start(self, duration: float, sample_every: int) -> None:
+        self.async_stop()
+        duration = min(float(duration), PROFILE_MAX_DURATION)
+        if duration <= 0:
+            return
+        self._profile = cProfile.Profile()
+        self._sample_every = max(int(sample_every), 1)
+        self._calls = 0
+        self.sampled = 0
+        self.active = True
+        self._unsub_stop = async_call_later(self._hass, duration, self._async_timeout)
+        _LOGGER.info("Profiling für %s s gestartet (jeder %s. Aufruf)", duration, self._sample_every)
+
+    @callback
+    def _async_timeout(self, _now) -> None:
+        self._unsub_stop = None
+        self.async_stop()
+
+    @callback
+    def async_stop(self) -> None:
+        if self._unsub_stop is not None:
+            self._unsub_stop()
+            self._unsub_stop = None
+        if not self.active:
+            return
+        self.active = False
+        profile = self._profile
+        self._profile = None
+        if self.sampled:
+            self._hass.async_create_task(self._async_write_report(profile, self.sampled))
+        else:
+            _LOGGER.info("Profiling beendet, keine Aufrufe gesampelt")
+
+    def sample(self):
+        """Profile für diesen Aufruf (enable/disable durch den Aufrufer) oder None."""
+        if not self.active:
+            return None
+        self._calls += 1
+        if self._calls % self._sample_every:
+            return None
+        self.sampled += 1
+        return self._profile
+
+    async def _async_write_report(self, profile: cProfile.Profile, sampled: int) -> None:
+        path = self._hass.config.path(f"efriends_profile_{self._entry_id}_{int(time.time())}.txt")
+
+        def write():
+            stream = io.StringIO()
+            stats = pstats.Stats(profile, stream=stream)
+            stats.sort_stats("cumulative").print_stats(40)
+            report = stream.getvalue()
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(f"{sampled} gesampelte Aufrufe\n\n{report}")
+            return report
+
+        report = await self._hass.async_add_executor_job(write)
+        self.last_report = {"path": path, "sampled": sampled, "top": report.splitlines()[:60]}
+        _LOGGER.info("Profiling beendet, Auswertung in %s", path)
+
+
+class EFriendsMetrics:
+    """Immer aktive, billige Zähler und Latenz-Histogramme pro Entry."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self.counters = {}
+        self.histograms = {}
+        self.profiler = EFriendsProfiler(hass, entry_id)
+        self._started = time.monotonic()
+        self._rate_snapshot = {}
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def percentile_ms(self, name: str, q: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            return None
+        value = histogram.percentile(q)
+        return None if value is None else round(value * 1000.0, 3)
+
+    def rate(self, name: str):
+        """Rate (pro Sekunde) eines Zählers seit dem letzten Aufruf für diesen Zähler."""
+        now = time.monotonic()
+        value = self.counters.get(name, 0)
+        last_value, last_time = self._rate_snapshot.get(name, (0, self._started))
+        self._rate_snapshot[name] = (value, now)
+        if now <= last_time:
+            return None
+        return round((value - last_value) / (now - last_time), 3)
+
+    def ratio(self, part: str, total: str):
+        total_count = self.counters.get(total, 0)
+        if not total_count:
+            return None
+        return round(self.counters.get(part, 0) / total_count * 100.0, 2)
+
+    async def async_executor_job(self, hass: HomeAssistant, target, *args):
+        """Executor-Job mit Messung der Wartezeit bis zum Start (Auslastung des Executors)."""
+        submitted = time.perf_counter()
+
+        def run():
+            return time.perf_counter() - submitted, target(*args)
+
+        # Erfasst wird im Eventloop, nicht im Executor-Thread
+        wait, result = await hass.async_add_executor_job(run)
+        self.observe("executor_wait", wait)
+        return result
+
+    async def async_probe_executor(self, hass: HomeAssistant) -> None:
+        """Leeren Job einreihen: misst, wie lange Executor-Jobs (Store, Recorder, ...) gerade warten."""
+        await self.async_executor_job(hass, int)
+
+    def as_dict(self) -> dict:
+        return {
+            "uptime_s": round(time.monotonic() - self._started),
+            "counters": dict(self.counters),
+            "latency": {name: histogram.as_dict() for name, histogram in self.histograms.items()},
+            "profiler": {
+                "active": self.profiler.active,
+                "sampled": self.profiler.sampled,
+                "last_report": self.profiler.last_report,
+            },
+        }
@@ -0,0 +1,141 @@
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import CONF_PUBLISH_POLICY, DEFAULT_PUBLISH_POLICY
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PublishPolicy:
+    """
+    Regeln, wann ein neuer Sensorwert in die State-Machine geschrieben wird:
+    - min_interval: frühestens alle x Sekunden
+    - deadband_abs / deadband_rel: kleinere Änderungen werden ignoriert
+    - heartbeat: nach spätestens x Sekunden wird trotzdem geschrieben (0 = aus)
+    """
+
+    def __init__(self, min_interval: float = 0.0, deadband_abs: float = 0.0,
+                 deadband_rel: float = 0.0, heartbeat: float = 0.0):
+        self.min_interval = float(min_interval)
+        self.deadband_abs = float(deadband_abs)
+        self.deadband_rel = float(deadband_rel)
+        self.heartbeat = float(heartbeat)
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "PublishPolicy":
+        return cls(
+            config.get("min_interval", 0.0),
+            config.get("deadband_abs", 0.0),
+            config.get("deadband_rel", 0.0),
+            config.get("heartbeat", 0.0),
+        )
+
+    def should_publish(self, last_value, last_time, new_value, now: float) -> bool:
+        if last_time is None:
+            return True
+        elapsed = now - last_time
+        if self.heartbeat and elapsed >= self.heartbeat:
+            return True
+        if elapsed < self.min_interval:
+            return False
+        if new_value == last_value:
+            return False
+        delta = abs(new_value - last_value)
+        if delta <= self.deadband_abs:
+            return False
+        if self.deadband_rel and delta <= abs(last_value) * self.deadband_rel:
+            return False
+        return True
+
+
+def build_policies(options: dict) -> dict:
+    """Policies pro Sensorgruppe aus Defaults + Optionen zusammenbauen."""
+    configured = options.get(CONF_PUBLISH_POLICY, {})
+    policies = {}
+    for group, defaults in DEFAULT_PUBLISH_POLICY.items():
+        policies[group] = PublishPolicy.from_dict({**defaults, **configured.get(group, {})})
+    return policies
+
+
+class EFriendsStatePublisher:
+    """
+    Zentrale Stelle, die pro Frame entscheidet, welche Entities tatsächlich
+    geschrieben werden. Sensoren liefern über `publish_group`,
+    `current_value()` und `async_commit_value()` die nötigen Infos.
+    Änderungen, die nur wegen min_interval zurückgehalten wurden, werden nach
+    Ablauf von min_interval nachgereicht, auch wenn bis dahin kein Frame mehr kommt.
+    """
+
+    def __init__(self, hass: HomeAssistant, policies: dict):
+        self._hass = hass
+        self._policies = policies
+        self._fallback = PublishPolicy()
+        # unique_id -> (zuletzt geschriebener Wert, Zeitpunkt)
+        self._last = {}
+        # unique_id -> Sensor mit zurückgehaltener Änderung; ein Timer für alle
+        self._pending = {}
+        self._trailing = None
+        self._trailing_due = None
+
+    @callback
+    def async_update_policies(self, policies: dict) -> None:
+        self._policies = policies
+
+    @callback
+    def async_publish(self, sensors, now: float = None) -> int:
+        """Schreibt nur die Sensoren, deren Policy das erlaubt. Gibt die Anzahl Writes zurück."""
+        if now is None:
+            now = time.monotonic()
+        written = 0
+        due = None
+        for sensor in sensors:
+            if not sensor.hass or not sensor.entity_id:
+                continue
+            value = sensor.current_value()
+            policy = self._policies.get(sensor.publish_group, self._fallback)
+            last_value, last_time = self._last.get(sensor.unique_id, (None, None))
+            if not policy.should_publish(last_value, last_time, value, now):
+                if value != last_value and now - last_time < policy.min_interval:
+                    self._pending[sensor.unique_id] = sensor
+                    sensor_due = last_time + policy.min_interval
+                    due = sensor_due if due is None else min(due, sensor_due)
+                continue
+            self._last[sensor.unique_id] = (value, now)
+            self._pending.pop(sensor.unique_id, None)
+            sensor.async_commit_value(value)
+            written += 1
+        if due is not None:
+            self._async_schedule_trailing(due, now)
+        _LOGGER.debug("async_publish: %s von %s Sensoren geschrieben", written, len(sensors))
+        return written
+
+    @callback
+    def _async_schedule_trailing(self, due: float, now: float) -> None:
+        """Timer auf die früheste fällige Änderung stellen (ein späterer bleibt nicht stehen)."""
+        if self._trailing is not None:
+            if self._trailing_due <= due:
+                return
+            self._trailing()
+        self._trailing_due = due
+        self._trailing = async_call_later(self._hass, max(due - now, 0.0), self._async_publish_trailing)
+
+    @callback
+    def _async_publish_trailing(self, _now) -> None:
+        """Zurückgehaltene Änderungen schreiben; noch nicht fällige planen sich neu ein."""
+        self._trailing = None
+        self._trailing_due = None
+        sensors = list(self._pending.values())
+        self._pending.clear()
+        self.async_publish(sensors)
+
+    @callback
+    def async_cancel(self) -> None:
+        """Beim Entladen der Entry: ausstehendes Nachreichen verwerfen."""
+        if self._trailing is not None:
+            self._trailing()
+            self._trailing = None
+            self._trailing_due = None
+        self._pending.clear()
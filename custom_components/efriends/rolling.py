@@ -0,0 +1,222 @@
+import logging
+import math
+from array import array
+from collections import deque
+
+from .const import ENERGY_MAX_GAP, ROLLING_INITIAL_CAPACITY
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RollingWindow:
+    """
+    Zeitfenster über einen Ringpuffer (array('d')).
+    Jeder Eintrag ist ein Wert mit seiner Haltedauer (Wert gilt bis zum nächsten Frame),
+    der Mittelwert ist damit zeitgewichtet. Entfernt wird nur nach Zeitstempel; ist der
+    Puffer voll, wird er verdoppelt. Seine Größe folgt damit der tatsächlichen Frame-Rate,
+    das Fenster deckt immer die vollen window Sekunden ab.
+    - Mittelwert: O(1) über laufende Summen
+    - Maximum: amortisiert O(1) über eine monotone Queue
+    """
+
+    def __init__(self, window: float, capacity: int = ROLLING_INITIAL_CAPACITY):
+        self.window = window
+        self._capacity = capacity
+        self._ts = array("d", [0.0] * capacity)
+        self._values = array("d", [0.0] * capacity)
+        self._weights = array("d", [0.0] * capacity)
+        self._head = 0  # Index des ältesten Eintrags
+        self._size = 0
+        self._seq = 0  # fortlaufende Nummer des nächsten Eintrags
+        self._sum = 0.0
+        self._weight = 0.0
+        self._max = deque()  # (seq, value), Werte absteigend
+
+    def push(self, value: float, dt: float, ts: float) -> None:
+        """Wert, der dt Sekunden bis ts gegolten hat, aufnehmen."""
+        if self._size == self._capacity:
+            self._grow()
+        index = (self._head + self._size) % self._capacity
+        self._ts[index] = ts
+        self._values[index] = value
+        self._weights[index] = dt
+        self._size += 1
+        self._sum += value * dt
+        self._weight += dt
+
+        max_queue = self._max
+        while max_queue and max_queue[-1][1] <= value:
+            max_queue.pop()
+        max_queue.append((self._seq, value))
+        self._seq += 1
+
+        self.expire(ts)
+
+    def expire(self, now: float) -> None:
+        """Einträge entfernen, die vollständig vor dem Fenster liegen."""
+        limit = now - self.window
+        while self._size and self._ts[self._head] <= limit:
+            self._pop_oldest()
+
+    def _grow(self) -> None:
+        """Kapazität verdoppeln; der volle Ring wird dabei ab dem ältesten Eintrag umkopiert."""
+        head = self._head
+        padding = array("d", [0.0]) * self._capacity
+        self._ts = self._ts[head:] + self._ts[:head] + padding
+        self._values = self._values[head:] + self._values[:head] + padding
+        self._weights = self._weights[head:] + self._weights[:head] + padding
+        self._head = 0
+        self._capacity *= 2
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _pop_oldest(self) -> None:
+        head = self._head
+        value = self._values[head]
+        self._sum -= value * self._weights[head]
+        self._weight -= self._weights[head]
+        oldest_seq = self._seq - self._size
+        if self._max and self._max[0][0] == oldest_seq:
+            self._max.popleft()
+        self._head = (head + 1) % self._capacity
+        self._size -= 1
+        if not self._size:
+            # Rundungsfehler der laufenden Summen nicht ewig mitschleppen
+            self._sum = 0.0
+            self._weight = 0.0
+
+    @property
+    def mean(self) -> float:
+        if self._weight <= 0:
+            return 0.0
+        return self._sum / self._weight
+
+    @property
+    def maximum(self) -> float:
+        if not self._max:
+            return 0.0
+        return self._max[0][1]
+
+
+class QuarterHourDemand:
+    """
+    Bezugsleistung (Mittel der positiven Leistung) je an der Uhr ausgerichtetem
+    Intervall (:00, :15, :30, :45). current = laufendes Intervall bis jetzt,
+    previous = Endwert des letzten abgeschlossenen Intervalls.
+    """
+
+    def __init__(self, interval: float = 900.0, max_gap: float = ENERGY_MAX_GAP):
+        self.interval = interval
+        self.max_gap = max_gap
+        self.interval_start = None
+        self.current = 0.0
+        self.previous = 0.0
+        self._energy = 0.0  # W*s
+        self._covered = 0.0  # s
+        self._last_ts = None
+        self._last_value = None
+
+    def add(self, power: float, ts: float) -> bool:
+        """Frame einrechnen. Gibt True zurück, wenn ein Intervall abgeschlossen wurde."""
+        value = max(power, 0.0)
+        closed = False
+        last_ts = self._last_ts
+        if last_ts is not None and ts <= last_ts:
+            return False
+
+        if self.interval_start is None:
+            self._start(ts)
+        elif last_ts is not None and ts - last_ts <= self.max_gap:
+            t = last_ts
+            while ts >= self.interval_start + self.interval:
+                end = self.interval_start + self.interval
+                self._energy += self._last_value * (end - t)
+                self._covered += end - t
+                self._close(end)
+                closed = True
+                t = end
+            self._energy += self._last_value * (ts - t)
+            self._covered += ts - t
+        elif ts >= self.interval_start + self.interval:
+            # Lücke: bisheriges Intervall mit dem abschließen, was da ist
+            self._close(ts)
+            closed = True
+
+        self._last_ts = ts
+        self._last_value = value
+        if self._covered > 0:
+            self.current = self._energy / self._covered
+        else:
+            self.current = value
+        return closed
+
+    def _start(self, ts: float) -> None:
+        self.interval_start = math.floor(ts / self.interval) * self.interval
+        self._energy = 0.0
+        self._covered = 0.0
+
+    def _close(self, ts: float) -> None:
+        if self._covered > 0:
+            self.previous = self._energy / self._covered
+        _LOGGER.debug("QuarterHourDemand: Intervall %s abgeschlossen => %s W", self.interval_start, self.previous)
+        self._start(ts)
+
+
+class PowerStatistics:
+    """
+    Rolling-Statistiken pro Kanal (gesamt, L1-L3): 1-min/15-min-Mittel,
+    15-min-Maximum sowie Viertelstunden-Bezugsleistung. Schreibt die Ergebnisse
+    in einen Datensatz mit festem Layout (siehe decoder.RecordLayout).
+    """
+
+    def __init__(self, channels, layout, max_gap: float = ENERGY_MAX_GAP):
+        self._max_gap = max_gap
+        self._channels = []
+        for key in channels:
+            self._channels.append((
+                key,
+                RollingWindow(60.0),
+                RollingWindow(900.0),
+                layout.slots[f"{key}Mean1m"],
+                layout.slots[f"{key}Mean15m"],
+                layout.slots[f"{key}Max15m"],
+            ))
+        self.demand = QuarterHourDemand(max_gap=max_gap)
+        self._slot_demand = layout.slots["demandQuarterHour"]
+        self._slot_demand_previous = layout.slots["demandPreviousQuarterHour"]
+        self._last_ts = None
+        self._last_values = None
+
+    def add_frame(self, record, slots: dict, ts: float) -> None:
+        """
+        Frame-Datensatz (raw_record) verarbeiten; die Ergebnisse landen im selben
+        Datensatz (die Statistik-Keys haben eigene Slots).
+        """
+        values = [record[slots[key]] for key, *_ in self._channels]
+        last_ts = self._last_ts
+        if last_ts is not None and ts <= last_ts:
+            return
+        if last_ts is not None and ts - last_ts <= self._max_gap:
+            dt = ts - last_ts
+            for (key, win_1m, win_15m, *_), value in zip(self._channels, self._last_values):
+                # Der vorherige Wert hat bis jetzt gegolten
+                win_1m.push(value, dt, ts)
+                win_15m.push(value, dt, ts)
+        else:
+            # Erstes Frame oder Lücke: nichts einrechnen, aber alles vor dem Fenster verwerfen
+            for key, win_1m, win_15m, *_ in self._channels:
+                win_1m.expire(ts)
+                win_15m.expire(ts)
+        for (key, win_1m, win_15m, s_mean_1m, s_mean_15m, s_max_15m), value in zip(self._channels, values):
+            # Leeres Fenster (Start, lange Lücke) => aktueller Wert statt 0
+            record[s_mean_1m] = win_1m.mean if len(win_1m) else value
+            record[s_mean_15m] = win_15m.mean if len(win_15m) else value
+            record[s_max_15m] = win_15m.maximum if len(win_15m) else value
+
+        self.demand.add(record[slots["powerTotal"]], ts)
+        record[self._slot_demand] = self.demand.current
+        record[self._slot_demand_previous] = self.demand.previous
+
+        self._last_ts = ts
+        self._last_values = values
@@ -1,302 +1,612 @@
-import json
-import os
-import logging
-from .helper import * 
-from .sensor_definition import * 
-from homeassistant.const import (
-    UnitOfElectricPotential,
-    UnitOfEnergy,
-    UnitOfPower,
-    UnitOfElectricCurrent,
-)
-
-from .const import DOMAIN, TRADERS_FILE_PATH
-_LOGGER = logging.getLogger(__name__)
-
-SENSOR_DEFINITIONS = [
-    ("power_total",   "Power Total",    "powerTotal",        UnitOfPower.WATT),
-    ("power_l1",      "Power L1",       "power1Watt",        UnitOfPower.WATT),
-    ("power_l2",      "Power L2",       "power2Watt",        UnitOfPower.WATT),
-    ("power_l3",      "Power L3",       "power3Watt",        UnitOfPower.WATT),
-    ("current_l1",    "Current L1",     "current1Ampere",    UnitOfElectricCurrent.AMPERE),
-    ("current_l2",    "Current L2",     "current2Ampere",    UnitOfElectricCurrent.AMPERE),
-    ("current_l3",    "Current L3",     "current3Ampere",    UnitOfElectricCurrent.AMPERE),
-    ("voltage_l1",    "Voltage L1",     "voltage1Volt",      UnitOfElectricPotential.VOLT),
-    ("voltage_l2",    "Voltage L2",     "voltage2Volt",      UnitOfElectricPotential.VOLT),
-    ("voltage_l3",    "Voltage L3",     "voltage3Volt",      UnitOfElectricPotential.VOLT),
-    ("today_wh",      "Today (Wh)",     "todayWatt",         UnitOfEnergy.WATT_HOUR),
-    ("today_kwh",     "Today (kWh)",    "today",             UnitOfEnergy.KILO_WATT_HOUR),
-    ("yesterday_kwh", "Yesterday (kWh)","yesterday",         UnitOfEnergy.KILO_WATT_HOUR)
-]
-
-SENSOR_DEFINITIONS_TRADE = [
-    ("energyBalance",           "Energy Balance",           "energyBalance",          UnitOfPower.WATT),
-    ("totalOrderVolume",        "Total Order Volume",       "totalOrderVolume",       UnitOfPower.WATT),
-    ("consumable",              "Consumable",               "consumable",             UnitOfPower.WATT),
-    ("remainingEnergyBalance",  "Remaining Energy Balance", "remainingEnergyBalance", UnitOfPower.WATT)
-]
-
-async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
-    """Von __init__.py via async_load_platform("sensor", DOMAIN, {}, {}) aufgerufen."""
-    if not discovery_info:
-        return
-
-    entry_id = discovery_info.get("entry_id")
-    _LOGGER.info("async_setup_platform: Erhaltenes entry_id = %s", entry_id)
-    _LOGGER.debug("hass.data[DOMAIN] keys = %s", hass.data[DOMAIN].keys())
-
-    data = hass.data[DOMAIN].get(entry_id)
-    if not data:
-        # Möglicherweise noch nicht angelegt in __init__?
-        data = {}
-        hass.data[DOMAIN][entry_id] = data
-
-    data = hass.data[DOMAIN][entry_id]
-
-
-    # Read Mode
-    if data["mode"] == "read":
-        if "global_data" not in data:
-            data["global_data"] = {
-                # Normale Sensorwerte
-                "powerTotal": 0.0,
-                "power1Watt": 0.0,
-                "power2Watt": 0.0,
-                "power3Watt": 0.0,
-                "current1Ampere": 0.0,
-                "current2Ampere": 0.0,
-                "current3Ampere": 0.0,
-                "voltage1Volt": 0.0,
-                "voltage2Volt": 0.0,
-                "voltage3Volt": 0.0,
-                "todayWatt": 0.0,
-                "today": 0.0,
-            }
-        if "trade_data" not in data:
-            data["trade_data"] = {
-                # Normale Sensorwerte
-                "energyBalance": 0.0,
-                "totalOrderVolume": 0.0,
-                "consumable": 0.0,
-                "remainingEnergyBalance": 0.0,
-
-                # Trader-Daten (dynamische Sensoren)
-                "traders": {}
-            }
-        
-
-        global_data = data["global_data"]
-        trade_data = data["trade_data"]
-
-
-        # 1) Trader aus JSON laden und in trade_data["traders"] übernehmen
-        persistent_traders = load_traders_from_json(entry_id)
-        if persistent_traders:
-            _LOGGER.info("Gefundene Trader aus JSON: %s", persistent_traders)
-            trade_data["traders"].update(persistent_traders)
-        else:
-            _LOGGER.info("Keine Trader in %s gefunden.", TRADERS_FILE_PATH)
-
-        # 2) Statische Global-Sensoren erstellen
-        static_sensors = []
-        for uid, name, key, unit in SENSOR_DEFINITIONS:
-            unique_id_final = f"{entry_id}_{uid}"
-            static_sensors.append(
-                EFriendsRawPowerSensor(
-                    hass,
-                    entry_id,
-                    unique_id_final,
-                    name,
-                    key,
-                    unit,
-                    global_data
-                )
-            )
-
-        # 3) Statische Trade-Sensoren
-        static_trade_sensors = []
-        for uid, name, key, unit in SENSOR_DEFINITIONS_TRADE:
-            unique_id_final = f"{entry_id}_{uid}"
-            static_trade_sensors.append(
-                EFriendsRawPowerSensor(
-                    hass,
-                    entry_id,
-                    unique_id_final,
-                    name,
-                    key,
-                    unit,
-                    trade_data
-                )
-            )
-
-        # 4) Dynamische Trader-Sensoren
-        if "trader_sensors" not in data:
-            data["trader_sensors"] = {}
-        trader_sensors = data["trader_sensors"]
-
-        # async_add_entities-Callback sichern
-        data["async_add_entities"] = async_add_entities
-
-        # Ggf. manuelles Anstoßen
-        #_update_trader_sensors(hass, entry_id, static_trade_sensors)
-
-
-        # Statische Sensoren an HA übergeben
-        async_add_entities(static_sensors, update_before_add=True)
-        async_add_entities(static_trade_sensors, update_before_add=True)
-
-        # Event-Listener registrieren -> hier findet die eigentliche Datenverarbeitung statt
-        # a) rawPower
-        def handle_rawpower_event(event):
-            """Verarbeitet das Event 'efriends_rawpower' und aktualisiert global_data."""
-            event_data = event.data
-            _LOGGER.debug("handle_rawpower_event: %s", event_data)
-
-            # Hier wie früher:
-            global_data["powerTotal"]    = float(event_data.get("powerTotal", 0.0))
-            global_data["power1Watt"]    = float(event_data.get("power1Watt", 0.0))
-            global_data["power2Watt"]    = float(event_data.get("power2Watt", 0.0))
-            global_data["power3Watt"]    = float(event_data.get("power3Watt", 0.0))
-            global_data["current1Ampere"] = float(event_data.get("current1Ampere", 0.0))
-            global_data["current2Ampere"] = float(event_data.get("current2Ampere", 0.0))
-            global_data["current3Ampere"] = float(event_data.get("current3Ampere", 0.0))
-            global_data["voltage1Volt"]   = float(event_data.get("voltage1Volt", 0.0))
-            global_data["voltage2Volt"]   = float(event_data.get("voltage2Volt", 0.0))
-            global_data["voltage3Volt"]   = float(event_data.get("voltage3Volt", 0.0))
-
-            # Tageswerte hochrechnen
-            global_data["todayWatt"] += abs(global_data["powerTotal"]) / 1800.0
-            global_data["today"] = global_data["todayWatt"] / 1000.0
-
-            # Anschließend unsere statischen Sensoren updaten
-            _update_static_sensors(static_sensors)
-
-        unsub1 = hass.bus.async_listen("efriends_rawpower", handle_rawpower_event)
-        data["unsub_rawpower"] = unsub1
-
-        # b) trading_update
-        async def handle_trading_event(event):
-            """Verarbeitet das Event 'efriends_trading_update' und aktualisiert trade_data."""
-            event_data = event.data
-            _LOGGER.debug("handle_trading_event: %s", event_data)
-
-            # Normale Felder
-            trade_data["energyBalance"]          = float(event_data.get("energyBalance", 0.0))
-            trade_data["totalOrderVolume"]       = float(event_data.get("totalOrderVolume", 0.0))
-            trade_data["consumable"]             = float(event_data.get("consumable", 0.0))
-            trade_data["remainingEnergyBalance"] = float(event_data.get("remainingEnergyBalance", 0.0))
-
-            # Traders verarbeiten
-            confirmed_orders = event_data.get("confirmedOrders", [])
-            traders_dict = trade_data["traders"]
-            for co in confirmed_orders:
-                seller_id = str(co.get("sellerId"))
-                buyer_id  = str(co.get("buyerId"))
-                amount    = float(co.get("amount", 0))
-
-                if seller_id not in traders_dict:
-                    traders_dict[seller_id] = 0.0
-                if buyer_id not in traders_dict:
-                    traders_dict[buyer_id] = 0.0
-
-                # Bsp: Seller = amount, Buyer = amount
-                traders_dict[seller_id] = amount
-                traders_dict[buyer_id]  = amount
-
-            # Jetzt dynamische Trader-Sensoren anlegen/updaten
-            await _update_trader_sensors(hass, entry_id, static_trade_sensors)
-
-        unsub2 = hass.bus.async_listen("efriends_trading_update", handle_trading_event)
-        data["unsub_trading_update"] = unsub2
-
-        # Falls du direkt nach dem Laden vorhandene Trader-Sensoren anlegen willst
-        _LOGGER.debug("Starte _update_trader_sensors, um persistierte Trader zu berücksichtigen.")
-        await _update_trader_sensors(hass, entry_id, static_trade_sensors)
-
-    # Write Mode
-    else:
-         # Erstelle den Verbindungsstatus-Sensor
-        connection_sensor = EFriendsConnectionStatusSensor(
-            entry_id=entry_id,
-            name="E-Friends Connection Status"
-        )
-
-        # Statische Sensoren an HA übergeben
-        async_add_entities([connection_sensor], update_before_add=True)
-
-        # Event-Listener registrieren -> hier findet die eigentliche Datenverarbeitung statt
-        def handle_write_status_event(event):
-            """Verarbeitet das Event 'efriends_write_status' und aktualisiert global_data."""
-            event_data = event.data
-            _LOGGER.debug("handle_write_status_event: %s", event_data)
-
-            # Anschließend unsere statischen Sensoren updaten
-            #_update_static_sensors([connection_sensor])
-            if connection_sensor.hass:
-                connection_sensor.schedule_update_ha_state()
-
-        unsub3 = hass.bus.async_listen("efriends_write_status", handle_write_status_event)
-        data["unsub_write_status"] = unsub3
-
-
-def _update_static_sensors(sensors):
-    """Aktualisiert statische Sensoren (rawPower oder Trade-Sensoren)."""
-    for sensor in sensors:
-        if sensor.hass:
-            sensor.update_state_from_globaldata()
-            sensor.schedule_update_ha_state()
-
-async def _update_trader_sensors(hass, entry_id, static_trade_sensors):
-    """Erzeugt / aktualisiert Trader-Sensoren und speichert sie in JSON."""
-    _LOGGER.debug("hass.data[DOMAIN] keys = %s", entry_id)
-    data = hass.data[DOMAIN][entry_id]
-    trade_data = data["trade_data"]
-    trader_sensors = data["trader_sensors"]
-    async_add_entities = data["async_add_entities"]
-
-    # 1) Aktuelle Trader-Daten aus trade_data lesen
-    traders_dict = trade_data.get("traders", {})
-    _LOGGER.debug("_update_trader_sensors %s", traders_dict)
-
-    new_entities = []
-
-    # 2) Neue/aktualisierte Trader-Sensoren anlegen oder updaten
-    for trader_id, balance in traders_dict.items():
-        if trader_id not in trader_sensors:
-            _LOGGER.debug("EFriendsTraderBalanceSensor %s", trader_id)
-            sensor = EFriendsTraderBalanceSensor(
-                entry_id, trader_id, f"Trader {trader_id}", balance
-            )
-            trader_sensors[trader_id] = sensor
-            new_entities.append(sensor)
-        else:
-            sensor = trader_sensors[trader_id]
-            sensor.set_balance(balance)
-
-    # 3) Trader-Sensoren prüfen, die diesmal keine Daten erhalten haben
-    #    -> Falls der letzte Balancewert > 0 ist, auf 0 setzen
-    for existing_trader_id, existing_sensor in trader_sensors.items():
-        if existing_trader_id not in traders_dict:
-            # Keine neuen Daten => Balance ggf. auf 0 zurücksetzen
-            if existing_sensor._balance > 0:  # oder existing_sensor.balance > 0, je nach Implementierung
-                existing_sensor.set_balance(0)
-
-    if new_entities:
-        async_add_entities(new_entities, update_before_add=True)
-        # **WICHTIG**: traders_dict in JSON speichern
-        await async_save_traders_to_json(hass, traders_dict,entry_id)
-
-    # 2) Update bestehender Trader-Sensoren
-    for sensor in trader_sensors.values():
-        if sensor.hass:
-            sensor.schedule_update_ha_state()
-
-    # 3) Statische Trade-Sensoren updaten
-    for sensor in static_trade_sensors:
-        if sensor.hass:
-            sensor.update_state_from_globaldata()
-            sensor.schedule_update_ha_state()
-
-    
-
-
+import json
+import os
+import logging
+import time
+from datetime import timedelta
+from .helper import * 
+from .sensor_definition import * 
+from .energy import async_load_energy_integrator
+from .decoder import compile_decoder
+from .rolling import PowerStatistics
+from homeassistant.const import (
+    UnitOfElectricPotential,
+    UnitOfEnergy,
+    UnitOfPower,
+    UnitOfElectricCurrent,
+)
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_track_time_change, async_track_time_interval
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    READ_MODES,
+    WRITE_MODES,
+    SIGNAL_RAWPOWER,
+    SIGNAL_TRADING_UPDATE,
+    SIGNAL_WRITE_STATUS,
+    SIGNAL_READER_STATUS,
+    READER_HEALTH_POLL_INTERVAL,
+    CONF_TRADER_MODE,
+    CONF_TRADER_TOP_N,
+    CONF_TRADER_MAX_AGE,
+    DEFAULT_TRADER_MODE,
+    DEFAULT_TRADER_TOP_N,
+    DEFAULT_TRADER_MAX_AGE,
+    TRADER_MODE_AGGREGATE,
+    TRADER_EVICTION_INTERVAL,
+    CONF_UNKNOWN_FIELDS,
+    DEFAULT_UNKNOWN_FIELDS,
+    CONF_LONG_TERM_STATISTICS,
+    DEFAULT_LONG_TERM_STATISTICS,
+    CONF_DIAGNOSTIC_SENSORS,
+    DEFAULT_DIAGNOSTIC_SENSORS,
+    METRICS_SENSOR_INTERVAL,
+    CONF_HISTORY,
+    DEFAULT_HISTORY,
+    CONF_HISTORY_RETENTION,
+    DEFAULT_HISTORY_RETENTION,
+    HISTORY_FLUSH_INTERVAL,
+)
+_LOGGER = logging.getLogger(__name__)
+
+SENSOR_DEFINITIONS = [
+    ("power_total",   "Power Total",    "powerTotal",        UnitOfPower.WATT,                "power"),
+    ("power_l1",      "Power L1",       "power1Watt",        UnitOfPower.WATT,                "power"),
+    ("power_l2",      "Power L2",       "power2Watt",        UnitOfPower.WATT,                "power"),
+    ("power_l3",      "Power L3",       "power3Watt",        UnitOfPower.WATT,                "power"),
+    ("current_l1",    "Current L1",     "current1Ampere",    UnitOfElectricCurrent.AMPERE,    "current"),
+    ("current_l2",    "Current L2",     "current2Ampere",    UnitOfElectricCurrent.AMPERE,    "current"),
+    ("current_l3",    "Current L3",     "current3Ampere",    UnitOfElectricCurrent.AMPERE,    "current"),
+    ("voltage_l1",    "Voltage L1",     "voltage1Volt",      UnitOfElectricPotential.VOLT,    "voltage"),
+    ("voltage_l2",    "Voltage L2",     "voltage2Volt",      UnitOfElectricPotential.VOLT,    "voltage"),
+    ("voltage_l3",    "Voltage L3",     "voltage3Volt",      UnitOfElectricPotential.VOLT,    "voltage"),
+    ("today_wh",      "Today (Wh)",     "todayWatt",         UnitOfEnergy.WATT_HOUR,          "energy"),
+    ("today_kwh",     "Today (kWh)",    "today",             UnitOfEnergy.KILO_WATT_HOUR,     "energy"),
+    ("yesterday_kwh", "Yesterday (kWh)","yesterday",         UnitOfEnergy.KILO_WATT_HOUR,     "energy"),
+    ("today_import_kwh",     "Today Import (kWh)",     "todayImport",     UnitOfEnergy.KILO_WATT_HOUR, "energy"),
+    ("today_export_kwh",     "Today Export (kWh)",     "todayExport",     UnitOfEnergy.KILO_WATT_HOUR, "energy"),
+    ("yesterday_import_kwh", "Yesterday Import (kWh)", "yesterdayImport", UnitOfEnergy.KILO_WATT_HOUR, "energy"),
+    ("yesterday_export_kwh", "Yesterday Export (kWh)", "yesterdayExport", UnitOfEnergy.KILO_WATT_HOUR, "energy")
+]
+
+# Rolling-Statistiken (rolling.py): 1-min/15-min-Mittel und 15-min-Maximum je Kanal
+STATISTICS_CHANNELS = [
+    ("power_total", "Power Total", "powerTotal"),
+    ("power_l1",    "Power L1",    "power1Watt"),
+    ("power_l2",    "Power L2",    "power2Watt"),
+    ("power_l3",    "Power L3",    "power3Watt"),
+]
+for _uid, _name, _key in STATISTICS_CHANNELS:
+    SENSOR_DEFINITIONS += [
+        (f"{_uid}_mean_1m",  f"{_name} Mean 1 min",  f"{_key}Mean1m",  UnitOfPower.WATT, "statistics"),
+        (f"{_uid}_mean_15m", f"{_name} Mean 15 min", f"{_key}Mean15m", UnitOfPower.WATT, "statistics"),
+        (f"{_uid}_max_15m",  f"{_name} Max 15 min",  f"{_key}Max15m",  UnitOfPower.WATT, "statistics"),
+    ]
+# Viertelstunden-Bezugsleistung (Abrechnung der Netzbetreiber je 15-min-Intervall)
+SENSOR_DEFINITIONS += [
+    ("demand_quarter_hour",          "Demand Quarter Hour",          "demandQuarterHour",         UnitOfPower.WATT, "statistics"),
+    ("demand_previous_quarter_hour", "Demand Previous Quarter Hour", "demandPreviousQuarterHour", UnitOfPower.WATT, "statistics"),
+]
+
+SENSOR_DEFINITIONS_TRADE = [
+    ("energyBalance",           "Energy Balance",           "energyBalance",          UnitOfPower.WATT, "trade"),
+    ("totalOrderVolume",        "Total Order Volume",       "totalOrderVolume",       UnitOfPower.WATT, "trade"),
+    ("consumable",              "Consumable",               "consumable",             UnitOfPower.WATT, "trade"),
+    ("remainingEnergyBalance",  "Remaining Energy Balance", "remainingEnergyBalance", UnitOfPower.WATT, "trade")
+]
+
+# Diagnose-Sensoren des Read-Mode-Supervisors: (uid, name, key in reader.health(), unit)
+READER_HEALTH_DEFINITIONS = [
+    ("reader_state",          "Connection State", "state",           None),
+    ("reader_reconnects",     "Reconnect Count",  "reconnect_count", None),
+    ("reader_last_frame_age", "Last Frame Age",   "last_frame_age",  "s"),
+]
+
+# Diagnose-Sensoren aus metrics.py: (uid, name, unit, Wert aus EFriendsMetrics)
+METRIC_SENSOR_DEFINITIONS_READ = [
+    ("metric_frame_rate",         "Frame Rate",             "frames/s", lambda m: m.rate("frames_raw")),
+    ("metric_rawpower_p95",       "Frame Handler p95",      "ms",       lambda m: m.percentile_ms("rawpower_handler", 0.95)),
+    ("metric_trading_p95",        "Trading Handler p95",    "ms",       lambda m: m.percentile_ms("trading_handler", 0.95)),
+    ("metric_ingest_delay_p95",   "Ingest Delay p95",       "ms",       lambda m: m.percentile_ms("ingest_delay", 0.95)),
+]
+METRIC_SENSOR_DEFINITIONS_WRITE = [
+    ("metric_post_latency_p95",   "POST Latency p95",       "ms",       lambda m: m.percentile_ms("post_latency", 0.95)),
+    ("metric_post_failure_rate",  "POST Failure Rate",      "%",        lambda m: m.ratio("posts_failed", "posts_total")),
+]
+
+# Gruppen, deren Werte direkt aus den Meter-Frames kommen (der Rest wird berechnet)
+FRAME_GROUPS = ("power", "current", "voltage", "trade")
+# Felder der lokalen Historie (history.py)
+HISTORY_RAW_KEYS = [key for _, _, key, _, group in SENSOR_DEFINITIONS if group in ("power", "current", "voltage")]
+HISTORY_TRADING_KEYS = [key for _, _, key, _, _ in SENSOR_DEFINITIONS_TRADE]
+# Felder im PeerTradingModuleSummaryEvent, die nicht über den Decoder laufen
+TRADE_IGNORED_KEYS = ("confirmedOrders",)
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Von __init__.py über async_forward_entry_setups aufgerufen."""
+    entry_id = entry.entry_id
+    data = hass.data[DOMAIN][entry_id]
+    options = entry.options
+
+    # Read Mode (auch read_write)
+    if data["mode"] in READ_MODES:
+        # Decoder einmal aus den Definitionstabellen kompilieren; die Werte landen
+        # in Datensätzen mit fester Slot-Belegung, aus denen die Sensoren direkt lesen
+        unknown_policy = options.get(CONF_UNKNOWN_FIELDS, DEFAULT_UNKNOWN_FIELDS)
+        raw_decoder = compile_decoder(SENSOR_DEFINITIONS, FRAME_GROUPS, unknown_policy)
+        trade_decoder = compile_decoder(
+            SENSOR_DEFINITIONS_TRADE, FRAME_GROUPS, unknown_policy, ignore_keys=TRADE_IGNORED_KEYS
+        )
+        data["raw_decoder"] = raw_decoder
+        data["trade_decoder"] = trade_decoder
+        if "raw_record" not in data:
+            data["raw_record"] = raw_decoder.layout.new_record()
+        if "trade_record" not in data:
+            data["trade_record"] = trade_decoder.layout.new_record()
+        if "trade_data" not in data:
+            data["trade_data"] = {
+                # Trader-Daten (dynamische Sensoren)
+                "traders": {}
+            }
+
+        raw_record = data["raw_record"]
+        raw_slots = raw_decoder.layout.slots
+        trade_record = data["trade_record"]
+        trade_data = data["trade_data"]
+        state_publisher = data["state_publisher"]
+        metrics = data["metrics"]
+
+        # Energie-Integrator inkl. Checkpoint vom letzten Lauf
+        integrator = await async_load_energy_integrator(hass, entry_id)
+        data["energy_integrator"] = integrator
+        integrator.roll_over(dt_util.utcnow().timestamp())
+        integrator.update_data(raw_record, raw_slots)
+
+        # Rolling-Statistiken (Ringpuffer pro Phase und gesamt)
+        statistics = PowerStatistics([key for _, _, key in STATISTICS_CHANNELS], raw_decoder.layout)
+        data["power_statistics"] = statistics
+
+        # Stündliche Langzeitstatistiken direkt in den Recorder (nur wenn dieser läuft)
+        longterm = None
+        if options.get(CONF_LONG_TERM_STATISTICS, DEFAULT_LONG_TERM_STATISTICS) and "recorder" in hass.config.components:
+            longterm_module = await async_import_submodule(hass, "longterm")
+            longterm = longterm_module.EFriendsLongTermStatistics(hass, entry_id, STATISTICS_CHANNELS)
+            await longterm.async_load()
+            data["longterm_statistics"] = longterm
+
+        # Optionale lokale Historie (kompakte Tagesdateien, Abfrage per Service)
+        history = None
+        if options.get(CONF_HISTORY, DEFAULT_HISTORY):
+            history_module = await async_import_submodule(hass, "history")
+            history = history_module.EFriendsHistoryStore(
+                hass, entry_id, options.get(CONF_HISTORY_RETENTION, DEFAULT_HISTORY_RETENTION), metrics
+            )
+            history.add_series("raw", HISTORY_RAW_KEYS, raw_slots)
+            history.add_series("trading", HISTORY_TRADING_KEYS, trade_decoder.layout.slots)
+            data["history"] = history
+
+            @callback
+            def handle_history_flush(now):
+                history.async_schedule_flush()
+
+            entry.async_on_unload(async_track_time_interval(
+                hass, handle_history_flush, timedelta(seconds=HISTORY_FLUSH_INTERVAL)
+            ))
+
+        # 1) Trader aus dem Store laden und in trade_data["traders"] übernehmen
+        traders_store = get_traders_store(hass, entry_id)
+        data["traders_store"] = traders_store
+        persistent_traders, last_seen = await async_load_traders(hass, traders_store, entry_id)
+        data["trader_last_seen"] = last_seen
+        if persistent_traders:
+            _LOGGER.info("Gefundene Trader aus dem Store: %s", len(persistent_traders))
+            trade_data["traders"].update(persistent_traders)
+        else:
+            _LOGGER.info("Keine gespeicherten Trader gefunden.")
+
+        # 2) Statische Global-Sensoren erstellen
+        static_sensors = []
+        for uid, name, key, unit, group in SENSOR_DEFINITIONS:
+            unique_id_final = f"{entry_id}_{uid}"
+            static_sensors.append(
+                EFriendsRawPowerSensor(
+                    hass,
+                    entry_id,
+                    unique_id_final,
+                    name,
+                    key,
+                    unit,
+                    raw_record,
+                    raw_slots[key],
+                    group,
+                    # Gesammelte unbekannte Felder als Attribute an "Power Total"
+                    raw_decoder.extras if key == "powerTotal" else None
+                )
+            )
+
+        # 3) Statische Trade-Sensoren
+        static_trade_sensors = []
+        for uid, name, key, unit, group in SENSOR_DEFINITIONS_TRADE:
+            unique_id_final = f"{entry_id}_{uid}"
+            static_trade_sensors.append(
+                EFriendsRawPowerSensor(
+                    hass,
+                    entry_id,
+                    unique_id_final,
+                    name,
+                    key,
+                    unit,
+                    trade_record,
+                    trade_decoder.layout.slots[key],
+                    group
+                )
+            )
+
+        # 4) Dynamische Trader-Sensoren (eine Entity pro Trader)
+        #    oder aggregierte Ansicht (Top-N + Summen, feste Anzahl Entities)
+        if "trader_sensors" not in data:
+            data["trader_sensors"] = {}
+        trader_sensors = data["trader_sensors"]
+
+        data["trader_mode"] = options.get(CONF_TRADER_MODE, DEFAULT_TRADER_MODE)
+        data["trader_max_age"] = options.get(CONF_TRADER_MAX_AGE, DEFAULT_TRADER_MAX_AGE)
+        if data["trader_mode"] == TRADER_MODE_AGGREGATE:
+            data["trader_top_sensor"] = EFriendsTraderTopSensor(
+                entry_id, int(options.get(CONF_TRADER_TOP_N, DEFAULT_TRADER_TOP_N))
+            )
+            data["trader_totals_sensor"] = EFriendsTraderTotalsSensor(entry_id)
+            static_trade_sensors_aggregate = [data["trader_top_sensor"], data["trader_totals_sensor"]]
+        else:
+            static_trade_sensors_aggregate = []
+        # Entities der jeweils anderen Ansicht aus der Registry entfernen (Moduswechsel)
+        _migrate_trader_aggregate_ids(hass, entry_id)
+        _remove_trader_entities(hass, entry_id, data["trader_mode"] == TRADER_MODE_AGGREGATE)
+
+        # async_add_entities-Callback sichern
+        data["async_add_entities"] = async_add_entities
+
+        # Ggf. manuelles Anstoßen
+        #_update_trader_sensors(hass, entry_id, static_trade_sensors)
+
+
+        # Statische Sensoren an HA übergeben
+        async_add_entities(static_sensors, update_before_add=True)
+        async_add_entities(static_trade_sensors, update_before_add=True)
+        if static_trade_sensors_aggregate:
+            async_add_entities(static_trade_sensors_aggregate)
+
+        # Verbindungszustand des Readers (Supervisor meldet sich per Dispatcher)
+        reader = data.get("socket_reader")
+        if reader is not None:
+            health_sensors = [
+                EFriendsReaderHealthSensor(entry_id, uid, name, key, unit, reader.health())
+                for uid, name, key, unit in READER_HEALTH_DEFINITIONS
+            ]
+            async_add_entities(health_sensors)
+
+            @callback
+            def handle_reader_status(health):
+                for sensor in health_sensors:
+                    sensor.async_set_health(health)
+
+            entry.async_on_unload(async_dispatcher_connect(
+                hass, SIGNAL_READER_STATUS.format(entry_id), handle_reader_status
+            ))
+
+            @callback
+            def handle_reader_health_poll(now):
+                handle_reader_status(reader.health())
+
+            entry.async_on_unload(async_track_time_interval(
+                hass, handle_reader_health_poll, timedelta(seconds=READER_HEALTH_POLL_INTERVAL)
+            ))
+
+        # Schwellwerte: Regeln einmal ihrem Slot im jeweiligen Datensatz zuordnen
+        thresholds = data.get("thresholds")
+        raw_threshold_rules = thresholds.rules_for(raw_slots) if thresholds else []
+        trade_threshold_rules = thresholds.rules_for(trade_decoder.layout.slots) if thresholds else []
+
+        # Event-Listener registrieren -> hier findet die eigentliche Datenverarbeitung statt
+        # a) rawPower
+        slot_power_total = raw_slots["powerTotal"]
+
+        @callback
+        def handle_rawpower_event(samples):
+            """
+            Verarbeitet einen Batch rawPowerMessage-Frames [(Empfangszeit, Frame), ...]
+            aus der Ingest-Queue. Jedes Sample geht in Integrator und Statistiken,
+            die Sensoren werden danach einmal mit dem neuesten Stand geschrieben.
+            """
+            _LOGGER.debug("handle_rawpower_event: %s Frames", len(samples))
+            start = time.perf_counter()
+            profile = metrics.profiler.sample()
+            if profile is not None:
+                profile.enable()
+
+            for ts, frame in samples:
+                # Alle Frame-Felder in einem Durchlauf dekodieren
+                raw_decoder.decode_into(frame, raw_record)
+
+                # Tageswerte über die echte Zeit zwischen den Frames integrieren
+                integrator.add_sample(raw_record[slot_power_total], ts)
+
+                # Mittelwerte, Maxima und Viertelstunden-Bezug (O(1) pro Frame)
+                statistics.add_frame(raw_record, raw_slots, ts)
+                if longterm is not None:
+                    longterm.add_frame(raw_record, raw_slots, ts)
+                if history is not None:
+                    history.add("raw", raw_record, ts)
+            integrator.update_data(raw_record, raw_slots)
+            if raw_threshold_rules:
+                # Einmal pro Batch mit dem neuesten Stand (Mindestdauer glättet ohnehin)
+                thresholds.async_evaluate(raw_threshold_rules, raw_record)
+
+            # Anschließend nur die Sensoren schreiben, die laut Policy dran sind
+            metrics.inc("state_writes", state_publisher.async_publish(static_sensors))
+
+            if profile is not None:
+                profile.disable()
+            metrics.observe("rawpower_handler", time.perf_counter() - start)
+
+        entry.async_on_unload(
+            async_dispatcher_connect(hass, SIGNAL_RAWPOWER.format(entry_id), handle_rawpower_event)
+        )
+
+        @callback
+        def handle_midnight(now):
+            """Tageswechsel auch dann, wenn um Mitternacht keine Frames kommen."""
+            if integrator.roll_over(now.timestamp()):
+                integrator.update_data(raw_record, raw_slots)
+                integrator.async_checkpoint()
+                state_publisher.async_publish(static_sensors)
+
+        entry.async_on_unload(async_track_time_change(
+            hass, handle_midnight, hour=0, minute=0, second=0
+        ))
+
+        if longterm is not None:
+            @callback
+            def handle_full_hour(now):
+                """Stunde auch dann abschließen, wenn keine Frames mehr kommen."""
+                longterm.async_tick(now.timestamp())
+
+            entry.async_on_unload(async_track_time_change(
+                hass, handle_full_hour, minute=0, second=0
+            ))
+
+        # b) trading_update
+        @callback
+        def handle_trading_event(event_data):
+            """Verarbeitet ein PeerTradingModuleSummaryEvent (Dispatcher) und aktualisiert trade_data."""
+            _LOGGER.debug("handle_trading_event: %s Felder", len(event_data))
+            start = time.perf_counter()
+            profile = metrics.profiler.sample()
+            if profile is not None:
+                profile.enable()
+
+            # Normale Felder
+            trade_decoder.decode_into(event_data, trade_record)
+            if trade_threshold_rules:
+                thresholds.async_evaluate(trade_threshold_rules, trade_record)
+            if history is not None:
+                history.add("trading", trade_record, time.time())
+
+            # Traders verarbeiten: Summary dieses Events aufbauen ...
+            confirmed_orders = event_data.get("confirmedOrders", [])
+            summary = {}
+            for co in confirmed_orders:
+                amount = float(co.get("amount", 0))
+                # Bsp: Seller = amount, Buyer = amount
+                summary[str(co.get("sellerId"))] = amount
+                summary[str(co.get("buyerId"))]  = amount
+
+            # ... und nur die Trader übernehmen, deren Wert sich geändert hat
+            traders_dict = trade_data["traders"]
+            previous = {
+                trader_id: traders_dict.get(trader_id) for trader_id, amount in summary.items()
+                if traders_dict.get(trader_id) != amount
+            }
+            for trader_id in previous:
+                traders_dict[trader_id] = summary[trader_id]
+            now_ts = time.time()
+            for trader_id in summary:
+                data["trader_last_seen"][trader_id] = now_ts
+
+            # Jetzt dynamische Trader-Sensoren anlegen/updaten
+            _update_trader_sensors(hass, entry_id, static_trade_sensors, previous)
+
+            # Trader speichern (verzögert, Bursts werden zusammengefasst)
+            if summary:
+                async_schedule_save_traders(traders_store, traders_dict, data["trader_last_seen"])
+
+            if profile is not None:
+                profile.disable()
+            metrics.observe("trading_handler", time.perf_counter() - start)
+
+        entry.async_on_unload(
+            async_dispatcher_connect(hass, SIGNAL_TRADING_UPDATE.format(entry_id), handle_trading_event)
+        )
+
+        # Falls du direkt nach dem Laden vorhandene Trader-Sensoren anlegen willst
+        _LOGGER.debug("Starte _update_trader_sensors, um persistierte Trader zu berücksichtigen.")
+        _update_trader_sensors(hass, entry_id, static_trade_sensors)
+
+        # Veraltete Trader regelmäßig entfernen (Speicher/Startzeit bleiben begrenzt)
+        @callback
+        def handle_trader_eviction(now):
+            _evict_stale_traders(hass, entry_id, static_trade_sensors, now.timestamp())
+
+        entry.async_on_unload(async_track_time_interval(
+            hass, handle_trader_eviction, timedelta(seconds=TRADER_EVICTION_INTERVAL)
+        ))
+        _evict_stale_traders(hass, entry_id, static_trade_sensors, time.time())
+
+    # Write Mode (auch read_write)
+    if data["mode"] in WRITE_MODES:
+         # Erstelle den Verbindungsstatus-Sensor
+        connection_sensor = EFriendsConnectionStatusSensor(
+            entry_id=entry_id,
+            name="E-Friends Connection Status"
+        )
+
+        # Statische Sensoren an HA übergeben
+        async_add_entities([connection_sensor], update_before_add=True)
+
+        # Event-Listener registrieren -> hier findet die eigentliche Datenverarbeitung statt
+        @callback
+        def handle_write_status_event(status):
+            """Verarbeitet den Schreibstatus des Writers (Dispatcher) und aktualisiert den Status-Sensor."""
+            _LOGGER.debug("handle_write_status_event: %s", status)
+            connection_sensor.set_connection_status(bool(status))
+
+        entry.async_on_unload(
+            async_dispatcher_connect(hass, SIGNAL_WRITE_STATUS.format(entry_id), handle_write_status_event)
+        )
+
+    # Optionale Diagnose-Sensoren aus den Laufzeit-Metriken (Standard: aus)
+    if options.get(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS):
+        metrics = data["metrics"]
+        definitions = []
+        if data["mode"] in READ_MODES:
+            definitions += METRIC_SENSOR_DEFINITIONS_READ
+        if data["mode"] in WRITE_MODES:
+            definitions += METRIC_SENSOR_DEFINITIONS_WRITE
+        metric_sensors = [
+            EFriendsMetricSensor(entry_id, uid, name, unit, value_fn) for uid, name, unit, value_fn in definitions
+        ]
+        async_add_entities(metric_sensors)
+
+        @callback
+        def handle_metrics_interval(now):
+            for sensor in metric_sensors:
+                sensor.async_refresh(metrics)
+
+        entry.async_on_unload(async_track_time_interval(
+            hass, handle_metrics_interval, timedelta(seconds=METRICS_SENSOR_INTERVAL)
+        ))
+
+
+@callback
+def _update_trader_sensors(hass, entry_id, static_trade_sensors, previous=None):
+    """
+    Erzeugt / aktualisiert Trader-Sensoren und speichert die Trader im Store.
+    previous: {trader_id: alter Wert} der geänderten Trader (None = alle, z. B. beim Start).
+    Der Aufwand hängt damit von der Anzahl geänderter Trader ab, nicht von der Größe der Community.
+    """
+    data = hass.data[DOMAIN][entry_id]
+    start = time.perf_counter()
+    trade_data = data["trade_data"]
+    trader_sensors = data["trader_sensors"]
+    async_add_entities = data["async_add_entities"]
+
+    # 1) Aktuelle Trader-Daten aus trade_data lesen
+    traders_dict = trade_data.get("traders", {})
+    changed_ids = list(traders_dict) if previous is None else list(previous)
+    _LOGGER.debug("_update_trader_sensors: %s von %s Tradern geändert", len(changed_ids), len(traders_dict))
+
+    if data["trader_mode"] == TRADER_MODE_AGGREGATE:
+        # 2a) Aggregierte Ansicht: feste Anzahl Entities
+        data["trader_top_sensor"].async_update_traders(
+            traders_dict, None if previous is None else changed_ids
+        )
+        data["trader_totals_sensor"].async_update_traders(traders_dict, previous)
+    else:
+        # 2b) Neue/geänderte Trader-Sensoren anlegen oder updaten
+        new_entities = []
+        for trader_id in changed_ids:
+            if trader_id not in traders_dict:
+                # Entfernter Trader (siehe _evict_stale_traders)
+                continue
+            balance = traders_dict[trader_id]
+            sensor = trader_sensors.get(trader_id)
+            if sensor is None:
+                _LOGGER.debug("EFriendsTraderBalanceSensor %s", trader_id)
+                sensor = EFriendsTraderBalanceSensor(
+                    entry_id, trader_id, f"Trader {trader_id}", balance
+                )
+                trader_sensors[trader_id] = sensor
+                new_entities.append(sensor)
+            else:
+                sensor.set_balance(balance)
+
+        if new_entities:
+            async_add_entities(new_entities, update_before_add=True)
+
+    # 3) Statische Trade-Sensoren updaten (über die Publishing-Policy)
+    data["metrics"].inc("state_writes", data["state_publisher"].async_publish(static_trade_sensors))
+    data["metrics"].observe("trader_update", time.perf_counter() - start)
+
+
+@callback
+def _migrate_trader_aggregate_ids(hass, entry_id) -> None:
+    """
+    Top-N- und Summen-Sensor hatten früher die Unique-IDs {entry_id}_efriends_trader_top/_totals
+    und damit denselben Namensraum wie die Trader selbst. Auf {entry_id}_efriends_traders_*
+    umstellen (Entity-ID und Historie bleiben erhalten). Ein Trader mit der ID "top" oder
+    "totals" wird am Namen erkannt und nicht angefasst.
+    """
+    legacy = {
+        f"{entry_id}_efriends_trader_top": ("Top Traders", f"{entry_id}_efriends_traders_top"),
+        f"{entry_id}_efriends_trader_totals": ("Trader Totals", f"{entry_id}_efriends_traders_totals"),
+    }
+    ent_reg = er.async_get(hass)
+    for entity in er.async_entries_for_config_entry(ent_reg, entry_id):
+        if entity.domain != "sensor" or entity.unique_id not in legacy:
+            continue
+        name, unique_id = legacy[entity.unique_id]
+        if entity.original_name != name:
+            continue
+        if ent_reg.async_get_entity_id("sensor", DOMAIN, unique_id):
+            ent_reg.async_remove(entity.entity_id)
+        else:
+            _LOGGER.debug("Unique-ID von %s => %s", entity.entity_id, unique_id)
+            ent_reg.async_update_entity(entity.entity_id, new_unique_id=unique_id)
+
+
+@callback
+def _remove_trader_entities(hass, entry_id, aggregate: bool) -> None:
+    """
+    Aggregierte Ansicht: alle Trader-Entities ({entry_id}_efriends_trader_<id>) entfernen.
+    Eine Entity pro Trader: Top-N- und Summen-Sensor ({entry_id}_efriends_traders_*) entfernen.
+    """
+    prefix = f"{entry_id}_efriends_trader_" if aggregate else f"{entry_id}_efriends_traders_"
+    ent_reg = er.async_get(hass)
+    removed = 0
+    for entity in er.async_entries_for_config_entry(ent_reg, entry_id):
+        if entity.domain == "sensor" and entity.unique_id.startswith(prefix):
+            ent_reg.async_remove(entity.entity_id)
+            removed += 1
+    if removed:
+        _LOGGER.info("Trader-Ansicht gewechselt: %s Entities entfernt", removed)
+
+
+@callback
+def _evict_stale_traders(hass, entry_id, static_trade_sensors, now_ts: float):
+    """Trader entfernen, die länger als trader_max_age nicht mehr gehandelt haben."""
+    data = hass.data[DOMAIN].get(entry_id)
+    if not data or not data.get("trader_max_age"):
+        return
+    max_age = data["trader_max_age"]
+    traders_dict = data["trade_data"]["traders"]
+    last_seen = data["trader_last_seen"]
+    stale = [trader_id for trader_id, ts in last_seen.items() if now_ts - ts > max_age]
+    if not stale:
+        return
+
+    _LOGGER.info("Entferne %s veraltete Trader", len(stale))
+    ent_reg = er.async_get(hass)
+    previous = {}
+    for trader_id in stale:
+        previous[trader_id] = traders_dict.pop(trader_id, None)
+        last_seen.pop(trader_id, None)
+        sensor = data["trader_sensors"].pop(trader_id, None)
+        if sensor is not None and sensor.entity_id and ent_reg.async_get(sensor.entity_id):
+            ent_reg.async_remove(sensor.entity_id)
+
+    # Aggregierte Ansicht nur um die entfernten Trader korrigieren
+    _update_trader_sensors(hass, entry_id, static_trade_sensors, previous)
+    async_schedule_save_traders(data["traders_store"], traders_dict, last_seen)
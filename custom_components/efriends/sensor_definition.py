@@ -1,162 +1,429 @@
-import logging
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.helpers.restore_state import RestoreEntity
-from .const import * 
-
-_LOGGER = logging.getLogger(__name__)
-
-class EFriendsRawPowerSensor(SensorEntity, RestoreEntity):
-    """Statischer Sensor für rawPowerMessage oder Trade-Daten (ohne Trader-ID)."""
-
-    def __init__(self, hass, entry_id, unique_id, name, data_key, unit, data):
-        self._hass = hass
-        self._entry_id = entry_id
-        self._unique_id = f"efriends_{unique_id}"
-        self._name = name
-        self._key = data_key
-        self._unit = unit
-        self._data = data
-        self._state = 0.0
-        _LOGGER.debug("EFriendsRawPowerSensor __init__: %s", self._unique_id)
-
-    @property
-    def device_info(self):
-        device_info = {
-            "identifiers": {(DOMAIN, self._entry_id)},
-            "name": CONF_NAME,
-            "manufacturer": CONF_MANUFACTURER,
-            "model": CONF_MODEL,
-            "sw_version": CONF_SW_VERSION,
-        }
-        _LOGGER.debug("Device Info: %s", device_info)
-        return device_info
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def unique_id(self):
-        return self._unique_id
-
-    @property
-    def state(self):
-        return self._state
-
-    @property
-    def unit_of_measurement(self):
-        return self._unit
-
-    def update_state_from_globaldata(self):
-        val = self._data.get(self._key, 0.0)
-        _LOGGER.debug("%s: update_state_from_globaldata() key=%s => %s", self._unique_id, self._key, val)
-        self._state = round(val, 2)
-
-    async def async_added_to_hass(self):
-        await super().async_added_to_hass()
-        old_state = await self.async_get_last_state()
-        _LOGGER.debug("%s: async_added_to_hass => old_state=%s", self._unique_id, old_state)
-        if old_state is not None:
-            try:
-                self._state = float(old_state.state)
-                _LOGGER.debug("%s: restored state to %s", self._unique_id, self._state)
-            except ValueError:
-                pass
-
-class EFriendsTraderBalanceSensor(SensorEntity, RestoreEntity):
-    """Dynamische Entity pro Trader (Trader-ID), wird jetzt auch in JSON gespeichert."""
-
-    def __init__(self, entry_id: str, trader_id: str, name: str, balance: float):
-        self._entry_id = entry_id
-        self._trader_id = trader_id
-        self._name = name
-        self._balance = balance
-        _LOGGER.debug("EFriendsTraderBalanceSensor __init__: %s", self._trader_id)
-
-    async def async_added_to_hass(self):
-        await super().async_added_to_hass()
-        old_state = await self.async_get_last_state()
-        if old_state is not None:
-            try:
-                self._balance = float(old_state.state)
-            except ValueError:
-                pass
-
-    @property
-    def device_info(self):
-        device_info = {
-            "identifiers": {(DOMAIN, self._entry_id)},
-            "name": CONF_NAME,
-            "manufacturer": CONF_MANUFACTURER,
-            "model": CONF_MODEL,
-            "sw_version": CONF_SW_VERSION,
-        }
-        _LOGGER.debug("Device Info: %s", device_info)
-        return device_info
-
-    @property
-    def unique_id(self):
-        return f"{self._entry_id}_efriends_trader_{self._trader_id}"
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        return round(self._balance, 2)
-
-    @property
-    def unit_of_measurement(self):
-        return "balance"
-
-    def set_balance(self, new_value: float):
-        self._balance = new_value
-        # Nur, wenn self.hass != None und entity_id != None, updaten
-        if self.hass is not None and self.entity_id:
-            self.schedule_update_ha_state()
-
-class EFriendsConnectionStatusSensor(SensorEntity, RestoreEntity):
-    """Sensor für den Verbindungsstatus des Geräts."""
-
-    def __init__(self, entry_id: str, name: str):
-        self._entry_id = entry_id
-        self._name = name
-        self._state = "Disconnected"  # Initialzustand
-        _LOGGER.debug("EFriendsConnectionStatusSensor __init__: %s", self._entry_id)
-
-    @property
-    def device_info(self):
-        device_info = {
-            "identifiers": {(DOMAIN, self._entry_id)},
-            "name": CONF_NAME,
-            "manufacturer": CONF_MANUFACTURER,
-            "model": CONF_MODEL,
-            "sw_version": CONF_SW_VERSION,
-        }
-        _LOGGER.debug("Device Info: %s", device_info)
-        return device_info
-
-    @property
-    def unique_id(self):
-        return f"{self._entry_id}_efriends_connection_status"
-
-    @property
-    def name(self):
-        return self._name
-
-    @property
-    def state(self):
-        return self._state
-
-    def set_connection_status(self, is_connected: bool):
-        """Setzt den Verbindungsstatus und aktualisiert den Zustand des Sensors."""
-        self._state = "Connected" if is_connected else "Disconnected"
-        if self.hass is not None and self.entity_id:
-            self.schedule_update_ha_state()
-
-    async def async_added_to_hass(self):
-        await super().async_added_to_hass()
-        old_state = await self.async_get_last_state()
-        if old_state is not None:
-            self._state = old_state.state
\ No newline at end of file
+import heapq
+import logging
+from homeassistant.components.sensor import SensorEntity
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.core import callback
+from .const import * 
+
+_LOGGER = logging.getLogger(__name__)
+
+class EFriendsRawPowerSensor(SensorEntity, RestoreEntity):
+    """Statischer Sensor für rawPowerMessage oder Trade-Daten (ohne Trader-ID)."""
+
+    def __init__(self, hass, entry_id, unique_id, name, data_key, unit, record, slot, publish_group=None,
+                 extras=None):
+        self._hass = hass
+        self._entry_id = entry_id
+        self._unique_id = f"efriends_{unique_id}"
+        self._name = name
+        self._key = data_key
+        self._unit = unit
+        # Datensatz des Decoders + fester Index dieses Sensors
+        self._record = record
+        self._slot = slot
+        self._extras = extras
+        self._state = 0.0
+        self.publish_group = publish_group
+        _LOGGER.debug("EFriendsRawPowerSensor __init__: %s", self._unique_id)
+
+    @property
+    def device_info(self):
+        device_info = {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+        _LOGGER.debug("Device Info: %s", device_info)
+        return device_info
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return self._unique_id
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def extra_state_attributes(self):
+        # Nur bei Policy "collect": unbekannte Frame-Felder
+        if self._extras:
+            return dict(self._extras)
+        return None
+
+    def update_state_from_globaldata(self):
+        val = self._record[self._slot]
+        _LOGGER.debug("%s: update_state_from_globaldata() key=%s => %s", self._unique_id, self._key, val)
+        self._state = round(val, 2)
+
+    def current_value(self) -> float:
+        """Aktueller (gerundeter) Wert aus dem Datensatz, ohne ihn zu übernehmen."""
+        return round(self._record[self._slot], 2)
+
+    @callback
+    def async_commit_value(self, value: float):
+        """Von EFriendsStatePublisher aufgerufen: Wert übernehmen und schreiben."""
+        self._state = value
+        self.async_write_ha_state()
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        old_state = await self.async_get_last_state()
+        _LOGGER.debug("%s: async_added_to_hass => old_state=%s", self._unique_id, old_state)
+        if old_state is not None:
+            try:
+                self._state = float(old_state.state)
+                _LOGGER.debug("%s: restored state to %s", self._unique_id, self._state)
+            except ValueError:
+                pass
+
+class EFriendsTraderBalanceSensor(SensorEntity, RestoreEntity):
+    """Dynamische Entity pro Trader (Trader-ID), wird jetzt auch in JSON gespeichert."""
+
+    def __init__(self, entry_id: str, trader_id: str, name: str, balance: float):
+        self._entry_id = entry_id
+        self._trader_id = trader_id
+        self._name = name
+        self._balance = balance
+        _LOGGER.debug("EFriendsTraderBalanceSensor __init__: %s", self._trader_id)
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        old_state = await self.async_get_last_state()
+        if old_state is not None:
+            try:
+                self._balance = float(old_state.state)
+            except ValueError:
+                pass
+
+    @property
+    def device_info(self):
+        device_info = {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+        _LOGGER.debug("Device Info: %s", device_info)
+        return device_info
+
+    @property
+    def unique_id(self):
+        return f"{self._entry_id}_efriends_trader_{self._trader_id}"
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def state(self):
+        return round(self._balance, 2)
+
+    @property
+    def unit_of_measurement(self):
+        return "balance"
+
+    @callback
+    def set_balance(self, new_value: float):
+        if new_value == self._balance:
+            return
+        self._balance = new_value
+        # Nur, wenn self.hass != None und entity_id != None, updaten
+        if self.hass is not None and self.entity_id:
+            self.async_write_ha_state()
+
+class EFriendsTraderTopSensor(SensorEntity):
+    """Aggregierte Trader-Ansicht: Top-N Trader nach Balance (State = höchste Balance)."""
+
+    def __init__(self, entry_id: str, top_n: int):
+        self._entry_id = entry_id
+        self._top_n = top_n
+        self._top = []  # [(trader_id, balance)], absteigend
+        _LOGGER.debug("EFriendsTraderTopSensor __init__: %s", self._entry_id)
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+
+    @property
+    def unique_id(self):
+        return f"{self._entry_id}_efriends_traders_top"
+
+    @property
+    def name(self):
+        return "Top Traders"
+
+    @property
+    def state(self):
+        if not self._top:
+            return 0.0
+        return round(self._top[0][1], 2)
+
+    @property
+    def unit_of_measurement(self):
+        return "balance"
+
+    @property
+    def extra_state_attributes(self):
+        return {
+            "traders": [
+                {"trader_id": trader_id, "balance": round(balance, 2)}
+                for trader_id, balance in self._top
+            ]
+        }
+
+    @callback
+    def async_set_top_n(self, top_n: int, traders: dict):
+        self._top_n = top_n
+        self.async_update_traders(traders)
+
+    @callback
+    def async_update_traders(self, traders: dict, changed_ids=None):
+        """
+        Top-N neu bestimmen. Mit changed_ids nur dann, wenn ein geänderter
+        Trader in die Top-N kommt oder bereits darin ist.
+        """
+        if changed_ids is not None and len(self._top) >= self._top_n:
+            top_ids = {trader_id for trader_id, _ in self._top}
+            lowest = self._top[-1][1]
+            if not any(
+                trader_id in top_ids or traders.get(trader_id, lowest) > lowest
+                for trader_id in changed_ids
+            ):
+                return
+        top = heapq.nlargest(self._top_n, traders.items(), key=lambda item: item[1])
+        if top == self._top:
+            return
+        self._top = top
+        if self.hass is not None and self.entity_id:
+            self.async_write_ha_state()
+
+
+class EFriendsTraderTotalsSensor(SensorEntity):
+    """Aggregierte Trader-Ansicht: Summe aller Balances und Anzahl Trader."""
+
+    def __init__(self, entry_id: str):
+        self._entry_id = entry_id
+        self._total = 0.0
+        self._count = 0
+        _LOGGER.debug("EFriendsTraderTotalsSensor __init__: %s", self._entry_id)
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+
+    @property
+    def unique_id(self):
+        return f"{self._entry_id}_efriends_traders_totals"
+
+    @property
+    def name(self):
+        return "Trader Totals"
+
+    @property
+    def state(self):
+        return round(self._total, 2)
+
+    @property
+    def unit_of_measurement(self):
+        return "balance"
+
+    @property
+    def extra_state_attributes(self):
+        return {"trader_count": self._count}
+
+    @callback
+    def async_update_traders(self, traders: dict, previous=None):
+        """previous: {trader_id: alter Wert oder None} der geänderten Trader (None = neu rechnen)."""
+        if previous is None:
+            total = sum(traders.values())
+        else:
+            total = self._total
+            for trader_id, old in previous.items():
+                total += traders.get(trader_id, 0.0) - (old or 0.0)
+        if total == self._total and len(traders) == self._count:
+            return
+        self._total = total
+        self._count = len(traders)
+        if self.hass is not None and self.entity_id:
+            self.async_write_ha_state()
+
+
+class EFriendsConnectionStatusSensor(SensorEntity, RestoreEntity):
+    """Sensor für den Verbindungsstatus des Geräts."""
+
+    def __init__(self, entry_id: str, name: str):
+        self._entry_id = entry_id
+        self._name = name
+        self._state = "Disconnected"  # Initialzustand
+        _LOGGER.debug("EFriendsConnectionStatusSensor __init__: %s", self._entry_id)
+
+    @property
+    def device_info(self):
+        device_info = {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+        _LOGGER.debug("Device Info: %s", device_info)
+        return device_info
+
+    @property
+    def unique_id(self):
+        return f"{self._entry_id}_efriends_connection_status"
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def state(self):
+        return self._state
+
+    def set_connection_status(self, is_connected: bool):
+        """Setzt den Verbindungsstatus und aktualisiert den Zustand des Sensors."""
+        self._state = "Connected" if is_connected else "Disconnected"
+        if self.hass is not None and self.entity_id:
+            self.schedule_update_ha_state()
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        old_state = await self.async_get_last_state()
+        if old_state is not None:
+            self._state = old_state.state
+
+class EFriendsReaderHealthSensor(SensorEntity):
+    """Diagnose-Sensor des Read-Mode-Supervisors (Verbindungszustand, Reconnects, Frame-Alter)."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    # Laufende Ingest-Zähler nicht in die Recorder-Historie schreiben
+    _unrecorded_attributes = frozenset({"queued", "coalesced", "dropped", "pending"})
+
+    def __init__(self, entry_id: str, uid: str, name: str, key: str, unit, health: dict):
+        self._entry_id = entry_id
+        self._uid = uid
+        self._name = name
+        self._key = key
+        self._unit = unit
+        self._state = health.get(key)
+        self._attributes = None
+        _LOGGER.debug("EFriendsReaderHealthSensor __init__: %s %s", self._entry_id, key)
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+
+    @property
+    def unique_id(self):
+        return f"{self._entry_id}_efriends_{self._uid}"
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def extra_state_attributes(self):
+        # Zähler der Ingest-Queue am Verbindungszustand
+        return self._attributes
+
+    @callback
+    def async_set_health(self, health: dict):
+        """Neuen Status vom Reader übernehmen; geschrieben wird nur bei Änderung."""
+        value = health.get(self._key)
+        attributes = health.get("ingest") if self._key == "state" else None
+        if value == self._state and attributes == self._attributes:
+            return
+        self._state = value
+        self._attributes = attributes
+        if self.hass is not None and self.entity_id:
+            self.async_write_ha_state()
+
+
+class EFriendsMetricSensor(SensorEntity):
+    """Optionaler Diagnose-Sensor für eine Laufzeit-Metrik (Rate, Latenz-Perzentil, Fehlerquote)."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, entry_id: str, uid: str, name: str, unit: str, value_fn):
+        self._entry_id = entry_id
+        self._uid = uid
+        self._name = name
+        self._unit = unit
+        self._value_fn = value_fn
+        self._state = None
+        _LOGGER.debug("EFriendsMetricSensor __init__: %s %s", self._entry_id, uid)
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self._entry_id)},
+            "name": CONF_NAME,
+            "manufacturer": CONF_MANUFACTURER,
+            "model": CONF_MODEL,
+            "sw_version": CONF_SW_VERSION,
+        }
+
+    @property
+    def unique_id(self):
+        return f"{self._entry_id}_efriends_{self._uid}"
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def unit_of_measurement(self):
+        return self._unit
+
+    @callback
+    def async_refresh(self, metrics):
+        value = self._value_fn(metrics)
+        if value == self._state:
+            return
+        self._state = value
+        if self.hass is not None and self.entity_id:
+            self.async_write_ha_state()
@@ -0,0 +1,148 @@
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import (
+    CONF_THRESHOLDS,
+    SIGNAL_THRESHOLD,
+    EVENT_THRESHOLD,
+    THRESHOLD_ABOVE,
+    DEFAULT_THRESHOLD_HYSTERESIS,
+    DEFAULT_THRESHOLD_DWELL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ThresholdRule:
+    """
+    Eine Schwelle mit Hysterese auf einem Frame- oder Trading-Feld.
+    above: an ab value >= threshold, aus erst bei value <= threshold - hysteresis
+    below: an ab value <= threshold, aus erst bei value >= threshold + hysteresis
+    Ein Wechsel gilt erst, wenn die Bedingung dwell Sekunden ununterbrochen erfüllt ist.
+    """
+
+    def __init__(self, name: str, key: str, direction: str, threshold: float,
+                 hysteresis: float = DEFAULT_THRESHOLD_HYSTERESIS, dwell: float = DEFAULT_THRESHOLD_DWELL):
+        self.name = name
+        self.key = key
+        self.direction = direction
+        self.threshold = float(threshold)
+        self.hysteresis = abs(float(hysteresis))
+        self.dwell = max(float(dwell), 0.0)
+        self.active = False
+        self.value = None
+        self.since = None  # time.time() des letzten Wechsels
+        self.transitions = 0
+        self.pending = None  # TimerHandle bis zum Ablauf von dwell
+
+    def wants(self, value: float) -> bool:
+        """Zustand, den der Wert verlangt (innerhalb der Hysterese bleibt der aktuelle)."""
+        if self.direction == THRESHOLD_ABOVE:
+            if self.active:
+                return value > self.threshold - self.hysteresis
+            return value >= self.threshold
+        if self.active:
+            return value < self.threshold + self.hysteresis
+        return value <= self.threshold
+
+    def as_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "direction": self.direction,
+            "threshold": self.threshold,
+            "hysteresis": self.hysteresis,
+            "dwell": self.dwell,
+            "active": self.active,
+            "pending": self.pending is not None,
+            "value": self.value,
+            "transitions": self.transitions,
+        }
+
+
+class EFriendsThresholdEngine:
+    """
+    Wertet die Regeln einer Entry direkt in den Frame-/Trading-Handlern aus (sensor.py).
+    Pro Batch ein Vergleich je Regel; Timer gibt es nur, solange ein Wechsel auf
+    dwell wartet. Bei einem Wechsel: Bus-Event EVENT_THRESHOLD und Dispatcher-Signal
+    für den Binary-Sensor der Regel.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, rules: list, metrics=None):
+        self._hass = hass
+        self._entry_id = entry_id
+        self._signal = SIGNAL_THRESHOLD.format(entry_id)
+        self._metrics = metrics
+        self.rules = rules
+
+    def rules_for(self, slots: dict) -> list:
+        """(Regel, Slot) für alle Regeln, deren Feld in diesem Datensatz-Layout liegt."""
+        return [(rule, slots[rule.key]) for rule in self.rules if rule.key in slots]
+
+    @callback
+    def async_evaluate(self, rules: list, record) -> None:
+        """Aktuelle Werte aus dem dekodierten Datensatz prüfen."""
+        for rule, slot in rules:
+            value = record[slot]
+            rule.value = value
+            if rule.wants(value) == rule.active:
+                # Bedingung für einen Wechsel (wieder) nicht erfüllt
+                if rule.pending is not None:
+                    rule.pending.cancel()
+                    rule.pending = None
+            elif rule.pending is None:
+                if rule.dwell:
+                    rule.pending = self._hass.loop.call_later(rule.dwell, self._async_dwell_elapsed, rule)
+                else:
+                    self._async_transition(rule)
+
+    @callback
+    def _async_dwell_elapsed(self, rule: ThresholdRule) -> None:
+        rule.pending = None
+        self._async_transition(rule)
+
+    @callback
+    def _async_transition(self, rule: ThresholdRule) -> None:
+        rule.active = not rule.active
+        rule.since = time.time()
+        rule.transitions += 1
+        if self._metrics is not None:
+            self._metrics.inc("threshold_transitions")
+        _LOGGER.debug("Schwelle %s: %s (%s = %s)", rule.name, "an" if rule.active else "aus", rule.key, rule.value)
+        async_dispatcher_send(self._hass, self._signal, rule)
+        self._hass.bus.async_fire(EVENT_THRESHOLD, {
+            "entry_id": self._entry_id,
+            "name": rule.name,
+            "key": rule.key,
+            "state": "on" if rule.active else "off",
+            "value": rule.value,
+            "threshold": rule.threshold,
+        })
+
+    @callback
+    def async_cancel(self) -> None:
+        """Wartende Wechsel verwerfen (Unload)."""
+        for rule in self.rules:
+            if rule.pending is not None:
+                rule.pending.cancel()
+                rule.pending = None
+
+    def diagnostics(self) -> dict:
+        return {rule.name: rule.as_dict() for rule in self.rules}
+
+
+def build_rules(options: dict) -> list:
+    """Regeln aus den Optionen ({name: {key, direction, threshold, hysteresis, dwell}})."""
+    return [
+        ThresholdRule(
+            name,
+            config["key"],
+            config["direction"],
+            config["threshold"],
+            config.get("hysteresis", DEFAULT_THRESHOLD_HYSTERESIS),
+            config.get("dwell", DEFAULT_THRESHOLD_DWELL),
+        )
+        for name, config in options.get(CONF_THRESHOLDS, {}).items()
+    ]
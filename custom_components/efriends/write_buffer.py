@@ -0,0 +1,124 @@
+import logging
+import time
+from collections import deque
+from itertools import islice
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    DOMAIN,
+    DEFAULT_WRITE_BUFFER_MAX_AGE,
+    DEFAULT_WRITE_BUFFER_MAX_SIZE,
+    DEFAULT_WRITE_BUFFER_DROP_POLICY,
+    WRITE_BUFFER_SAVE_DELAY,
+    WRITE_BUFFER_STORAGE_VERSION,
+)
+from .helper import EFriendsPeriodicSave
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EFriendsWriteBuffer:
+    """
+    Begrenzte, auf Platte gesicherte Warteschlange für noch nicht gesendete
+    Samples des Writers. Wird in Reihenfolge abgearbeitet, sobald der
+    Endpunkt wieder erreichbar ist.
+    - max_age: ältere Samples werden verworfen (Sekunden)
+    - max_size: maximale Anzahl Samples
+    - drop_policy: "drop_oldest" oder "drop_newest", wenn max_size erreicht ist
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._store = Store(hass, WRITE_BUFFER_STORAGE_VERSION, f"{DOMAIN}.{entry_id}_write_buffer")
+        # Höchstens alle WRITE_BUFFER_SAVE_DELAY Sekunden speichern, auch bei Samples im Sekundentakt
+        self._saver = EFriendsPeriodicSave(self._store, self._data_to_save, WRITE_BUFFER_SAVE_DELAY)
+        self._queue = deque()  # (ts, payload)
+        self.max_age = DEFAULT_WRITE_BUFFER_MAX_AGE
+        self.max_size = DEFAULT_WRITE_BUFFER_MAX_SIZE
+        self.drop_policy = DEFAULT_WRITE_BUFFER_DROP_POLICY
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    async def async_load(self) -> None:
+        stored = await self._store.async_load()
+        if not stored:
+            return
+        for ts, payload in stored.get("samples", []):
+            self._queue.append((ts, payload))
+        self.prune()
+        self._enforce_size()
+        _LOGGER.info("Write-Buffer: %s ungesendete Samples geladen", len(self._queue))
+
+    @callback
+    def async_update_options(self, max_age: float, max_size: int, drop_policy: str) -> None:
+        self.max_age = max_age
+        self.max_size = int(max_size)
+        self.drop_policy = drop_policy
+        self._enforce_size()
+        self._schedule_save()
+
+    @callback
+    def append(self, payload: dict, ts: float = None) -> None:
+        if ts is None:
+            ts = time.time()
+        if len(self._queue) >= self.max_size and self.drop_policy == "drop_newest":
+            self.dropped += 1
+            _LOGGER.debug("Write-Buffer voll, neues Sample verworfen")
+            return
+        self._queue.append((ts, payload))
+        self._enforce_size()
+        self._schedule_save()
+
+    @callback
+    def prune(self, now: float = None, max_age: float = None) -> None:
+        """Samples verwerfen, die älter als max_age sind (optional eine kürzere Grenze)."""
+        if now is None:
+            now = time.time()
+        max_age = self.max_age if max_age is None else min(max_age, self.max_age)
+        removed = 0
+        while self._queue and now - self._queue[0][0] > max_age:
+            self._queue.popleft()
+            removed += 1
+        if removed:
+            self.dropped += removed
+            _LOGGER.debug("Write-Buffer: %s zu alte Samples verworfen", removed)
+            self._schedule_save()
+
+    def peek(self, count: int) -> list:
+        """Die ältesten `count` Payloads (ohne sie zu entfernen)."""
+        return [payload for _, payload in islice(self._queue, count)]
+
+    @callback
+    def pop(self, count: int = 1) -> None:
+        for _ in range(min(count, len(self._queue))):
+            self._queue.popleft()
+        self._schedule_save()
+
+    @callback
+    def discard(self) -> None:
+        """Ältestes Sample verwerfen, ohne es zu senden (zählt als verworfen)."""
+        if self._queue:
+            self._queue.popleft()
+            self.dropped += 1
+            self._schedule_save()
+
+    def _enforce_size(self) -> None:
+        while len(self._queue) > self.max_size:
+            if self.drop_policy == "drop_newest":
+                self._queue.pop()
+            else:
+                self._queue.popleft()
+            self.dropped += 1
+
+    async def async_save(self) -> None:
+        """Ungesendete Samples sofort sichern (Unload/Reload)."""
+        await self._saver.async_save()
+
+    def _schedule_save(self) -> None:
+        self._saver.async_schedule()
+
+    def _data_to_save(self) -> dict:
+        return {"samples": [[ts, payload] for ts, payload in self._queue]}
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import (
+    CONF_WRITE_INTERVAL,
+    CONF_WRITE_MAX_INTERVAL,
+    CONF_WRITE_CHANGE_THRESHOLD,
+    CONF_WRITE_TIMEOUT,
+    DEFAULT_WRITE_INTERVAL,
+    DEFAULT_WRITE_MAX_INTERVAL,
+    DEFAULT_WRITE_CHANGE_THRESHOLD,
+    DEFAULT_WRITE_TIMEOUT,
+    CONF_WRITE_BUFFER_MAX_AGE,
+    CONF_WRITE_BUFFER_MAX_SIZE,
+    CONF_WRITE_BUFFER_DROP_POLICY,
+    CONF_WRITE_DRAIN_YIELD_EVERY,
+    DEFAULT_WRITE_BUFFER_MAX_AGE,
+    DEFAULT_WRITE_BUFFER_MAX_SIZE,
+    DEFAULT_WRITE_BUFFER_DROP_POLICY,
+    DEFAULT_WRITE_DRAIN_YIELD_EVERY,
+    CONF_WRITE_STATISTIC,
+    DEFAULT_WRITE_STATISTIC,
+    DEFAULT_VOLTAGE,
+    SIGNAL_WRITE_STATUS,
+    EVENT_WRITE_STATUS,
+)
+from .aggregation import TimeWeightedAggregator
+from .helper import EFriendsEventPublisher
+from .metrics import EFriendsMetrics
+from .write_buffer import EFriendsWriteBuffer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EFriendsWriter:
+    """Zeitgewichteten Mittelwert bilden + HTTP-POST an http://<host>/v3/MeterDataAPI/MeterData mit api_key
+
+    entity_map: Payload-Feld (powerTotal, power1Watt, ..., voltage3Volt) => HA-Entity
+
+    Sendezeitpunkt: Ändert sich powerTotal gegenüber dem zuletzt gesendeten Stand um
+    mehr als change_threshold, wird sofort gesendet (frühestens min_interval nach der
+    letzten Sendung). Bleibt die Last konstant, verdoppelt sich der Abstand bis max_interval.
+    """
+
+    def __init__(self, hass: HomeAssistant, host: str, entity_map: dict, api_key: str, status_entity_id: str,
+                 publisher: EFriendsEventPublisher, metrics: EFriendsMetrics):
+        self._hass = hass
+        self._metrics = metrics
+        self._host = host
+        self._api_key = api_key
+        if not any(key in entity_map for key in ("power1Watt", "power2Watt", "power3Watt")):
+            # Keine Phasen-Entities => Gesamtwert als L1 (wie bisher)
+            entity_map = {**entity_map, "power1Watt": entity_map["powerTotal"]}
+        self._aggregators = {key: TimeWeightedAggregator() for key in entity_map}
+        # Entity => Payload-Felder (eine Entity kann mehrere Felder speisen)
+        self._entity_keys = {}
+        for key, entity_id in entity_map.items():
+            self._entity_keys.setdefault(entity_id, []).append(key)
+        self._statistic = DEFAULT_WRITE_STATISTIC
+        self._min_interval = DEFAULT_WRITE_INTERVAL
+        self._max_interval = DEFAULT_WRITE_MAX_INTERVAL
+        self._change_threshold = DEFAULT_WRITE_CHANGE_THRESHOLD
+        self._interval = self._min_interval  # aktueller Abstand (min_interval .. max_interval)
+        self._last_flush = time.monotonic()
+        self._reference = None  # powerTotal (letzter Wert) beim letzten Senden
+        self._wake = asyncio.Event()
+        self._timeout = aiohttp.ClientTimeout(total=DEFAULT_WRITE_TIMEOUT)
+        # Geteilte aiohttp-Session von HA (Keep-Alive, Connection-Pool)
+        self._session = async_get_clientsession(hass)
+        self._unsub_listener = None
+        self._loop_task = None
+        self._status_entity_id = status_entity_id
+        self._publisher = publisher
+        self._connection_status = False  # Initialer Status: Verbindung nicht aktiv
+        # Ungesendete Samples (überlebt Neustarts)
+        self._buffer = EFriendsWriteBuffer(hass, status_entity_id)
+        self._drain_yield_every = DEFAULT_WRITE_DRAIN_YIELD_EVERY
+
+    async def async_init(self):
+        await self._buffer.async_load()
+        # Aktuelle Werte als Startwert übernehmen
+        now = time.time()
+        for entity_id in self._entity_keys:
+            self._add_state(entity_id, self._hass.states.get(entity_id), now)
+        # Nur die konfigurierten Entities beobachten, nicht jedes state_changed im System
+        self._unsub_listener = async_track_state_change_event(
+            self._hass, list(self._entity_keys), self._handle_state_change
+        )
+        self._loop_task = self._hass.loop.create_task(self._loop_cycle())
+
+
+    @callback
+    def _handle_state_change(self, event):
+        self._add_state(event.data["entity_id"], event.data.get("new_state"), time.time())
+
+    def _add_state(self, entity_id, new_state, ts: float):
+        keys = self._entity_keys.get(entity_id, ())
+        if new_state is None or new_state.state in (None, ""):
+            return
+        try:
+            val = float(new_state.state)
+        except ValueError:
+            # unavailable / unknown => bis zum nächsten gültigen Wert nichts senden
+            for key in keys:
+                self._aggregators[key].reset()
+            if "powerTotal" in keys:
+                # Nächster gültiger Wert wird sofort gesendet
+                self._reference = None
+            return
+        if new_state.attributes.get("unit_of_measurement") == "kW":
+            val *= 1000.0
+        for key in keys:
+            self._aggregators[key].add(val, ts)
+        if "powerTotal" in keys and not self._wake.is_set() and (
+            self._reference is None or abs(val - self._reference) > self._change_threshold
+        ):
+            # Laständerung => Sendeschleife sofort wecken
+            self._wake.set()
+
+    def async_update_options(self, options: dict):
+        """Sendeintervalle, Timeout und Puffer-Limits aus den Optionen übernehmen."""
+        self._min_interval = float(options.get(CONF_WRITE_INTERVAL, DEFAULT_WRITE_INTERVAL))
+        self._max_interval = max(
+            float(options.get(CONF_WRITE_MAX_INTERVAL, DEFAULT_WRITE_MAX_INTERVAL)), self._min_interval
+        )
+        self._change_threshold = float(options.get(CONF_WRITE_CHANGE_THRESHOLD, DEFAULT_WRITE_CHANGE_THRESHOLD))
+        self._interval = self._min_interval
+        self._timeout = aiohttp.ClientTimeout(
+            total=options.get(CONF_WRITE_TIMEOUT, DEFAULT_WRITE_TIMEOUT)
+        )
+        self._drain_yield_every = int(options.get(CONF_WRITE_DRAIN_YIELD_EVERY, DEFAULT_WRITE_DRAIN_YIELD_EVERY))
+        self._statistic = options.get(CONF_WRITE_STATISTIC, DEFAULT_WRITE_STATISTIC)
+        self._buffer.async_update_options(
+            options.get(CONF_WRITE_BUFFER_MAX_AGE, DEFAULT_WRITE_BUFFER_MAX_AGE),
+            options.get(CONF_WRITE_BUFFER_MAX_SIZE, DEFAULT_WRITE_BUFFER_MAX_SIZE),
+            options.get(CONF_WRITE_BUFFER_DROP_POLICY, DEFAULT_WRITE_BUFFER_DROP_POLICY),
+        )
+
+    def diagnostics(self) -> dict:
+        return {
+            "min_interval": self._min_interval,
+            "max_interval": self._max_interval,
+            "change_threshold": self._change_threshold,
+            "interval": self._interval,
+            "statistic": self._statistic,
+            "connected": self._connection_status,
+            "buffered": len(self._buffer),
+            "buffer_dropped": self._buffer.dropped,
+        }
+
+    async def _send_data(self, url, data, headers):
+        """POST über die geteilte Session, blockiert keinen Executor-Thread."""
+        async with self._session.post(url, json=data, headers=headers, timeout=self._timeout) as resp:
+            return resp.status, await resp.text()
+
+    def _set_write_status(self, status: bool):
+        """Schreibstatus an den Status-Sensor melden (optional auch an den Bus)."""
+        self._connection_status = status
+        async_dispatcher_send(self._hass, SIGNAL_WRITE_STATUS.format(self._status_entity_id), status)
+        self._publisher.async_publish(EVENT_WRITE_STATUS, status)
+
+    async def _loop_cycle(self):
+        url = f"http://{self._host}/v3/MeterDataAPI/MeterData"
+        headers = {
+            "Content-Type": "application/json",
+            "apiKey": self._api_key
+        }
+        while True:
+            try:
+                changed = await self._wait_for_flush()
+                self._metrics.inc("flushes_change" if changed else "flushes_timer")
+                data = self._build_payload(time.time())
+                self._last_flush = time.monotonic()
+                # Änderungen während des Sendens wecken die nächste Runde
+                self._wake.clear()
+                if changed:
+                    self._interval = self._min_interval
+                else:
+                    # Konstante Last => seltener senden
+                    self._interval = min(self._interval * 2, self._max_interval)
+                if data is not None:
+                    # Immer über den Puffer, damit die Reihenfolge erhalten bleibt
+                    self._buffer.append(data)
+
+                if len(self._buffer):
+                    await self._drain(url, headers)
+            except Exception:  # pylint: disable=broad-except
+                # Ein Fehler darf die Sendeschleife nicht beenden
+                _LOGGER.exception("Fehler in der Sendeschleife für %s", url)
+                self._metrics.inc("loop_errors")
+                self._last_flush = time.monotonic()
+                self._interval = self._min_interval
+
+    async def _wait_for_flush(self) -> bool:
+        """Bis zum nächsten Senden warten. True, wenn eine Laständerung es auslöst."""
+        timeout = self._last_flush + self._interval - time.monotonic()
+        try:
+            await asyncio.wait_for(self._wake.wait(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return False
+        # Mindestabstand zwischen zwei Sendungen einhalten
+        delay = self._last_flush + self._min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    def _build_payload(self, ts: float):
+        """Sendefenster abschließen und Payload bauen (None, wenn kein Gesamtwert vorliegt)."""
+        values = {}
+        for key, aggregator in self._aggregators.items():
+            result = aggregator.flush(ts)
+            if result is not None:
+                values[key] = result[self._statistic]
+                if key == "powerTotal":
+                    self._reference = result["last"]
+        if "powerTotal" not in values:
+            return None
+        return {
+            "power1Watt": round(values.get("power1Watt", 0)),
+            "power2Watt": round(values.get("power2Watt", 0)),
+            "power3Watt": round(values.get("power3Watt", 0)),
+            "powerTotal": round(values["powerTotal"]),
+            "voltage1Volt": round(values.get("voltage1Volt", DEFAULT_VOLTAGE)),
+            "voltage2Volt": round(values.get("voltage2Volt", DEFAULT_VOLTAGE)),
+            "voltage3Volt": round(values.get("voltage3Volt", DEFAULT_VOLTAGE)),
+            "dataSource": "HA E-Friends Writer"
+        }
+
+    async def _drain(self, url, headers):
+        """
+        Gepufferte Samples in Reihenfolge senden, bis der Puffer leer ist oder ein POST
+        scheitert. Die Payload hat keinen Zeitstempel, das Meter nimmt jeden POST als
+        aktuellen Messwert. Samples, die älter als write_interval sind, werden deshalb
+        verworfen statt nach einem Ausfall gesammelt (als wären sie aktuell) gesendet.
+        Nach je drain_yield_every Samples kommt die Eventloop wieder dran (ein POST pro Sample).
+        """
+        self._buffer.prune(max_age=self._min_interval)
+        backlog = len(self._buffer)
+        while len(self._buffer):
+            for data in self._buffer.peek(self._drain_yield_every):
+                status = await self._send_sample(url, data, headers)
+                if status == 200:
+                    self._buffer.pop()
+                elif status is not None and 400 <= status < 500 and status not in (408, 429):
+                    # Wird auch beim nächsten Versuch abgelehnt => nicht ewig wiederholen
+                    _LOGGER.warning("Sample vom Server abgelehnt (HTTP %s), wird verworfen: %s", status, data)
+                    self._buffer.discard()
+                    return
+                else:
+                    # Endpunkt nicht erreichbar => im Puffer lassen, später erneut
+                    if len(self._buffer) > 1:
+                        _LOGGER.debug("Write-Buffer: %s Samples warten auf Versand", len(self._buffer))
+                    return
+            await asyncio.sleep(0)
+        if backlog > 1:
+            _LOGGER.debug("Write-Buffer: Rückstau von %s Samples gesendet", backlog)
+
+    async def _send_sample(self, url, data, headers):
+        """Ein Sample senden. Gibt den HTTP-Status zurück (None bei Verbindungsfehler)."""
+        self._metrics.inc("posts_total")
+        start = time.perf_counter()
+        try:
+            status, text = await self._send_data(url, data, headers)
+            self._metrics.observe("post_latency", time.perf_counter() - start)
+
+            if status == 200:
+                _LOGGER.debug("Daten an %s gesendet: %s", url, text)
+                self._set_write_status(True)
+            else:
+                _LOGGER.warning("Send-Fehler: %s - %s", status, text)
+                self._metrics.inc("posts_failed")
+                self._set_write_status(False)
+            return status
+        except asyncio.TimeoutError:
+            _LOGGER.warning("Timeout beim Senden an %s", url)
+        except aiohttp.ClientError as e:
+            _LOGGER.warning("Verbindungsfehler beim Senden an %s: %s", url, e)
+        except Exception as e:
+            _LOGGER.error("Exception beim Senden an %s: %s", url, e)
+        self._metrics.inc("posts_failed")
+        self._set_write_status(False)
+        return None
+
+    async def async_unload(self):
+        if self._unsub_listener:
+            self._unsub_listener()
+        if self._loop_task:
+            self._loop_task.cancel()
+        await self._buffer.async_save()
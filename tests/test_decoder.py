@@ -0,0 +1,96 @@
+"""FrameDecoder: aufgezeichnete rawPowerMessage-Frames durch den Decoder der Sensor-Tabellen schicken."""
+import pytest
+
+from custom_components.efriends.const import UNKNOWN_FIELDS_COLLECT, UNKNOWN_FIELDS_IGNORE
+from custom_components.efriends.decoder import compile_decoder
+from custom_components.efriends.sensor import (
+    FRAME_GROUPS,
+    SENSOR_DEFINITIONS,
+    SENSOR_DEFINITIONS_TRADE,
+    TRADE_IGNORED_KEYS,
+)
+
+# Ausschnitt aus einer Aufzeichnung des /MeterDataAPI-Streams (tools/record.py)
+RECORDED_FRAMES = [
+    {"powerTotal": 812.4, "power1Watt": 270.1, "power2Watt": 281.9, "power3Watt": 260.4,
+     "current1Ampere": 1.17, "current2Ampere": 1.23, "current3Ampere": 1.13,
+     "voltage1Volt": 230.4, "voltage2Volt": 229.8, "voltage3Volt": 231.1},
+    {"powerTotal": -1530.0, "power1Watt": -510.2, "power2Watt": -498.7, "power3Watt": -521.1,
+     "current1Ampere": 2.22, "current2Ampere": 2.17, "current3Ampere": 2.27,
+     "voltage1Volt": 231.9, "voltage2Volt": 232.3, "voltage3Volt": 231.5},
+    # Ältere Firmware: Werte als Strings
+    {"powerTotal": "640.5", "power1Watt": "200.5", "power2Watt": "220", "power3Watt": "220",
+     "current1Ampere": "0.87", "current2Ampere": "0.96", "current3Ampere": "0.96",
+     "voltage1Volt": "229.9", "voltage2Volt": "230.1", "voltage3Volt": "230.0"},
+    # Phase 3 fehlt, ein Wert ist ungültig
+    {"powerTotal": 455.0, "power1Watt": 200.0, "power2Watt": "n/a",
+     "current1Ampere": 0.87, "current2Ampere": 1.1,
+     "voltage1Volt": 230.0, "voltage2Volt": 230.2},
+    # Neues Feld einer neueren Firmware
+    {"powerTotal": 300.0, "power1Watt": 100.0, "power2Watt": 100.0, "power3Watt": 100.0,
+     "current1Ampere": 0.43, "current2Ampere": 0.43, "current3Ampere": 0.43,
+     "voltage1Volt": 230.0, "voltage2Volt": 230.0, "voltage3Volt": 230.0, "frequencyHz": 50.01},
+]
+
+EXPECTED = [
+    {"powerTotal": 812.4, "power2Watt": 281.9, "current3Ampere": 1.13, "voltage3Volt": 231.1},
+    {"powerTotal": -1530.0, "power2Watt": -498.7, "current3Ampere": 2.27, "voltage3Volt": 231.5},
+    {"powerTotal": 640.5, "power2Watt": 220.0, "current3Ampere": 0.96, "voltage3Volt": 230.0},
+    # fehlende Felder => 0.0, ungültiger Wert => alter Wert bleibt
+    {"powerTotal": 455.0, "power2Watt": 220.0, "current3Ampere": 0.0, "voltage3Volt": 0.0},
+    {"powerTotal": 300.0, "power2Watt": 100.0, "current3Ampere": 0.43, "voltage3Volt": 230.0},
+]
+
+
+def _replay(decoder, frames):
+    record = decoder.layout.new_record()
+    slots = decoder.layout.slots
+    decoded = []
+    for frame in frames:
+        decoder.decode_into(frame, record)
+        decoded.append({key: record[slots[key]] for key in EXPECTED[0]})
+    return decoded
+
+
+def test_replay_recorded_frames():
+    decoder = compile_decoder(SENSOR_DEFINITIONS, FRAME_GROUPS)
+    assert _replay(decoder, RECORDED_FRAMES) == [pytest.approx(values) for values in EXPECTED]
+    assert decoder.invalid_count == 1
+    assert decoder.extras == {}
+
+
+def test_replay_repeated_frames_counts_every_invalid_field():
+    """Auch nach einem Fehlschlag des Schnellpfads zählt jeder ungültige Wert."""
+    decoder = compile_decoder(SENSOR_DEFINITIONS, FRAME_GROUPS)
+    frames = RECORDED_FRAMES * 50
+    decoded = _replay(decoder, frames)
+    assert decoded[-5:] == [pytest.approx(values) for values in EXPECTED]
+    assert decoder.invalid_count == 50
+
+
+def test_unknown_fields_collect():
+    decoder = compile_decoder(SENSOR_DEFINITIONS, FRAME_GROUPS, UNKNOWN_FIELDS_COLLECT)
+    _replay(decoder, RECORDED_FRAMES)
+    assert decoder.unknown_fields == {"frequencyHz"}
+    assert decoder.extras == {"frequencyHz": 50.01}
+
+
+def test_unknown_fields_ignore():
+    decoder = compile_decoder(SENSOR_DEFINITIONS, FRAME_GROUPS, UNKNOWN_FIELDS_IGNORE)
+    _replay(decoder, RECORDED_FRAMES)
+    assert decoder.unknown_fields == set()
+
+
+def test_trading_summary_ignores_order_list():
+    decoder = compile_decoder(
+        SENSOR_DEFINITIONS_TRADE, FRAME_GROUPS, UNKNOWN_FIELDS_COLLECT, ignore_keys=TRADE_IGNORED_KEYS
+    )
+    record = decoder.layout.new_record()
+    summary = {"energyBalance": 120.5, "totalOrderVolume": 300, "consumable": "80.25",
+               "remainingEnergyBalance": 40.25, "confirmedOrders": [{"trader": "a", "volume": 10}]}
+    assert decoder.decode_into(summary, record) == 0
+    assert decoder.layout.as_dict(record) == {
+        "energyBalance": 120.5, "totalOrderVolume": 300.0, "consumable": 80.25, "remainingEnergyBalance": 40.25,
+    }
+    assert decoder.extras == {}
+    assert decoder.invalid_count == 0
@@ -0,0 +1,837 @@
+"""Offline-Benchmarks für Read-Mode, Trading und Write-Mode.
+
+    python -m tools.bench                          # alle Szenarien, künstliche Daten
+    python -m tools.bench read --recording meter.jsonl.gz --frames 20000
+    python -m tools.bench trading --traders 2000 --trader-mode aggregate
+    python -m tools.bench trader_scale --community-sizes 100,5000 --changed 2,200 --summaries 100
+    python -m tools.bench write --updates 20000 --memory
+    python -m tools.bench decode --frames 20000     # bisheriges Parsen vs. kompilierter Decoder
+    python -m tools.bench read --socket --speed 0  # über den Stand-in (Socket.IO)
+    python -m tools.bench reload --reloads 50       # Setup/Unload, Listener- und Speicherverlauf
+    python -m tools.bench energy --frames 20000     # Tageswerte gegen eine Referenz, Checkpoint
+    python -m tools.bench callbacks --entities 5000 # Writer-Callbacks: nur eigene Entities vs. jedes state_changed
+
+Gemessen wird die echte Integration in einem minimalen HA-Kern (tools/harness.py):
+- frames/s: Durchsatz (Wall-Clock) beim Einspeisen so schnell wie möglich
+- cpu/frame: CPU-Zeit (process_time) pro Frame inkl. HA-State-Machine
+- writes/frame: state_changed-Events pro Frame. Die Publishing-Policy bekommt dafür
+  die Zeit aus der Aufzeichnung (Simulationsuhr), die Werte entsprechen damit dem
+  Live-Betrieb, obwohl schneller eingespeist wird
+- Speicher: Peak-RSS des Prozesses, mit --memory zusätzlich tracemalloc (verfälscht cpu/frame)
+- reload: Setup- und Reload-Zeit einer read_write-Entry; bricht ab, wenn die Listener (Bus,
+  Dispatcher, Timer) nach allen Reloads nicht denen nach dem ersten Setup entsprechen oder
+  der belegte Speicher stärker wächst als --max-traced-kib plus --traced-kib-per-reload je Reload
+- energy: Import/Export-kWh eines Replays (mit Reload) gegen eine unabhängig integrierte
+  Referenz; bricht bei Abweichung ab oder wenn unter Dauerlast kein Checkpoint geschrieben wird
+- decode: ns pro Frame für das bisherige Parsen und den kompilierten Decoder, dazu
+  das Lesen aller Sensorwerte (dict vs. Slot) und beides zusammen, ohne HA-Kern
+- trader_scale: CPU und State-Writes pro Trading-Event für jede Kombination aus
+  Communitygröße und Anzahl geänderter Trader
+- callbacks: Aufrufe und CPU-Mehraufwand pro State-Update für den Writer, vorher
+  (Listener auf jedes state_changed) und nachher (nur die konfigurierten Entities)
+"""
+import gc
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+from homeassistant import config_entries
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import callback
+
+from .harness import DOMAIN, BenchHass
+from .recording import (
+    EVENT_RAWPOWER,
+    read_recording,
+    synthetic_messages,
+    synthetic_summary,
+)
+from .standin import StandInServer
+
+UNREACHABLE_HOST = "127.0.0.1:9"
+
+
+class SimClock:
+    """Ersatz für das time-Modul der Publishing-Policy: Zeit = dt der Aufzeichnung."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+class Measurement:
+    def __init__(self, memory: bool):
+        self._memory = memory
+
+    def __enter__(self):
+        if self._memory:
+            tracemalloc.start()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.cpu = time.process_time() - self.cpu
+        self.wall = time.perf_counter() - self.wall
+        self.traced_kib = None
+        if self._memory:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.traced_kib = {"current": round(current / 1024), "peak": round(peak / 1024)}
+
+
+def _load_messages(args):
+    if args.recording:
+        _, messages = read_recording(args.recording)
+    else:
+        messages = synthetic_messages(seconds=max(args.frames, 1), traders=args.traders)
+    return messages
+
+
+def _raw_frames(messages, count: int):
+    """count Frames (dt, frame); kürzere Aufzeichnungen werden aneinandergehängt."""
+    raw = [(dt, data) for dt, event, _, data in messages if event == EVENT_RAWPOWER]
+    if not raw:
+        raise SystemExit("Aufzeichnung enthält keine rawPowerMessage")
+    span = raw[-1][0] + 1.0
+    frames = []
+    offset = 0.0
+    while len(frames) < count:
+        for dt, frame in raw:
+            frames.append((dt + offset, frame))
+            if len(frames) == count:
+                break
+        offset += span
+    return frames
+
+
+def _patch_clock(bench: BenchHass) -> SimClock:
+    clock = SimClock()
+    sys.modules[f"custom_components.{DOMAIN}.publish_policy"].time = clock
+    return clock
+
+
+def _result(name: str, count: int, unit: str, measurement: Measurement, writes: int, extra=None) -> dict:
+    """unit im Plural (frames, summaries, updates), die Kennzahlen pro Einheit im Singular."""
+    per = {"summaries": "summary"}.get(unit, unit[:-1])
+    result = {
+        "scenario": name,
+        unit: count,
+        "wall_s": round(measurement.wall, 3),
+        f"{unit}_per_s": round(count / measurement.wall, 1) if measurement.wall else None,
+        f"cpu_us_per_{per}": round(measurement.cpu / count * 1e6, 1) if count else None,
+        f"writes_per_{per}": round(writes / count, 3) if count else None,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    if measurement.traced_kib:
+        result["traced_kib"] = measurement.traced_kib
+    if extra:
+        result.update(extra)
+    return result
+
+
+async def bench_read(args) -> dict:
+    messages = _load_messages(args)
+    frames = _raw_frames(messages, args.frames)
+    bench = BenchHass()
+    server = None
+    try:
+        hass = await bench.async_start()
+        host = UNREACHABLE_HOST
+        if args.socket:
+            server = StandInServer(messages, speed=args.speed, loop=True)
+            host = f"127.0.0.1:{await server.start()}"
+        await bench.async_add_entry({"host": host, "mode": "read"}, args.options)
+        reader = bench.entry_data["socket_reader"]
+        writes_before = bench.state_writes
+
+        if args.socket:
+            # Ende-zu-Ende über Socket.IO, Zeitbasis ist hier die echte Uhr
+            with Measurement(args.memory) as measurement:
+                deadline = time.monotonic() + args.timeout
+                while reader.ingest.queued < args.frames and time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                await hass.async_block_till_done()
+            count = reader.ingest.queued
+        else:
+            clock = _patch_clock(bench)
+            t0 = time.time() - frames[-1][0] - 1.0
+            with Measurement(args.memory) as measurement:
+                for dt, frame in frames:
+                    clock.now = dt
+                    reader.ingest.put_raw(frame, t0 + dt)
+                    # Eventloop einmal laufen lassen => ein Batch pro Frame wie im Live-Betrieb
+                    await asyncio.sleep(0)
+                await hass.async_block_till_done()
+            count = len(frames)
+
+        return _result(
+            "read", count, "frames", measurement, bench.state_writes - writes_before,
+            {"ingest": reader.ingest.metrics()},
+        )
+    finally:
+        if server is not None:
+            await server.stop()
+        await bench.async_stop()
+
+
+def _decode_old(frames, keys, collect: bool = False) -> float:
+    """Bisheriges Parsen: float(get()) pro Feld in ein dict; collect: unbekannte Felder direkt dazu einsammeln."""
+    data = {}
+    extras = {}
+    known = frozenset(keys)
+    start = time.perf_counter()
+    for frame in frames:
+        for key in keys:
+            data[key] = float(frame.get(key, 0.0))
+        if collect:
+            for key in frame.keys() - known:
+                extras[key] = frame[key]
+    return time.perf_counter() - start
+
+
+def _decode_new(frames, decoder) -> float:
+    """Kompilierter Decoder: ein Durchlauf in den Datensatz."""
+    record = decoder.layout.new_record()
+    decode_into = decoder.decode_into
+    start = time.perf_counter()
+    for frame in frames:
+        decode_into(frame, record)
+    return time.perf_counter() - start
+
+
+def _frame_old(frames, keys, sensor_keys) -> float:
+    """Bisher pro Frame: Parsen in ein dict, dann liest jeder Sensor seinen Key nach."""
+    data = dict.fromkeys(sensor_keys, 0.0)
+    start = time.perf_counter()
+    for frame in frames:
+        for key in keys:
+            data[key] = float(frame.get(key, 0.0))
+        for key in sensor_keys:
+            data.get(key, 0.0)
+    return time.perf_counter() - start
+
+
+def _frame_new(frames, decoder, sensor_slots) -> float:
+    """Jetzt pro Frame: Decoder in den Datensatz, dann liest jeder Sensor seinen Slot."""
+    record = decoder.layout.new_record()
+    decode_into = decoder.decode_into
+    start = time.perf_counter()
+    for frame in frames:
+        decode_into(frame, record)
+        for slot in sensor_slots:
+            record[slot]
+    return time.perf_counter() - start
+
+
+def _read_old(count: int, data: dict, sensor_keys) -> float:
+    """Sensoren lesen ihren Wert bisher per Key aus dem dict nach."""
+    start = time.perf_counter()
+    for _ in range(count):
+        for key in sensor_keys:
+            data.get(key, 0.0)
+    return time.perf_counter() - start
+
+
+def _read_new(count: int, record, sensor_slots) -> float:
+    """Sensoren lesen ihren Slot im Datensatz."""
+    start = time.perf_counter()
+    for _ in range(count):
+        for slot in sensor_slots:
+            record[slot]
+    return time.perf_counter() - start
+
+
+def _best_of(rounds: int, old, new):
+    """Beste Zeit beider Varianten, abwechselnd gemessen (Lastschwankungen treffen beide gleich)."""
+    times = [(old(), new()) for _ in range(rounds)]
+    return min(t for t, _ in times), min(t for _, t in times)
+
+
+async def bench_decode(args) -> dict:
+    """
+    Micro-Benchmark des Frame-Decoders (ohne HA-Kern): bisheriges Parsen (float(get())
+    pro Feld in ein dict) gegen den aus SENSOR_DEFINITIONS kompilierten Decoder, dazu
+    das Lesen der Werte durch die Sensoren (dict-Key vs. Slot). Varianten: normale
+    Frames, Werte als Strings (ältere Firmware) und ein unbekanntes Feld (Policy ignore
+    wie bisher, und collect). frame_total: Dekodieren plus einmal jeden Sensor lesen, wie
+    es die Publishing-Policy pro Frame tut.
+    """
+    import importlib
+
+    sensor = importlib.import_module(f"custom_components.{DOMAIN}.sensor")
+    decoder_module = importlib.import_module(f"custom_components.{DOMAIN}.decoder")
+    frames = [frame for _, frame in _raw_frames(_load_messages(args), args.frames)]
+    unknown = [{**frame, "frequencyHz": 50.0} for frame in frames]
+    variants = {
+        "numeric": (frames, "ignore"),
+        "strings": ([{key: str(value) for key, value in frame.items()} for frame in frames], "ignore"),
+        # Bisher wurden unbekannte Felder stillschweigend übergangen (= ignore); für collect
+        # sammelt auch das bisherige Parsen sie ein (frame.keys() - bekannte Felder pro Frame)
+        "unknown_field": (unknown, "ignore"),
+        "unknown_field_collect": (unknown, "collect"),
+    }
+    result = {"scenario": "decode", "frames": len(frames), "rounds": args.rounds}
+    for name, (variant, policy) in variants.items():
+        decoder = decoder_module.compile_decoder(sensor.SENSOR_DEFINITIONS, sensor.FRAME_GROUPS, policy)
+        keys = [key for _, key in decoder._fields]
+        old, new = _best_of(
+            args.rounds, lambda: _decode_old(variant, keys, policy == "collect"), lambda: _decode_new(variant, decoder)
+        )
+        result[name] = {
+            "old_ns_per_frame": round(old / len(variant) * 1e9),
+            "new_ns_per_frame": round(new / len(variant) * 1e9),
+            "speedup": round(old / new, 2),
+        }
+
+    # Lesen aller statischen Sensoren (eine Runde = jeder Sensor einmal)
+    decoder = decoder_module.compile_decoder(sensor.SENSOR_DEFINITIONS, sensor.FRAME_GROUPS)
+    sensor_keys = list(decoder.layout.keys)
+    sensor_slots = [decoder.layout.slots[key] for key in sensor_keys]
+    old, new = _best_of(
+        args.rounds,
+        lambda: _read_old(len(frames), dict.fromkeys(sensor_keys, 1.0), sensor_keys),
+        lambda: _read_new(len(frames), decoder.layout.new_record(), sensor_slots),
+    )
+    result["sensor_reads"] = {
+        "sensors": len(sensor_keys),
+        "old_ns_per_round": round(old / len(frames) * 1e9),
+        "new_ns_per_round": round(new / len(frames) * 1e9),
+        "speedup": round(old / new, 2),
+    }
+
+    keys = [key for _, key in decoder._fields]
+    result["frame_total"] = {}
+    for name in ("numeric", "strings"):
+        variant = variants[name][0]
+        old, new = _best_of(
+            args.rounds, lambda: _frame_old(variant, keys, sensor_keys), lambda: _frame_new(variant, decoder, sensor_slots)
+        )
+        result["frame_total"][name] = {
+            "old_ns_per_frame": round(old / len(variant) * 1e9),
+            "new_ns_per_frame": round(new / len(variant) * 1e9),
+            "speedup": round(old / new, 2),
+        }
+    return result
+
+
+async def bench_trading(args) -> dict:
+    rnd = random.Random(1)
+    summaries = [synthetic_summary(rnd, args.traders) for _ in range(args.summaries)]
+    bench = BenchHass()
+    try:
+        hass = await bench.async_start()
+        options = {**args.options, "trader_mode": args.trader_mode}
+        await bench.async_add_entry({"host": UNREACHABLE_HOST, "mode": "read"}, options)
+        reader = bench.entry_data["socket_reader"]
+        clock = _patch_clock(bench)
+        writes_before = bench.state_writes
+        with Measurement(args.memory) as measurement:
+            for index, summary in enumerate(summaries):
+                clock.now = index * 60.0
+                reader.ingest.put_trading(summary)
+                await asyncio.sleep(0)
+            await hass.async_block_till_done()
+        return _result(
+            "trading", len(summaries), "summaries", measurement, bench.state_writes - writes_before,
+            {"traders": len(bench.entry_data["trade_data"]["traders"]), "trader_mode": args.trader_mode},
+        )
+    finally:
+        await bench.async_stop()
+
+
+def _community_summary(amounts: list) -> dict:
+    """Summary mit einem Auftrag pro Traderpaar (Verkäufer 2i+1, Käufer 2i+2, beide mit amounts[i])."""
+    return {
+        "energyBalance": 100.0,
+        "totalOrderVolume": round(sum(amounts), 1),
+        "consumable": 50.0,
+        "remainingEnergyBalance": 10.0,
+        "confirmedOrders": [
+            {"sellerId": 2 * i + 1, "buyerId": 2 * i + 2, "amount": amount} for i, amount in enumerate(amounts)
+        ],
+    }
+
+
+async def bench_trader_scale(args) -> dict:
+    """
+    Kosten pro Trading-Event abhängig von Communitygröße und Anzahl geänderter Trader,
+    getrennt variiert: nur --changed Trader bekommen pro Event einen neuen Wert.
+    State-Writes und (bei partial) CPU pro Event sollen der Zahl der geänderten Trader
+    folgen, nicht der Größe der Community.
+    """
+    rows = []
+    for size in args.community_sizes:
+        bench = BenchHass()
+        try:
+            hass = await bench.async_start()
+            options = {**args.options, "trader_mode": args.trader_mode}
+            await bench.async_add_entry({"host": UNREACHABLE_HOST, "mode": "read"}, options)
+            ingest = bench.entry_data["socket_reader"].ingest
+            clock = _patch_clock(bench)
+            amounts = [float(i % 400 + 1) for i in range(size // 2)]
+            ingest.put_trading(_community_summary(amounts))
+            await hass.async_block_till_done()
+
+            for changed in args.changed:
+                pairs = min(max(changed // 2, 1), len(amounts))
+                # full: jedes Event enthält die ganze Community (Parsen wächst mit der Größe),
+                # partial: nur die geänderten Trader (was übrig bleibt, ist die Sensorarbeit)
+                for payload in ("full", "partial"):
+                    summaries = []
+                    for index in range(args.summaries):
+                        # Andere Paare pro Event, der Rest der Community bleibt gleich
+                        touched = [pair % len(amounts) for pair in range(index * pairs, (index + 1) * pairs)]
+                        for pair in touched:
+                            amounts[pair] += 1.0
+                        if payload == "full":
+                            summary = _community_summary(amounts)
+                        else:
+                            summary = _community_summary([amounts[pair] for pair in touched])
+                            for order, pair in zip(summary["confirmedOrders"], touched):
+                                order["sellerId"], order["buyerId"] = 2 * pair + 1, 2 * pair + 2
+                        summaries.append(summary)
+                    writes_before = bench.state_writes
+                    with Measurement(False) as measurement:
+                        for summary in summaries:
+                            clock.now += 60.0
+                            ingest.put_trading(summary)
+                            await asyncio.sleep(0)
+                        await hass.async_block_till_done()
+                    rows.append({
+                        "traders": len(bench.entry_data["trade_data"]["traders"]),
+                        "changed": 2 * pairs,
+                        "payload": payload,
+                        "cpu_us_per_summary": round(measurement.cpu / args.summaries * 1e6, 1),
+                        "writes_per_summary": round((bench.state_writes - writes_before) / args.summaries, 2),
+                    })
+        finally:
+            await bench.async_stop()
+    return {
+        "scenario": "trader_scale",
+        "summaries": args.summaries,
+        "trader_mode": args.trader_mode,
+        "rows": rows,
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+async def bench_write(args) -> dict:
+    bench = BenchHass()
+    server = StandInServer([], speed=0)
+    sources = ["sensor.bench_power", "sensor.bench_power_l1", "sensor.bench_power_l2", "sensor.bench_power_l3"]
+    try:
+        hass = await bench.async_start()
+        port = await server.start()
+
+        # Grundlast der State-Machine ohne Writer (nicht beobachtete Entity)
+        with Measurement(False) as baseline:
+            for i in range(args.updates):
+                hass.states.async_set("sensor.bench_other", 1000 + i % 500, {"unit_of_measurement": "W"})
+                if i % 100 == 0:
+                    await asyncio.sleep(0)
+
+        await bench.async_add_entry(
+            {
+                "host": f"127.0.0.1:{port}", "mode": "write", "api_key": "bench",
+                "consumption_entity": sources[0], "power_l1_entity": sources[1],
+                "power_l2_entity": sources[2], "power_l3_entity": sources[3],
+            },
+            {**args.options, "write_interval": args.write_interval},
+        )
+        writes_before = bench.state_writes
+        with Measurement(args.memory) as measurement:
+            for i in range(args.updates):
+                hass.states.async_set(sources[i % 4], 1000 + i % 500, {"unit_of_measurement": "W"})
+                if i % 100 == 0:
+                    await asyncio.sleep(0)
+            await hass.async_block_till_done()
+        # Writer eine Weile senden lassen
+        await asyncio.sleep(args.duration)
+        integration_writes = bench.state_writes - writes_before - args.updates
+        return _result(
+            "write", args.updates, "updates", measurement, integration_writes,
+            {
+                "baseline_cpu_us_per_update": round(baseline.cpu / args.updates * 1e6, 1),
+                "posts": len(server.posts),
+                "posts_per_s": round(len(server.posts) / args.duration, 2),
+            },
+        )
+    finally:
+        await server.stop()
+        await bench.async_stop()
+
+
+async def bench_callbacks(args) -> dict:
+    """
+    Writer-Callbacks in einer großen Installation: --entities fremde Sensoren und die
+    Verbrauchs-Entity ändern sich gemischt (jedes --tracked-every-te Update betrifft die
+    Verbrauchs-Entity). Vorher: ein Listener auf jedes state_changed, gefiltert im
+    Callback (hier nachgebildet). Nachher: async_track_state_change_event nur auf die
+    konfigurierten Entities. Gleiche Update-Folge ohne Writer als Grundlast.
+    """
+    bench = BenchHass()
+    server = StandInServer([], speed=0)
+    source = "sensor.bench_power"
+    others = [f"sensor.bench_other_{i}" for i in range(args.entities)]
+    attributes = {"unit_of_measurement": "W"}
+
+    runs = 0
+
+    def updates():
+        # Jeder Wert nur einmal, sonst unterdrückt die State-Machine das state_changed
+        offset = runs * args.updates
+        for i in range(args.updates):
+            entity_id = source if i % args.tracked_every == 0 else others[i % len(others)]
+            yield entity_id, offset + i
+
+    async def run() -> Measurement:
+        nonlocal runs
+        runs += 1
+        with Measurement(False) as measurement:
+            for i, (entity_id, value) in enumerate(updates()):
+                hass.states.async_set(entity_id, value, attributes)
+                if i % 100 == 0:
+                    await asyncio.sleep(0)
+            await hass.async_block_till_done()
+        return measurement
+
+    try:
+        hass = await bench.async_start()
+        port = await server.start()
+        for entity_id in [source, *others]:
+            hass.states.async_set(entity_id, 0, attributes)
+        baseline = await run()
+
+        await bench.async_add_entry(
+            {"host": f"127.0.0.1:{port}", "mode": "write", "api_key": "bench", "consumption_entity": source},
+            args.options,
+        )
+        writer = bench.entry_data["writer"]
+        add_state = writer._add_state
+        tracked_calls = 0
+
+        def counting_add_state(*call_args):
+            nonlocal tracked_calls
+            tracked_calls += 1
+            add_state(*call_args)
+
+        writer._add_state = counting_add_state
+        tracked = await run()
+        writer._add_state = add_state
+
+        # Vorher: jedes state_changed landet im Callback, der Filter verwirft fast alle.
+        # Tracker des Writers dafür abmelden, der nachgebildete Listener speist ihn wie früher.
+        writer._unsub_listener()
+        writer._unsub_listener = None
+        global_calls = 0
+
+        @callback
+        def handle_any_state_change(event):
+            nonlocal global_calls
+            global_calls += 1
+            entity_id = event.data["entity_id"]
+            if entity_id != source:
+                return
+            add_state(entity_id, event.data.get("new_state"), time.time())
+
+        unsub = hass.bus.async_listen(EVENT_STATE_CHANGED, handle_any_state_change)
+        global_listener = await run()
+        unsub()
+
+        def overhead(measurement):
+            return round((measurement.cpu - baseline.cpu) / args.updates * 1e6, 2)
+
+        return {
+            "scenario": "callbacks",
+            "updates": args.updates,
+            "entities": args.entities + 1,
+            "callbacks_before": global_calls,
+            "callbacks_after": tracked_calls,
+            "baseline_cpu_us_per_update": round(baseline.cpu / args.updates * 1e6, 2),
+            "overhead_cpu_us_per_update_before": overhead(global_listener),
+            "overhead_cpu_us_per_update_after": overhead(tracked),
+            "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+    finally:
+        await server.stop()
+        await bench.async_stop()
+
+
+def _reference_energy(stream, max_gap: float):
+    """
+    Referenz für den Energy-Replay, unabhängig von energy.py: jedes Intervall fein
+    unterteilt (Mittelpunktregel auf der Geraden), getrennt nach Bezug/Einspeisung. Wh.
+    """
+    import_wh = export_wh = 0.0
+    last = None
+    for ts, power in stream:
+        if last is not None:
+            t0, p0 = last
+            if ts <= t0:
+                continue
+            if ts - t0 <= max_gap:
+                steps = 200
+                step = (ts - t0) / steps
+                for i in range(steps):
+                    p = p0 + (power - p0) * (i + 0.5) / steps
+                    if p > 0:
+                        import_wh += p * step / 3600.0
+                    else:
+                        export_wh -= p * step / 3600.0
+        last = (ts, power)
+    return import_wh, export_wh
+
+
+def _energy_stream(frames, start: float, rnd: random.Random):
+    """(ts, frame) mit unregelmäßigen Abständen, einem Duplikat und einer Lücke > ENERGY_MAX_GAP."""
+    stream = []
+    ts = start
+    for index, (_, frame) in enumerate(frames):
+        if index == len(frames) // 3:
+            ts += 400.0
+        elif index == len(frames) // 4:
+            stream.append((ts, frame))  # gleicher Zeitstempel => darf nicht zählen
+        ts += rnd.uniform(0.2, 3.0)
+        stream.append((ts, frame))
+    return stream
+
+
+async def bench_energy(args) -> dict:
+    """
+    Replay einer Referenzleistung durch den echten Read-Pfad: Tageswerte (Import/Export)
+    müssen der Referenz entsprechen, auch über einen Reload in der Mitte (Checkpoint
+    beim Unload, Laden beim Setup). Danach laufen Frames in Echtzeit weiter und der
+    Checkpoint muss währenddessen auf der Platte landen (verkürzter ENERGY_SAVE_DELAY).
+    """
+    from homeassistant.util import dt as dt_util
+
+    rnd = random.Random(1)
+    frames = _raw_frames(_load_messages(args), args.frames)
+    start = dt_util.start_of_local_day().timestamp() + 60.0
+    stream = _energy_stream(frames, start, rnd)
+    if stream[-1][0] >= dt_util.start_of_local_day().timestamp() + 86000:
+        raise SystemExit("energy: zu viele Frames für einen Tag (--frames verkleinern)")
+    bench = BenchHass()
+    try:
+        hass = await bench.async_start()
+        entry = await bench.async_add_entry({"host": UNREACHABLE_HOST, "mode": "read"}, args.options)
+        energy = sys.modules[f"custom_components.{DOMAIN}.energy"]
+        # Gilt für den Integrator, der beim Reload neu angelegt wird
+        energy.ENERGY_SAVE_DELAY = args.checkpoint_delay
+
+        async def replay(part):
+            ingest = bench.entry_data["socket_reader"].ingest
+            for ts, frame in part:
+                ingest.put_raw(frame, ts)
+                await asyncio.sleep(0)
+            await hass.async_block_till_done()
+
+        half = len(stream) // 2
+        with Measurement(args.memory) as measurement:
+            await replay(stream[:half])
+            await hass.config_entries.async_reload(entry.entry_id)
+            await hass.async_block_till_done()
+            await replay(stream[half:])
+
+        integrator = bench.entry_data["energy_integrator"]
+        ref_import, ref_export = _reference_energy(
+            [(ts, frame["powerTotal"]) for ts, frame in stream], energy.ENERGY_MAX_GAP
+        )
+        import_kwh = integrator.today_import_wh / 1000.0
+        export_kwh = integrator.today_export_wh / 1000.0
+        error = max(
+            abs(import_kwh - ref_import / 1000.0) / max(ref_import / 1000.0, 1e-9),
+            abs(export_kwh - ref_export / 1000.0) / max(ref_export / 1000.0, 1e-9),
+        )
+        if error > 1e-4:
+            raise SystemExit(
+                f"energy: Import/Export {import_kwh:.6f}/{export_kwh:.6f} kWh, "
+                f"Referenz {ref_import / 1000.0:.6f}/{ref_export / 1000.0:.6f} kWh"
+            )
+
+        # Checkpoint unter Dauerlast: Frames alle 50 ms, länger als die Verzögerung
+        ingest = bench.entry_data["socket_reader"].ingest
+        ts = stream[-1][0]
+        checkpoint_from = ts
+        deadline = time.monotonic() + 3 * args.checkpoint_delay
+        while time.monotonic() < deadline:
+            ts += 0.05
+            ingest.put_raw(frames[0][1], ts)
+            await asyncio.sleep(0.05)
+        path = os.path.join(bench.config_dir, ".storage", f"{DOMAIN}.{entry.entry_id}_energy")
+        with open(path, encoding="utf-8") as file:
+            stored = json.load(file)["data"]
+        if not stored["last_ts"] > checkpoint_from:
+            raise SystemExit("energy: kein Checkpoint während laufender Frames geschrieben")
+
+        return _result(
+            "energy", len(stream), "frames", measurement, 0,
+            {
+                "import_kwh": round(import_kwh, 6),
+                "export_kwh": round(export_kwh, 6),
+                "reference_import_kwh": round(ref_import / 1000.0, 6),
+                "reference_export_kwh": round(ref_export / 1000.0, 6),
+                "relative_error": error,
+                "checkpoint_lag_s": round(ts - stored["last_ts"], 2),
+            },
+        )
+    finally:
+        await bench.async_stop()
+
+
+def _listener_counts(hass) -> dict:
+    return {
+        "bus": sum(hass.bus.async_listeners().values()),
+        "dispatcher": sum(len(targets) for targets in hass.data.get("dispatcher", {}).values()),
+        "timers": sum(not handle.cancelled() for handle in hass.loop._scheduled),
+    }
+
+
+async def _settle(hass) -> None:
+    """Verzögertes Speichern der Config-Entries (HA-Kern) abwarten, sonst zählt dessen Timer mit."""
+    await asyncio.sleep(config_entries.SAVE_DELAY + 0.5)
+    await hass.async_block_till_done()
+
+
+async def bench_reload(args) -> dict:
+    bench = BenchHass()
+    frames = _raw_frames(_load_messages(args), 20)
+    try:
+        hass = await bench.async_start()
+        hass.states.async_set("sensor.bench_power", 1000, {"unit_of_measurement": "W"})
+        tracemalloc.start()
+        start = time.perf_counter()
+        entry = await bench.async_add_entry(
+            {
+                "host": UNREACHABLE_HOST, "mode": "read_write", "api_key": "bench",
+                "consumption_entity": "sensor.bench_power",
+            },
+            {**args.options, "diagnostic_sensors": True},
+        )
+        setup_ms = (time.perf_counter() - start) * 1000.0
+
+        async def feed():
+            ingest = bench.entry_data["socket_reader"].ingest
+            for dt, frame in frames:
+                ingest.put_raw(frame, time.time())
+                await asyncio.sleep(0)
+            await hass.async_block_till_done()
+
+        await feed()
+        await _settle(hass)
+        gc.collect()
+        listeners_before = _listener_counts(hass)
+        traced_before = tracemalloc.get_traced_memory()[0]
+
+        reload_ms = []
+        for _ in range(args.reloads):
+            start = time.perf_counter()
+            await hass.config_entries.async_reload(entry.entry_id)
+            await hass.async_block_till_done()
+            reload_ms.append((time.perf_counter() - start) * 1000.0)
+            await feed()
+
+        await _settle(hass)
+        gc.collect()
+        listeners_after = _listener_counts(hass)
+        traced_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        traced_kib_delta = round((traced_after - traced_before) / 1024)
+        if listeners_after != listeners_before:
+            raise SystemExit(f"reload: Listener nach {args.reloads} Reloads {listeners_after}, vorher {listeners_before}")
+        # HA 2024.3 behält pro Reload die alten EntityPlatform-Objekte (hass.data["entity_platform"]),
+        # dazu kommen URL-Caches von yarl/aiohttp => einige KiB je Reload sind nicht der Integration anzulasten
+        traced_limit = args.max_traced_kib + args.traced_kib_per_reload * args.reloads
+        if traced_kib_delta > traced_limit:
+            raise SystemExit(f"reload: Speicher um {traced_kib_delta} KiB gewachsen (Grenze {traced_limit} KiB)")
+        reload_ms.sort()
+        return {
+            "scenario": "reload",
+            "reloads": args.reloads,
+            "setup_ms": round(setup_ms, 1),
+            "reload_ms_median": round(reload_ms[len(reload_ms) // 2], 1) if reload_ms else None,
+            "reload_ms_max": round(reload_ms[-1], 1) if reload_ms else None,
+            "listeners_before": listeners_before,
+            "listeners_after": listeners_after,
+            "traced_kib_delta": traced_kib_delta,
+            "traced_kib_limit": traced_limit,
+            "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        await bench.async_stop()
+
+
+SCENARIOS = {
+    "read": bench_read, "trading": bench_trading, "write": bench_write, "reload": bench_reload,
+    "energy": bench_energy, "callbacks": bench_callbacks, "trader_scale": bench_trader_scale,
+    "decode": bench_decode,
+}
+
+
+def _int_list(text: str) -> list:
+    return [int(item) for item in text.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E-Friends Benchmarks (offline)")
+    parser.add_argument("scenarios", nargs="*", help="read, trading, write, reload, energy, callbacks, trader_scale, decode (Standard: alle)")
+    parser.add_argument("--recording", help="Aufzeichnung von tools.record (Standard: künstliche Daten)")
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5, help="decode: Durchläufe, gewertet wird der schnellste")
+    parser.add_argument("--socket", action="store_true", help="read: über Socket.IO vom Stand-in")
+    parser.add_argument("--speed", type=float, default=0, help="read --socket: Abspielgeschwindigkeit")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--traders", type=int, default=500)
+    parser.add_argument("--summaries", type=int, default=500)
+    parser.add_argument("--community-sizes", type=_int_list, default=[100, 1000, 5000],
+                        help="trader_scale: Communitygrößen, kommagetrennt")
+    parser.add_argument("--changed", type=_int_list, default=[2, 20, 200],
+                        help="trader_scale: geänderte Trader pro Event, kommagetrennt")
+    parser.add_argument("--trader-mode", default="entities", choices=["entities", "aggregate"])
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--write-interval", type=float, default=0.2)
+    parser.add_argument("--duration", type=float, default=2.0, help="write: Sendedauer in Sekunden")
+    parser.add_argument("--reloads", type=int, default=20, help="reload: Anzahl Reloads")
+    parser.add_argument("--max-traced-kib", type=int, default=256,
+                        help="reload: erlaubtes Speicherwachstum unabhängig von der Anzahl Reloads")
+    parser.add_argument("--traced-kib-per-reload", type=int, default=8,
+                        help="reload: zusätzlich erlaubtes Speicherwachstum je Reload")
+    parser.add_argument("--entities", type=int, default=2000, help="callbacks: fremde Sensoren in der Installation")
+    parser.add_argument("--tracked-every", type=int, default=100,
+                        help="callbacks: jedes n-te Update betrifft die Verbrauchs-Entity")
+    parser.add_argument("--checkpoint-delay", type=float, default=1.0,
+                        help="energy: ENERGY_SAVE_DELAY für die Checkpoint-Prüfung in Sekunden")
+    parser.add_argument("--options", type=json.loads, default={}, help="Entry-Optionen als JSON")
+    parser.add_argument("--memory", action="store_true", help="tracemalloc aktivieren")
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON schreiben")
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unbekanntes Szenario '{name}' (read, trading, write, reload, energy, callbacks, trader_scale, decode)")
+
+    results = []
+    for name in args.scenarios or list(SCENARIOS):
+        result = asyncio.run(SCENARIOS[name](args))
+        results.append(result)
+        print(json.dumps(result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Meter im Netz suchen, mit derselben Logik wie der Config-Flow (discovery.py).
+
+    python -m tools.discover 192.168.0.0/24
+    python -m tools.discover 192.168.0.100 192.168.0.101:8080 --port 80 --timeout 1
+    python -m tools.discover --standin 10.0.0.0/28   # startet vorher einen lokalen Stand-in
+
+Ohne Home Assistant-Instanz, nur mit aiohttp.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from .harness import DOMAIN
+from .recording import synthetic_messages
+from .standin import StandInServer
+
+
+def _discovery_module():
+    # Import erst hier: lädt die Integration (und damit Home Assistant) aus custom_components/
+    import importlib
+
+    return importlib.import_module(f"custom_components.{DOMAIN}.discovery")
+
+
+async def run(args) -> list:
+    discovery = _discovery_module()
+    targets = list(args.targets)
+    server = None
+    if args.standin:
+        server = StandInServer(synthetic_messages(60), speed=1.0)
+        targets.append(f"127.0.0.1:{await server.start()}")
+    try:
+        hosts = discovery.expand_targets(" ".join(targets), args.port)
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            found = await discovery.async_discover(
+                session, hosts,
+                args.parallel or discovery.DISCOVERY_PARALLEL,
+                args.timeout or discovery.DISCOVERY_TIMEOUT,
+            )
+        print(f"{len(found)} von {len(hosts)} Hosts in {time.perf_counter() - start:.2f} s")
+        for result in found:
+            print(json.dumps(result))
+        return found
+    finally:
+        if server is not None:
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E-Friends Meter suchen")
+    parser.add_argument("targets", nargs="*", help="Hosts (host[:port]) und Subnetze (CIDR)")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--parallel", type=int, help="gleichzeitige Proben (Standard wie im Config-Flow)")
+    parser.add_argument("--timeout", type=float, help="Timeout pro Host in Sekunden (Standard wie im Config-Flow)")
+    parser.add_argument("--standin", action="store_true", help="lokalen Stand-in starten und mitsuchen")
+    args = parser.parse_args()
+    if not args.targets and not args.standin:
+        parser.error("mindestens ein Ziel oder --standin angeben")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Minimaler Home-Assistant-Kern für Benchmarks: lädt die Integration aus
+custom_components/ wie im echten Betrieb (Config-Entry, Sensor-Plattform, Stores),
+aber ohne Frontend, Recorder oder andere Integrationen.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+from homeassistant import bootstrap, config_entries, loader
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.core import HomeAssistant, callback
+
+DOMAIN = "efriends"
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "custom_components", DOMAIN)
+
+
+class BenchHass:
+    """Startet HA in einem temporären Config-Verzeichnis und zählt State-Writes."""
+
+    def __init__(self, log_level: int = logging.CRITICAL):
+        self.config_dir = tempfile.mkdtemp(prefix="efriends-bench-")
+        os.makedirs(os.path.join(self.config_dir, "custom_components"))
+        os.symlink(COMPONENT_DIR, os.path.join(self.config_dir, "custom_components", DOMAIN))
+        self.hass = None
+        self.entry = None
+        self.state_writes = 0
+        logging.getLogger("homeassistant").setLevel(log_level)
+        logging.getLogger(f"custom_components.{DOMAIN}").setLevel(log_level)
+
+    async def async_start(self) -> HomeAssistant:
+        hass = HomeAssistant(self.config_dir)
+        loader.async_setup(hass)
+        hass.config_entries = config_entries.ConfigEntries(hass, {})
+        await bootstrap.async_load_base_functionality(hass)
+        await hass.async_start()
+
+        @callback
+        def count_write(event):
+            self.state_writes += 1
+
+        hass.bus.async_listen(EVENT_STATE_CHANGED, count_write)
+        self.hass = hass
+        return hass
+
+    async def async_add_entry(self, data: dict, options: dict = None) -> config_entries.ConfigEntry:
+        self.entry = config_entries.ConfigEntry(
+            version=1, minor_version=1, domain=DOMAIN, title="bench",
+            data=data, source="user", options=options or {},
+        )
+        await self.hass.config_entries.async_add(self.entry)
+        await self.hass.async_block_till_done()
+        return self.entry
+
+    @property
+    def entry_data(self) -> dict:
+        return self.hass.data[DOMAIN][self.entry.entry_id]
+
+    async def async_stop(self) -> None:
+        if self.hass is not None:
+            if self.entry is not None:
+                await self.hass.config_entries.async_unload(self.entry.entry_id)
+            await self.hass.async_stop()
+        await asyncio.sleep(0)
+        shutil.rmtree(self.config_dir, ignore_errors=True)
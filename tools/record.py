@@ -0,0 +1,57 @@
+"""Live-Stream eines Meters aufzeichnen.
+
+    python -m tools.record --host 192.168.0.100 --out meter.jsonl.gz --duration 3600
+"""
+import argparse
+import asyncio
+import logging
+
+import socketio
+
+from .recording import (
+    EVENT_RAWPOWER,
+    EVENT_TRADING,
+    NAMESPACE_METER,
+    NAMESPACE_ROOT,
+    RecordingWriter,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def record(host: str, path: str, duration: float) -> int:
+    writer = RecordingWriter(path, host)
+    sio = socketio.AsyncClient()
+
+    @sio.on(EVENT_RAWPOWER, namespace=NAMESPACE_METER)
+    async def handle_raw_power(data):
+        writer.write(EVENT_RAWPOWER, NAMESPACE_METER, data)
+
+    @sio.on(EVENT_TRADING)
+    async def handle_trading_data(data):
+        writer.write(EVENT_TRADING, NAMESPACE_ROOT, data)
+
+    try:
+        await sio.connect(f"ws://{host}")
+        await sio.emit("join", {}, namespace=NAMESPACE_METER)
+        _LOGGER.info("Zeichne %s s von %s auf ...", duration, host)
+        await asyncio.sleep(duration)
+    finally:
+        await sio.disconnect()
+        writer.close()
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E-Friends /MeterDataAPI-Stream aufzeichnen")
+    parser.add_argument("--host", required=True, help="Host[:Port] des Meters")
+    parser.add_argument("--out", required=True, help="Zieldatei (.jsonl.gz)")
+    parser.add_argument("--duration", type=float, default=600, help="Dauer in Sekunden")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    count = asyncio.run(record(args.host, args.out, args.duration))
+    print(f"{count} Nachrichten nach {args.out} geschrieben")
+
+
+if __name__ == "__main__":
+    main()
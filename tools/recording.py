@@ -0,0 +1,99 @@
+"""Aufzeichnungsformat für den /MeterDataAPI-Stream (gzip, eine JSON-Zeile pro Nachricht).
+
+Zeile 1 ist ein Header, danach folgt pro Nachricht ``[dt, event, namespace, data]``
+mit dt = Sekunden seit Beginn der Aufzeichnung (ms-genau).
+"""
+import gzip
+import json
+import random
+import time
+
+FORMAT = "efriends-recording"
+VERSION = 1
+
+EVENT_RAWPOWER = "rawPowerMessage"
+EVENT_TRADING = "PeerTradingModuleSummaryEvent"
+NAMESPACE_METER = "/MeterDataAPI"
+NAMESPACE_ROOT = "/"
+
+
+class RecordingWriter:
+    """Nachrichten fortlaufend in eine Aufzeichnung schreiben."""
+
+    def __init__(self, path: str, host: str = None):
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._start = time.monotonic()
+        self.count = 0
+        header = {"format": FORMAT, "version": VERSION, "host": host, "started": time.time()}
+        self._file.write(json.dumps(header) + "\n")
+
+    def write(self, event: str, namespace: str, data, dt: float = None) -> None:
+        if dt is None:
+            dt = time.monotonic() - self._start
+        self._file.write(json.dumps([round(dt, 3), event, namespace, data], separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_recording(path: str):
+    """Header und Liste der Nachrichten ``(dt, event, namespace, data)`` laden."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header = json.loads(file.readline())
+        if header.get("format") != FORMAT:
+            raise ValueError(f"{path} ist keine E-Friends-Aufzeichnung")
+        if header.get("version", 0) > VERSION:
+            raise ValueError(f"Aufzeichnungsversion {header['version']} wird nicht unterstützt")
+        messages = [tuple(json.loads(line)) for line in file if line.strip()]
+    return header, messages
+
+
+def synthetic_messages(seconds: int = 600, rate: float = 1.0, traders: int = 50,
+                       trading_every: float = 60.0, seed: int = 1):
+    """
+    Künstlicher Stream mit realistischer Form, wenn keine Aufzeichnung vorliegt:
+    rawPowerMessage mit `rate` Frames/s (Lastwechsel, Einspeisung um die Mittagszeit)
+    und alle `trading_every` Sekunden ein PeerTradingModuleSummaryEvent.
+    """
+    rnd = random.Random(seed)
+    messages = []
+    base = 800.0
+    next_trade = trading_every
+    count = int(seconds * rate)
+    for i in range(count):
+        dt = i / rate
+        if rnd.random() < 0.01:
+            base = rnd.uniform(-3000.0, 4000.0)
+        phases = [max(base / 3 + rnd.gauss(0, 30), -5000.0) for _ in range(3)]
+        frame = {
+            "powerTotal": round(sum(phases), 1),
+            "power1Watt": round(phases[0], 1),
+            "power2Watt": round(phases[1], 1),
+            "power3Watt": round(phases[2], 1),
+            "current1Ampere": round(abs(phases[0]) / 230, 2),
+            "current2Ampere": round(abs(phases[1]) / 230, 2),
+            "current3Ampere": round(abs(phases[2]) / 230, 2),
+            "voltage1Volt": round(230 + rnd.gauss(0, 1.5), 1),
+            "voltage2Volt": round(230 + rnd.gauss(0, 1.5), 1),
+            "voltage3Volt": round(230 + rnd.gauss(0, 1.5), 1),
+        }
+        messages.append((round(dt, 3), EVENT_RAWPOWER, NAMESPACE_METER, frame))
+        if dt >= next_trade:
+            next_trade += trading_every
+            messages.append((round(dt, 3), EVENT_TRADING, NAMESPACE_ROOT, synthetic_summary(rnd, traders)))
+    return messages
+
+
+def synthetic_summary(rnd: random.Random, traders: int, orders: int = 10) -> dict:
+    confirmed = []
+    for _ in range(orders):
+        seller, buyer = rnd.sample(range(1, traders + 1), 2)
+        confirmed.append({"sellerId": seller, "buyerId": buyer, "amount": round(rnd.uniform(1, 500), 1)})
+    return {
+        "energyBalance": round(rnd.uniform(-2000, 2000), 1),
+        "totalOrderVolume": round(rnd.uniform(0, 5000), 1),
+        "consumable": round(rnd.uniform(0, 3000), 1),
+        "remainingEnergyBalance": round(rnd.uniform(-1000, 1000), 1),
+        "confirmedOrders": confirmed,
+    }
@@ -0,0 +1,136 @@
+"""Lokaler Ersatz für ein Meter: spielt eine Aufzeichnung per Socket.IO ab und
+nimmt POSTs auf /v3/MeterDataAPI/MeterData an.
+
+    python -m tools.standin --recording meter.jsonl.gz --speed 10 --port 8080
+    python -m tools.standin --synthetic 600 --loop
+
+In Home Assistant dann als Host ``<ip>:8080`` eintragen.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import socketio
+from aiohttp import web
+
+from .recording import NAMESPACE_METER, NAMESPACE_ROOT, read_recording, synthetic_messages
+
+_LOGGER = logging.getLogger(__name__)
+
+METER_DATA_PATH = "/v3/MeterDataAPI/MeterData"
+
+
+class StandInServer:
+    """
+    speed: 1 = Echtzeit, 10 = zehnfach, 0 = so schnell wie möglich.
+    api_key: wenn gesetzt, werden POSTs mit anderem apiKey-Header mit 401 abgelehnt.
+    fail_posts: die ersten n POSTs mit 503 beantworten (Offline-Puffer testen).
+    """
+
+    def __init__(self, messages, speed: float = 1.0, loop: bool = False, api_key: str = None,
+                 fail_posts: int = 0):
+        self.messages = messages
+        self.speed = speed
+        self.loop = loop
+        self.api_key = api_key
+        self.fail_posts = fail_posts
+        self.sent = 0
+        self.posts = []  # (Empfangszeit, Payload)
+        self.rejected = 0
+        self.joined = asyncio.Event()
+        self._sio = socketio.AsyncServer(async_mode="aiohttp")
+        self._app = web.Application()
+        self._sio.attach(self._app)
+        self._app.router.add_post(METER_DATA_PATH, self._handle_post)
+        self._runner = None
+        self._replay_task = None
+        self.port = None
+
+        @self._sio.on("join", namespace=NAMESPACE_METER)
+        async def join(sid, data):
+            _LOGGER.info("Client %s hat /MeterDataAPI betreten", sid)
+            self.joined.set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._runner = web.AppRunner(self._app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._replay_task = asyncio.create_task(self._replay())
+        return self.port
+
+    async def stop(self) -> None:
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _replay(self) -> None:
+        """Nach dem ersten join abspielen, Abstände gemäß dt / speed."""
+        await self.joined.wait()
+        while True:
+            start = time.monotonic()
+            for dt, event, namespace, data in self.messages:
+                if self.speed:
+                    delay = start + dt / self.speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                elif self.sent % 100 == 0:
+                    await asyncio.sleep(0)
+                await self._sio.emit(event, data, namespace=namespace or NAMESPACE_ROOT)
+                self.sent += 1
+            if not self.loop:
+                _LOGGER.info("Aufzeichnung abgespielt (%s Nachrichten)", self.sent)
+                return
+
+    async def _handle_post(self, request: web.Request) -> web.Response:
+        if self.api_key is not None and request.headers.get("apiKey") != self.api_key:
+            self.rejected += 1
+            return web.Response(status=401, text="invalid apiKey")
+        if self.fail_posts > 0:
+            self.fail_posts -= 1
+            return web.Response(status=503, text="unavailable")
+        payload = await request.json()
+        self.posts.append((time.time(), payload))
+        _LOGGER.debug("POST %s", payload)
+        return web.Response(text="ok")
+
+
+async def serve(args) -> None:
+    if args.recording:
+        _, messages = read_recording(args.recording)
+    else:
+        messages = synthetic_messages(args.synthetic)
+    server = StandInServer(messages, args.speed, args.loop, args.api_key)
+    port = await server.start(args.bind, args.port)
+    print(f"Stand-in läuft auf {args.bind}:{port} ({len(messages)} Nachrichten, speed={args.speed})")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"gesendet: {server.sent}, POSTs: {len(server.posts)}, abgelehnt: {server.rejected}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E-Friends Meter Stand-in (Socket.IO + HTTP)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--recording", help="Aufzeichnung von tools.record")
+    source.add_argument("--synthetic", type=int, default=600, help="Sekunden künstlicher Daten")
+    parser.add_argument("--speed", type=float, default=1.0, help="Abspielgeschwindigkeit (0 = max)")
+    parser.add_argument("--loop", action="store_true", help="Endlos wiederholen")
+    parser.add_argument("--bind", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--api-key", help="Nur POSTs mit diesem apiKey annehmen")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()